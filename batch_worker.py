@@ -0,0 +1,13 @@
+"""Entry point of the worker processes of the batch import plugin
+
+Veusz executes plugin files instead of importing them, so the functions they
+define cannot be pickled by reference. The workers are spawned processes that
+import this module, and through it vasp_importers, from the plugin directory
+that vasp_importers puts on sys.path.
+"""
+
+def import_file(kind: str, filename: str, encoding: str, fields: dict) -> tuple:
+    """Import filename in a worker, see vasp_importers._batch_import"""
+    import vasp_importers
+
+    return vasp_importers._batch_import(kind, filename, encoding, fields)
@@ -0,0 +1,193 @@
+"""Benchmarks of the import plugins on synthetic data
+
+Every case generates its input with benchmarks/synthetic.py (once per size,
+in a work directory that is kept between runs) and calls the doImport of one
+plugin headlessly in a fresh process, recording the wall time, the peak
+resident set size and the number and total length of the imported datasets.
+
+    python benchmarks/run.py --size medium --repeat 3 --json results.json
+
+--startup instead times the import of every plugin module, as done by Veusz
+at startup, and lists the heavy dependencies it pulled in.
+
+Veusz and the plugin dependencies (numpy, pymatgen, h5py) must be importable.
+The parse cache is switched off, unless a case asks for it.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# vasprun.xml (segments, points per segment, bands, ions, NEDOS), OSZICAR
+# (ionic steps, electronic steps) and band.hdf5 (segments, q-points, bands)
+SIZES = {
+    'small': dict(vasprun=(4, 40, 24, 4, 2001), oszicar=(200, 10), phonon=(4, 51, 24)),
+    'medium': dict(vasprun=(8, 100, 64, 8, 10001), oszicar=(5000, 15), phonon=(8, 201, 96)),
+    'large': dict(vasprun=(10, 300, 128, 16, 30001), oszicar=(50000, 20), phonon=(10, 501, 384)),
+}
+
+# name: (module, plugin, input, field results)
+CASES = {
+    'bands': ('vasp_importers', 'ImportPluginBandStructure', 'pbe/vasprun.xml', {}),
+    'bands_pymatgen': ('vasp_importers', 'ImportPluginBandStructure', 'pbe/vasprun.xml', {'streaming': False}),
+    'bands_hybrid': ('vasp_importers', 'ImportPluginBandStructure', 'hybrid/vasprun.xml', {'hybrid': True}),
+    'bands_projected': ('vasp_importers', 'ImportPluginBandStructure', 'projected/vasprun.xml', {'projected': True}),
+    'bands_cached': ('vasp_importers', 'ImportPluginBandStructure', 'pbe/vasprun.xml', {'cache': 'Use'}),
+    'dos': ('vasp_importers', 'ImportPluginDOS', 'pbe/vasprun.xml', {}),
+    'bsdos': ('vasp_importers', 'ImportPluginBSDOS', 'pbe/vasprun.xml', {}),
+    'eigenval': ('vasp_importers', 'ImportPluginEigenval', 'pbe/EIGENVAL', {}),
+    'doscar': ('vasp_importers', 'ImportPluginDOSCAR', 'pbe/DOSCAR', {}),
+    'oszicar': ('vasp_importers', 'ImportPluginOszicar', 'OSZICAR', {'quantities': 'E0 F dE mag'}),
+    'oszicar_scf': ('vasp_importers', 'ImportPluginOszicar', 'OSZICAR', {'quantities': 'E0 nscf scf_dE scf_rms'}),
+    'phonon': ('phonopy_importers', 'ImportPluginPhononDispersion', 'band.hdf5', {}),
+}
+
+# bumped when the generated files change, to regenerate kept inputs
+DATA_VERSION = '2'
+
+def generate(size: str, workdir: str) -> str:
+    """Write the synthetic inputs of size into workdir unless present"""
+    directory = os.path.join(workdir, size)
+    stamp = os.path.join(directory, '.complete')
+    if os.path.exists(stamp) and open(stamp).read() == DATA_VERSION:
+        return directory
+    nsegments, npoints, nbands, nions, nedos = SIZES[size]['vasprun']
+    synthetic.write_vasprun(os.path.join(directory, 'pbe'), nsegments, npoints, nbands, nions, nedos)
+    synthetic.write_vasprun(os.path.join(directory, 'hybrid'), nsegments, npoints, nbands, nions, nedos,
+                            hybrid_nscf=npoints)
+    synthetic.write_vasprun(os.path.join(directory, 'projected'), nsegments, npoints, nbands, nions, nedos,
+                            projected=True)
+    synthetic.write_oszicar(os.path.join(directory, 'OSZICAR'), *SIZES[size]['oszicar'])
+    synthetic.write_band_hdf5(os.path.join(directory, 'band.hdf5'), *SIZES[size]['phonon'])
+    with open(stamp, 'w') as f:
+        f.write(DATA_VERSION)
+    return directory
+
+def _peak_rss() -> int:
+    """Peak resident set size of this process in bytes, 0 if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak*1024
+
+def run_case(case: str, directory: str, cache_dir: str) -> dict:
+    """Run one case in this process; meant to be called in a fresh worker"""
+    os.environ['VEUSZ_PLUGINS_CACHE'] = cache_dir
+    sys.path.insert(0, ROOT)
+    import veusz.plugins as plugins
+
+    module, plugin_name, filename, fields = CASES[case]
+    plugin = getattr(__import__(module), plugin_name)()
+    field_results = {field.name: field.default for field in plugin.fields}
+    if 'cache' in field_results:
+        field_results['cache'] = 'Off'
+    field_results.update(fields)
+    params = plugins.ImportPluginParams(filename=os.path.join(directory, filename), encoding='utf-8',
+                                        field_results=field_results)
+    if field_results.get('cache') == 'Use':
+        plugin.doImport(params)
+
+    baseline = _peak_rss()
+    start = time.perf_counter()
+    datasets = plugin.doImport(params)
+    elapsed = time.perf_counter() - start
+    return {
+        'case': case,
+        'time': elapsed,
+        'peak_rss': _peak_rss(),
+        'rss_increase': _peak_rss() - baseline,
+        'datasets': len(datasets),
+        'points': int(sum(len(dataset.data) for dataset in datasets)),
+        # memory of the numeric datasets in the document, which Veusz holds as float64
+        'dataset_bytes': int(sum(np.asarray(dataset.data, dtype=np.float64).nbytes for dataset in datasets
+                                 if not isinstance(dataset, plugins.ImportDatasetText))),
+    }
+
+def import_time(module: str) -> dict:
+    """Time importing a plugin module in this process, with Veusz loaded"""
+    sys.path.insert(0, ROOT)
+    import veusz.plugins
+
+    start = time.perf_counter()
+    __import__(module)
+    elapsed = time.perf_counter() - start
+    heavy = [name for name in ['pymatgen', 'h5py', 'scipy', 'pandas'] if name in sys.modules]
+    return {'module': module, 'time': elapsed, 'loaded': heavy}
+
+def startup(repeat: int) -> list:
+    """Import every plugin module repeat times in fresh processes"""
+    results = []
+    for module in ['vasp_importers', 'phonopy_importers', 'vasp_plotters', 'phonopy_plotters']:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                runs.append(executor.submit(import_time, module).result())
+        best = min(runs, key=lambda run: run['time'])
+        results.append(best)
+        print('%-20s %9.3f s  %s' % (module, best['time'], ' '.join(best['loaded']) or '-'), flush=True)
+    return results
+
+def benchmark(cases: list, size: str, repeat: int, workdir: str) -> list:
+    """Run every case repeat times, each in a fresh process so that the peak
+    RSS and the in-memory reader caches do not carry over"""
+    directory = generate(size, workdir)
+    cache_dir = os.path.join(workdir, 'cache')
+    results = []
+    for case in cases:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                runs.append(executor.submit(run_case, case, directory, cache_dir).result())
+        best = min(runs, key=lambda run: run['time'])
+        best['times'] = [run['time'] for run in runs]
+        best['size'] = size
+        results.append(best)
+        print('%-16s %-7s %9.3f s %9.1f MiB %9.1f MiB %9.1f MiB %5d %12d' % (
+            case, size, best['time'], best['peak_rss']/2**20, best['rss_increase']/2**20,
+            best['dataset_bytes']/2**20, best['datasets'], best['points']), flush=True)
+    return results
+
+def main(argv: list=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', choices=list(SIZES), action='append',
+                        help='input size, may be repeated (default: small)')
+    parser.add_argument('--case', choices=list(CASES), action='append', help='case to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case, the fastest is reported')
+    parser.add_argument('--workdir', default=os.path.join(ROOT, 'benchmarks', 'data'),
+                        help='directory of the generated inputs')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--startup', action='store_true', help='time the import of the plugin modules')
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        print('%-20s %11s  %s' % ('module', 'import', 'heavy modules loaded'))
+        results = startup(args.repeat)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=1)
+        return
+
+    print('%-16s %-7s %11s %13s %13s %13s %5s %12s' % ('case', 'size', 'time', 'peak RSS', 'RSS increase',
+                                                       'datasets', 'sets', 'points'))
+    results = []
+    for size in args.size or ['small']:
+        results += benchmark(args.case or list(CASES), size, args.repeat, args.workdir)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Generators of synthetic VASP and Phonopy output for the benchmarks
+
+The files follow the layout written by VASP 6 and Phonopy closely enough for
+both the importers of this repository and pymatgen to read them. Bands are
+smooth cosine dispersions and the DOS is a sum of Gaussians, so that results
+look like real data; the numbers themselves carry no physical meaning.
+"""
+
+import os
+
+import numpy as np
+
+ORBITALS = ['s', 'py', 'pz', 'px', 'dxy', 'dyz', 'dz2', 'dxz', 'x2-y2']
+LABELS = ['GAMMA', 'X', 'W', 'K', 'L', 'U', 'Z', 'Y', 'S', 'T', 'R', 'H', 'N', 'P']
+ELEMENTS = ['Si', 'O', 'Fe', 'N']
+
+BASIS = np.array([[0.0, 2.7, 2.7], [2.7, 0.0, 2.7], [2.7, 2.7, 0.0]])
+
+def _vector(v) -> str:
+    return ' '.join('%16.8f' % x for x in v)
+
+def _rows(values: np.ndarray, fmt: str, indent: str, tag: str='r') -> str:
+    """One <tag> line per row of values, formatted with fmt per column"""
+    line = indent + '<' + tag + '>' + ' '.join([fmt]*values.shape[1]) + ' </' + tag + '>\n'
+    return ''.join(line % tuple(row) for row in values)
+
+def kpath(nsegments: int, npoints: int, seed: int=0):
+    """Ends of nsegments consecutive branches and their npoints k-points each"""
+    rng = np.random.default_rng(seed)
+    ends = rng.random((nsegments+1, 3))*0.5
+    t = np.linspace(0, 1, npoints)
+    kpoints = np.concatenate([ends[i] + np.outer(t, ends[i+1]-ends[i]) for i in range(nsegments)])
+    return ends, kpoints
+
+def write_line_kpoints(filename: str, ends: np.ndarray, npoints: int):
+    """Line-mode KPOINTS (or KPATH.in) through the branch ends"""
+    with open(filename, 'w') as f:
+        f.write('k-path\n%d\nLine-mode\nReciprocal\n' % npoints)
+        for i in range(len(ends)-1):
+            f.write('%s ! %s\n%s ! %s\n\n' % (_vector(ends[i]), LABELS[i % len(LABELS)],
+                                              _vector(ends[i+1]), LABELS[(i+1) % len(LABELS)]))
+
+def write_hybrid_kpoints(filename: str, nscf: int, kpoints: np.ndarray, npts: list):
+    """Explicit KPOINTS of a hybrid band calculation: nscf weighted SCF
+    k-points followed by the zero-weight path, described in the comment"""
+    with open(filename, 'w') as f:
+        f.write('Hybrid band path : %d %d %d %d %s\n%d\nReciprocal\n'
+                % (nscf, 0, len(kpoints), len(npts), ' '.join(map(str, npts)), len(kpoints)))
+        for i, kpoint in enumerate(kpoints):
+            f.write('%s %f\n' % (_vector(kpoint), 1.0/nscf if i < nscf else 0.0))
+
+def write_vasprun(dirname: str, nsegments: int=4, npoints: int=50, nbands: int=32, nions: int=4,
+                  nedos: int=3001, ispin: int=2, hybrid_nscf: int=0, projected: bool=False, seed: int=0) -> str:
+    """Write vasprun.xml of a band calculation along nsegments branches of
+    npoints k-points, together with KPOINTS, or with a hybrid KPOINTS and
+    KPATH.in if hybrid_nscf weighted SCF k-points precede the path, and with
+    POSCAR, EIGENVAL and DOSCAR holding the same numbers. Return the path of
+    vasprun.xml."""
+    os.makedirs(dirname, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    ends, path = kpath(nsegments, npoints, seed)
+    kpoints = np.concatenate([rng.random((hybrid_nscf, 3))*0.5, path])
+    nkpts = len(kpoints)
+    weights = np.full(nkpts, 1.0/nkpts) if hybrid_nscf == 0 else (np.arange(nkpts) < hybrid_nscf)/hybrid_nscf
+    # sites are grouped by species, as in POSCAR
+    species = ELEMENTS[:min(nions, 2)]
+    types = [species[i*len(species)//nions] for i in range(nions)]
+    rec_basis = np.linalg.inv(BASIS).T
+    efermi = 5.0
+
+    # cosine bands spread over [-10, 20] eV with alternating curvature
+    centres = np.linspace(-10, 20, nbands)
+    phase = 2*np.pi*kpoints @ np.array([1.0, 0.7, 0.3])
+    eigenvalues = np.array([np.sort(centres + 0.8*np.cos(np.outer(phase, 1+np.arange(nbands)%3) + s), axis=1)
+                            for s in range(ispin)])
+    occupations = (eigenvalues < efermi).astype(float)
+    energies = np.linspace(-15, 25, nedos)
+    peaks = rng.random((ispin, 40))*40 - 15
+    tdos = np.array([np.exp(-(energies[:,None]-peaks[s])**2/0.05).sum(axis=1) for s in range(ispin)])
+    tdos[:, energies < -12] = 0.0
+
+    f = open(os.path.join(dirname, 'vasprun.xml'), 'w')
+    w = f.write
+    w('<?xml version="1.0" encoding="ISO-8859-1"?>\n<modeling>\n <generator>\n'
+      '  <i name="program" type="string">vasp </i>\n  <i name="version" type="string">6.3.2  </i>\n </generator>\n')
+    w(' <incar>\n  <i type="int" name="ISPIN">%d</i>\n </incar>\n' % ispin)
+    w(' <kpoints>\n  <generation param="listgenerated">\n   <i type="int" name="divisions">%d</i>\n' % npoints)
+    w(_rows(ends, '%16.8f', '   ', 'v'))
+    w('  </generation>\n  <varray name="kpointlist" >\n')
+    w(_rows(kpoints, '%16.8f', '   ', 'v'))
+    w('  </varray>\n  <varray name="weights" >\n')
+    w(_rows(weights[:,None], '%16.8f', '   ', 'v'))
+    w('  </varray>\n </kpoints>\n')
+    w(' <parameters>\n  <separator name="electronic" >\n   <i type="int" name="NBANDS">%d</i>\n'
+      '   <i name="NELECT">8.0</i>\n   <i type="int" name="NELM">60</i>\n   <i name="EDIFF">1e-6</i>\n'
+      '   <separator name="electronic spin" >\n    <i type="int" name="ISPIN">%d</i>\n    <v name="MAGMOM">%s</v>\n'
+      '   </separator>\n  </separator>\n  <separator name="ionic" >\n   <i type="int" name="NSW">0</i>\n'
+      '   <i type="int" name="IBRION">-1</i>\n   <i name="EDIFFG">-0.01</i>\n  </separator>\n'
+      '  <separator name="dos" >\n   <i type="int" name="NEDOS">%d</i>\n   <i type="int" name="LORBIT">11</i>\n'
+      '  </separator>\n </parameters>\n' % (nbands, ispin, ' '.join(['1.0']*nions), nedos))
+    w(' <atominfo>\n  <atoms>%d</atoms>\n  <types>%d</types>\n  <array name="atoms" >\n'
+      '   <dimension dim="1">ion</dimension>\n   <field type="string">element</field>\n'
+      '   <field type="int">atomtype</field>\n   <set>\n' % (nions, len(species)))
+    for element in types:
+        w('    <rc><c>%-2s</c><c>%4d</c></rc>\n' % (element, species.index(element)+1))
+    w('   </set>\n  </array>\n  <array name="atomtypes" >\n   <dimension dim="1">type</dimension>\n'
+      '   <field type="int">atomspertype</field>\n   <field type="string">element</field>\n   <field>mass</field>\n'
+      '   <field>valence</field>\n   <field type="string">pseudopotential</field>\n   <set>\n')
+    for element in species:
+        w('    <rc><c>%4d</c><c>%-2s</c><c>28.0</c><c>4.0</c><c>  PAW_PBE %s 05Jan2001</c></rc>\n'
+          % (types.count(element), element, element))
+    w('   </set>\n  </array>\n </atominfo>\n')
+
+    positions = rng.random((nions, 3))
+    def structure(name: str):
+        w(' <structure%s>\n  <crystal>\n   <varray name="basis" >\n' % (' name="%s" ' % name if name else ''))
+        w(_rows(BASIS, '%16.8f', '    ', 'v'))
+        w('   </varray>\n   <i name="volume">%f</i>\n   <varray name="rec_basis" >\n' % abs(np.linalg.det(BASIS)))
+        w(_rows(rec_basis, '%16.8f', '    ', 'v'))
+        w('   </varray>\n  </crystal>\n  <varray name="positions" >\n')
+        w(_rows(positions, '%16.8f', '   ', 'v'))
+        w('  </varray>\n </structure>\n')
+
+    structure('initialpos')
+    w(' <calculation>\n  <scstep>\n   <energy>\n    <i name="e_fr_energy">-10.0</i>\n'
+      '    <i name="e_wo_entrp">-10.0</i>\n    <i name="e_0_energy">-10.0</i>\n   </energy>\n  </scstep>\n')
+    structure('')
+    w('  <varray name="forces" >\n' + _rows(np.zeros((nions, 3)), '%16.8f', '   ', 'v'))
+    w('  </varray>\n  <varray name="stress" >\n' + _rows(np.zeros((3, 3)), '%16.8f', '   ', 'v'))
+    w('  </varray>\n  <energy>\n   <i name="e_fr_energy">-10.0</i>\n   <i name="e_wo_entrp">-10.0</i>\n'
+      '   <i name="e_0_energy">-10.0</i>\n  </energy>\n')
+
+    def eigen(indent: str):
+        w(indent + '<eigenvalues>\n' + indent + ' <array>\n' + indent + '  <dimension dim="1">band</dimension>\n'
+          + indent + '  <dimension dim="2">kpoint</dimension>\n' + indent + '  <dimension dim="3">spin</dimension>\n'
+          + indent + '  <field>eigene</field>\n' + indent + '  <field>occ</field>\n' + indent + '  <set>\n')
+        for s in range(ispin):
+            w(indent + '   <set comment="spin %d">\n' % (s+1))
+            for k in range(nkpts):
+                w(indent + '    <set comment="kpoint %d">\n' % (k+1))
+                w(_rows(np.stack([eigenvalues[s,k], occupations[s,k]], axis=1), '%12.4f', indent + '     '))
+                w(indent + '    </set>\n')
+            w(indent + '   </set>\n')
+        w(indent + '  </set>\n' + indent + ' </array>\n' + indent + '</eigenvalues>\n')
+
+    eigen('  ')
+    if projected:
+        w('  <projected>\n')
+        eigen('   ')
+        w('   <array>\n    <dimension dim="1">ion</dimension>\n    <dimension dim="2">band</dimension>\n'
+          '    <dimension dim="3">kpoint</dimension>\n    <dimension dim="4">spin</dimension>\n')
+        w(''.join('    <field>%s</field>\n' % orbital for orbital in ORBITALS))
+        w('    <set>\n')
+        for s in range(ispin):
+            w('     <set comment="spin%d">\n' % (s+1))
+            for k in range(nkpts):
+                w('      <set comment="kpoint %d">\n' % (k+1))
+                block = rng.random((nbands, nions, len(ORBITALS)))*0.1
+                for b in range(nbands):
+                    w('       <set comment="band %d">\n' % (b+1))
+                    w(_rows(block[b], '%6.3f', '        '))
+                    w('       </set>\n')
+                w('      </set>\n')
+            w('     </set>\n')
+        w('    </set>\n   </array>\n  </projected>\n')
+
+    w('  <dos>\n   <i name="efermi">%16.8f</i>\n   <total>\n    <array>\n     <dimension dim="1">gridpoints</dimension>\n'
+      '     <dimension dim="2">spin</dimension>\n     <field>energy</field>\n     <field>total</field>\n'
+      '     <field>integrated</field>\n     <set>\n' % efermi)
+    for s in range(ispin):
+        w('      <set comment="spin %d">\n' % (s+1))
+        w(_rows(np.stack([energies, tdos[s], np.cumsum(tdos[s])*(energies[1]-energies[0])], axis=1),
+                '%12.4f', '       '))
+        w('      </set>\n')
+    w('     </set>\n    </array>\n   </total>\n   <partial>\n    <array>\n     <dimension dim="1">gridpoints</dimension>\n'
+      '     <dimension dim="2">spin</dimension>\n     <dimension dim="3">ion</dimension>\n     <field>energy</field>\n')
+    w(''.join('     <field>%s</field>\n' % orbital for orbital in ORBITALS))
+    w('     <set>\n')
+    # (ion, spin, energy, orbital)
+    pdos = np.array([[np.outer(tdos[s]/nions, rng.random(len(ORBITALS))/len(ORBITALS)*2) for s in range(ispin)]
+                     for _ in range(nions)])
+    for i in range(nions):
+        w('      <set comment="ion %d">\n' % (i+1))
+        for s in range(ispin):
+            w('       <set comment="spin %d">\n' % (s+1))
+            w(_rows(np.concatenate([energies[:,None], pdos[i,s]], axis=1), '%10.4f', '        '))
+            w('       </set>\n')
+        w('      </set>\n')
+    w('     </set>\n    </array>\n   </partial>\n  </dos>\n </calculation>\n')
+    structure('finalpos')
+    w('</modeling>\n')
+    f.close()
+
+    with open(os.path.join(dirname, 'POSCAR'), 'w') as f:
+        f.write('synthetic\n1.0\n' + ''.join(_vector(v) + '\n' for v in BASIS))
+        f.write(' %s\n %s\nDirect\n' % (' '.join(species), ' '.join(str(types.count(e)) for e in species)))
+        f.write(''.join(_vector(position) + '\n' for position in positions))
+
+    header = '%4d%4d%4d%4d\n%15.7E%15.7E%15.7E%15.7E%15.7E\n  1.0000000E-04\n  CAR\nsynthetic\n' % (
+        nions, nions, 1, ispin, abs(np.linalg.det(BASIS)), 3.8, 3.8, 3.8, 0.5E-15)
+    with open(os.path.join(dirname, 'EIGENVAL'), 'w') as f:
+        f.write(header + '%7d%7d%7d\n' % (8, nkpts, nbands))
+        for k in range(nkpts):
+            f.write('\n%s %15.7E\n' % (_vector(kpoints[k]), weights[k]))
+            rows = np.concatenate([np.arange(1, nbands+1)[:,None], eigenvalues[:,k].T, occupations[:,k].T], axis=1)
+            f.write(''.join(('%5d' + '%12.4f'*ispin + '%10.4f'*ispin + '\n') % tuple(row) for row in rows))
+
+    dos_header = '%16.8f%16.8f%6d%16.8f%16.8f\n' % (energies[-1], energies[0], nedos, efermi, 1.0)
+    with open(os.path.join(dirname, 'DOSCAR'), 'w') as f:
+        f.write(header + dos_header)
+        integrated = np.cumsum(tdos, axis=1)*(energies[1]-energies[0])
+        rows = np.concatenate([energies[:,None], tdos.T, integrated.T], axis=1)
+        f.write(''.join(('%12.4f'*len(row) + '\n') % tuple(row) for row in rows))
+        for i in range(nions):
+            # the orbitals alternate spin up and down
+            rows = np.concatenate([energies[:,None], pdos[i].transpose((1,2,0)).reshape((nedos, -1))], axis=1)
+            f.write(dos_header + ''.join(('%10.4f'*len(row) + '\n') % tuple(row) for row in rows))
+
+    if hybrid_nscf == 0:
+        write_line_kpoints(os.path.join(dirname, 'KPOINTS'), ends, npoints)
+    else:
+        write_hybrid_kpoints(os.path.join(dirname, 'KPOINTS'), hybrid_nscf, kpoints, [npoints]*nsegments)
+        write_line_kpoints(os.path.join(dirname, 'KPATH.in'), ends, npoints)
+    return os.path.join(dirname, 'vasprun.xml')
+
+def write_oszicar(filename: str, nionic: int=100, nscf: int=10, md: bool=False, seed: int=0) -> str:
+    """Write an OSZICAR of nionic ionic steps of nscf electronic steps each,
+    relaxation steps with a magnetic moment unless md is set"""
+    rng = np.random.default_rng(seed)
+    header = '       N       E                     dE             d eps       ncg     rms          rms(c)\n'
+    with open(filename, 'w') as f:
+        for i in range(nionic):
+            f.write(header)
+            for j in range(nscf):
+                f.write('DAV: %3d    %.12E   %.5E   %.5E  %4d   %.3E' % (j+1, -10-rng.random(), rng.random(),
+                                                                      -rng.random(), 96, rng.random()))
+                f.write('    %.3E\n' % rng.random() if j > 2 else '\n')
+            if md:
+                f.write('%6d T= %8.1f E= %.8E F= %.8E E0= %.8E  EK= %.5E SP= %.2E SK= %.5E\n'
+                        % (i+1, 300+rng.random(), -9-rng.random(), -10-rng.random(), -10-rng.random(),
+                           rng.random(), 0.0, rng.random()))
+            else:
+                f.write('%4d F= %.8E E0= %.8E  d E =%.6E  mag=    %.4f\n'
+                        % (i+1, -10-rng.random(), -10-rng.random(), -rng.random(), 2*rng.random()))
+    return filename
+
+def write_band_hdf5(filename: str, nsegments: int=4, npoints: int=51, nbands: int=24, seed: int=0) -> str:
+    """Write a Phonopy band.hdf5 with nbands acoustic-like and optical branches"""
+    import h5py
+
+    rng = np.random.default_rng(seed)
+    steps = rng.random(nsegments)*0.2 + 0.1
+    distance = np.array([np.linspace(0, steps[i], npoints) + steps[:i].sum() for i in range(nsegments)])
+    t = np.linspace(0, np.pi, npoints)
+    optical = np.linspace(2, 20, nbands)
+    frequency = np.sort(optical*np.abs(np.sin(t[:,None]/2 + optical/7))[None,:,:]
+                        + rng.random((nsegments, 1, nbands)), axis=2)
+    labels = [LABELS[i % len(LABELS)].replace('GAMMA', '$\\Gamma$') for i in range(nsegments+1)]
+    with h5py.File(filename, 'w') as f:
+        f['distance'] = distance
+        f['frequency'] = frequency
+        f['label'] = np.array([[labels[i], labels[i+1]] for i in range(nsegments)], dtype='S')
+        f['nqpoint'] = [nsegments*npoints]
+        f['path'] = rng.random((nsegments, 2, 3))
+        f['segment_nqpoint'] = [npoints]*nsegments
+    return filename
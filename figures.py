@@ -0,0 +1,194 @@
+"""Headless figure factory rendering the plot tools for many calculations
+
+    python figures.py 'runs/*/' --template figures.json --format pdf png --workers 8
+
+Every calculation directory is imported once per source (vasprun.xml with
+the band structure and DOS plugin when both are needed, band.hdf5 with the
+Phonopy plugin), the datasets are loaded into a hidden veusz.embed window
+and the apply of the tools plugins draws one page per figure of the
+template, which is exported in every requested format. Calculations are
+rendered in parallel worker processes, each with its own Veusz window.
+
+A template is a JSON file such as
+
+    {"import": {"sub_fermi": true},
+     "figures": [{"name": "bands", "tool": "bands", "fields": {"spin": true}},
+                 {"name": "bsdos", "tool": "bsdos", "size": ["16cm", "10cm"]}]}
+
+where "import" holds fields of the import plugins, and every figure names a
+tool of TOOLS, its tool fields and optionally the page size. Figures whose
+input is missing in a directory are skipped. Veusz and the plugin
+dependencies must be importable.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# tool: (module, plugin, field of the target widget, widget type, source)
+TOOLS = OrderedDict([
+    ('bands', ('vasp_plotters', 'PlotBandStructurePlugin', 'graph', 'graph', 'bands')),
+    ('dos', ('vasp_plotters', 'PlotDOSPlugin', 'graph', 'graph', 'dos')),
+    ('bsdos', ('vasp_plotters', 'PlotBSDOSPlugin', 'widget', 'page', 'bsdos')),
+    ('phonon', ('phonopy_plotters', 'PlotPhononBandsPlugin', 'widget', 'graph', 'phonon')),
+])
+
+# dataset prefix of every source, keeping the phonon distances and ticks apart
+# from those of the electronic band structure in the same window
+PREFIXES = {'phonon': 'phonon_'}
+
+DEFAULT_TEMPLATE = {
+    'import': {},
+    'figures': [{'name': tool, 'tool': tool} for tool in TOOLS],
+}
+
+def _sources(directory: str, figures: list) -> OrderedDict:
+    """Import plugin and input file of every source needed by figures, the
+    band structure and DOS sharing one import of vasprun.xml"""
+    import vasp_importers
+
+    needed = set(TOOLS[figure['tool']][4] for figure in figures)
+    vasprun = vasp_importers.find_file(directory, 'vasprun.xml')
+    sources = OrderedDict()
+    if os.path.exists(vasprun):
+        if 'bsdos' in needed or {'bands', 'dos'} <= needed:
+            plugin = ('vasp_importers', 'ImportPluginBSDOS')
+            for source in ['bands', 'dos', 'bsdos']:
+                sources[source] = (plugin, vasprun)
+        elif 'bands' in needed:
+            sources['bands'] = (('vasp_importers', 'ImportPluginBandStructure'), vasprun)
+        elif 'dos' in needed:
+            sources['dos'] = (('vasp_importers', 'ImportPluginDOS'), vasprun)
+    for name in ['band.hdf5', 'band.h5']:
+        if 'phonon' in needed and os.path.exists(os.path.join(directory, name)):
+            sources['phonon'] = (('phonopy_importers', 'ImportPluginPhononDispersion'), os.path.join(directory, name))
+            break
+    return sources
+
+def _import(plugin_spec: tuple, filename: str, fields: dict) -> list:
+    """Datasets of filename imported by the plugin, with the template fields
+    it knows and its defaults for the others"""
+    import veusz.plugins as plugins
+
+    module, name = plugin_spec
+    plugin = getattr(__import__(module), name)()
+    field_results = {field.name: field.default for field in plugin.fields}
+    field_results.update((key, value) for key, value in fields.items() if key in field_results)
+    params = plugins.ImportPluginParams(filename=filename, encoding='utf-8', field_results=field_results)
+    return plugin.doImport(params)
+
+def render(directory: str, output: str, template: dict, formats: list) -> tuple:
+    """Render the figures of template for one calculation directory into
+    files named output + figure name + extension; returns the files written
+    and the error message, as parser exceptions may not be picklable"""
+    try:
+        import veusz.embed as embed
+        import veusz.plugins as plugins
+
+        figures = template['figures']
+        sources = _sources(directory, figures)
+        figures = [figure for figure in figures if TOOLS[figure['tool']][4] in sources]
+        if len(figures) == 0:
+            return [], 'no input for the figures'
+
+        window = embed.Embedded(hidden=True)
+        try:
+            # every input is imported once, whatever the number of figures using it
+            imported = set()
+            for source, (spec, filename) in sources.items():
+                if (spec, filename) in imported:
+                    continue
+                imported.add((spec, filename))
+                prefix = PREFIXES.get(source, '')
+                for dataset in _import(spec, filename, template.get('import', {})):
+                    if isinstance(dataset, plugins.ImportDatasetText):
+                        window.SetDataText(prefix + dataset.name, list(dataset.data))
+                    else:
+                        window.SetData(prefix + dataset.name, dataset.data)
+
+            written = []
+            for index, figure in enumerate(figures):
+                module, name, target, widgettype, source = TOOLS[figure['tool']]
+                page = window.Root.Add('page', name=figure['name'])
+                if 'size' in figure:
+                    page.width.val, page.height.val = figure['size']
+                widget = page if widgettype == 'page' else page.Add('graph', name='graph')
+
+                tool = getattr(__import__(module), name)()
+                fields = {field.name: field.default for field in tool.fields}
+                if source in PREFIXES:
+                    fields['prefix'] = PREFIXES[source]
+                fields.update(figure.get('fields', {}))
+                fields[target] = widget.path
+                tool.apply(window, fields)
+
+                for ext in formats:
+                    filename = output + figure['name'] + '.' + ext
+                    window.Export(filename, page=index)
+                    written.append(filename)
+        finally:
+            window.Close()
+    except Exception as e:
+        return [], '%s: %s' % (type(e).__name__, e)
+    return written, None
+
+def main(argv: list=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('directories', nargs='+', help='calculation directories or globs')
+    parser.add_argument('--template', help='JSON figure template (default: every tool)')
+    parser.add_argument('--format', nargs='+', default=['pdf'], choices=['pdf', 'png', 'svg', 'eps'],
+                        help='export formats')
+    parser.add_argument('--outdir', default='',
+                        help='directory of the figures, named <calculation>_<figure> (default: in each calculation)')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes (0 for all cores)')
+    args = parser.parse_args(argv)
+
+    import vasp_importers
+
+    directories = []
+    for pattern in args.directories:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))):
+            if os.path.isdir(path) and os.path.normpath(path) not in directories:
+                directories.append(os.path.normpath(path))
+    if len(directories) == 0:
+        parser.error('no directories match')
+    template = DEFAULT_TEMPLATE
+    if args.template:
+        with open(args.template) as f:
+            template = json.load(f)
+    for figure in template['figures']:
+        if figure.get('tool') not in TOOLS:
+            parser.error('unknown tool "%s" in the template, expected one of %s'
+                         % (figure.get('tool'), ', '.join(TOOLS)))
+
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+        prefixes = vasp_importers.batch_prefixes([os.path.join(d, 'vasprun.xml') for d in directories])
+        outputs = [os.path.join(args.outdir, prefix + '_') for prefix in prefixes]
+    else:
+        outputs = [os.path.join(d, '') for d in directories]
+
+    workers = min(args.workers or os.cpu_count() or 1, len(directories))
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render, d, output, template, args.format) for d, output in zip(directories, outputs)]
+        for directory, future in zip(directories, futures):
+            written, error = future.result()
+            if error is not None:
+                failed += 1
+                print('%s: %s' % (directory, error), file=sys.stderr)
+            else:
+                print('%s: %d files' % (directory, len(written)))
+    print('%d calculations in %.1f s, %d failed' % (len(directories), time.perf_counter() - start, failed))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
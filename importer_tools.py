@@ -0,0 +1,257 @@
+"""Helpers shared by the import plugins: instrumentation of the import phases,
+progress reports and cancellation from the Veusz window, and parsing of the
+import fields
+
+Veusz executes each plugin file on its own, so the plugins import this module
+from the plugin directory they put on sys.path, and share its state.
+"""
+import veusz.plugins as plugins
+
+from contextlib import contextmanager
+import cProfile
+import functools
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger('importer_tools')
+
+class Instrument:
+    """Wall time and, optionally, memory allocated by Python (tracemalloc)
+    of the nested phases of one import"""
+
+    def __init__(self, memory: bool=False) -> None:
+        self.memory = memory
+        # [phase path, seconds, net allocated bytes, peak bytes above the start]
+        self.records = []
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name: str):
+        entry = {'path': '/'.join([parent['path'] for parent in self._stack[-1:]] + [name]), 'memory': 0, 'peak': 0}
+        record = [entry['path'], 0.0, 0, 0]
+        self.records.append(record)
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            entry['memory'] = entry['peak'] = current
+        self._stack.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            allocated = peak = 0
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(entry['peak'], peak)
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                allocated, peak = current - entry['memory'], peak - entry['memory']
+            record[1:] = elapsed, allocated, peak
+            logger.info('%s: %.4f s, %+.1f MiB, peak %.1f MiB', entry['path'], elapsed, allocated/2**20, peak/2**20)
+
+    def datasets(self) -> list:
+        """timing_phases, timing_seconds and, with memory, timing_allocated and
+        timing_peak datasets, in the order the phases started"""
+        records = self.records
+        datasets = [
+            plugins.ImportDatasetText('timing_phases', [record[0] for record in records]),
+            plugins.ImportDataset1D('timing_seconds', [record[1] for record in records]),
+        ]
+        if self.memory:
+            datasets += [
+                plugins.ImportDataset1D('timing_allocated', [record[2] for record in records]),
+                plugins.ImportDataset1D('timing_peak', [record[3] for record in records]),
+            ]
+        return datasets
+
+_instrument = None
+
+def phase(name: str):
+    """Context manager timing a phase of the running import, if instrumented,
+    and showing its name as the progress of the import"""
+    progress(name)
+    if _instrument is None:
+        return _nophase()
+    return _instrument.phase(name)
+
+@contextmanager
+def _nophase():
+    yield
+
+def timed(name: str):
+    """Decorator running the function as a phase of the instrumentation"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def instrument_fields() -> list:
+    """Import fields of the instrumentation, see instrumented"""
+    return [
+        plugins.ImportFieldCombo('timings', descr='Per-phase timings', items=['Off', 'Time', 'Time and memory'], default='Off', editable=False),
+        plugins.ImportFieldText('profile', descr='cProfile output file (blank for none)', default=''),
+    ]
+
+def instrumented(doImport):
+    """Decorator of doImport recording the phases of the import when the
+    'timings' field is set, adding them as timing_* datasets and to the log,
+    and dumping cProfile statistics to the 'profile' file if given"""
+    @functools.wraps(doImport)
+    def wrapper(self, params: plugins.ImportPluginParams):
+        global _instrument
+        mode = params.field_results.get('timings', 'Off')
+        filename = params.field_results.get('profile', '')
+        if mode == 'Off' and filename == '':
+            return doImport(self, params)
+
+        outer, _instrument = _instrument, Instrument(memory=mode == 'Time and memory')
+        tracing = _instrument.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        profile = cProfile.Profile() if filename != '' else None
+        try:
+            if profile is not None:
+                profile.enable()
+            with _instrument.phase(self.name):
+                datasets = doImport(self, params)
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.expanduser(filename))
+            if tracing:
+                tracemalloc.stop()
+            instrument, _instrument = _instrument, outer
+        if mode != 'Off':
+            datasets += instrument.datasets()
+        return datasets
+    return wrapper
+
+class ImportCancelled(BaseException):
+    """Raised in the import thread once the user has cancelled the import; not
+    an Exception, so that the fallbacks and the batch error handling let it through"""
+
+class Progress:
+    """Progress of the running import, updated by the thread doing the work
+    and polled by the one showing it"""
+
+    def __init__(self) -> None:
+        self.message = ''
+        # done out of total (bytes, k-points, files), 0 total if unknown
+        self.done = 0
+        self.total = 0
+        self.cancelled = False
+
+    def update(self, message: str=None, done: int=0, total: int=0):
+        if self.cancelled:
+            raise ImportCancelled()
+        if message is not None:
+            self.message = message
+        self.done, self.total = done, total
+
+    def cancel(self):
+        self.cancelled = True
+
+_progress = None
+
+def progress(message: str=None, done: int=0, total: int=0):
+    """Report the progress of the running import, if shown; raises
+    ImportCancelled once the user has cancelled it"""
+    if _progress is not None:
+        _progress.update(message, done, total)
+
+# seconds an import may take before its progress dialog is shown
+PROGRESS_DELAY = 0.5
+
+# the process Veusz loaded the plugins in, and not a batch worker
+_main_pid = os.getpid()
+
+def _gui_thread() -> bool:
+    """Whether this is the main thread of the Veusz window"""
+    if os.getpid() != _main_pid or threading.current_thread() is not threading.main_thread():
+        return False
+    try:
+        from veusz import qtall as qt
+    except ImportError:
+        return False
+    return isinstance(qt.QCoreApplication.instance(), qt.QApplication)
+
+def _wait(thread: threading.Thread, state: Progress, title: str):
+    """Keep the window responsive, showing a progress dialog with a Cancel
+    button, until thread has finished"""
+    from veusz import qtall as qt
+
+    # short imports are done before the window would have been redrawn
+    thread.join(PROGRESS_DELAY)
+    if not thread.is_alive():
+        return
+    dialog = qt.QProgressDialog(title, 'Cancel', 0, 0)
+    dialog.setWindowTitle(title)
+    dialog.setWindowModality(qt.Qt.WindowModality.ApplicationModal)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+    dialog.setMinimumDuration(0)
+    dialog.canceled.connect(state.cancel)
+    dialog.show()
+    app = qt.QCoreApplication.instance()
+    while thread.is_alive():
+        dialog.setLabelText(state.message or title)
+        if state.total > 0:
+            dialog.setMaximum(1000)
+            dialog.setValue(int(1000*min(state.done/state.total, 1)))
+        else:
+            dialog.setMaximum(0)
+        app.processEvents()
+        thread.join(0.05)
+    dialog.close()
+
+def background(doImport):
+    """Decorator running doImport in a worker thread when called from the
+    Veusz window, which keeps redrawing and shows the progress reported with
+    phase and progress, with a button to cancel the import. The datasets, or
+    the exception, are handed back to Veusz as from a direct call. Elsewhere
+    (scripts, batch workers, nested imports) doImport runs directly."""
+    @functools.wraps(doImport)
+    def wrapper(self, params: plugins.ImportPluginParams):
+        if not _gui_thread():
+            return doImport(self, params)
+
+        state = Progress()
+        outcome = {}
+        def work():
+            global _progress
+            _progress = state
+            try:
+                outcome['datasets'] = doImport(self, params)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                _progress = None
+        thread = threading.Thread(target=work, name=self.name, daemon=True)
+        thread.start()
+        _wait(thread, state, self.name)
+        if isinstance(outcome.get('error'), ImportCancelled):
+            raise plugins.ImportPluginException('Import cancelled')
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['datasets']
+    return wrapper
+
+def _numbers(s: str, descr: str, convert=float, count: int=2) -> list:
+    try:
+        values = [convert(term) for term in s.split()]
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise plugins.ImportPluginException('%s must be %s numbers, got "%s"'
+                                            % (descr, {2: 'two', 3: 'three'}[count], s))
+    return values
@@ -0,0 +1,229 @@
+"""Live monitoring of running VASP calculations in an embedded Veusz window
+
+    python monitor.py 'runs/*/' --quantities "E0 dE" --vasprun --interval 2
+
+Every directory is watched for changes of its OSZICAR and, with --vasprun,
+of its vasprun.xml. A file is only read again when its size or modification
+time changed, and then only from where the previous read stopped: OSZICAR
+through the incremental OszicarReader of vasp_importers, vasprun.xml through
+a pull parser fed with the appended bytes. The datasets of a job are replaced
+in place with SetData, under the names of the batch import plugin
+(<prefix>_E0, <prefix>_indices...), so that the plots drawn once at startup
+follow the calculations until the window is closed.
+
+Veusz and numpy must be importable.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import vasp_importers
+
+class VasprunFollower:
+    """Incremental reader of the ionic steps of a vasprun.xml being written
+
+    update() feeds the bytes appended since the previous call to a pull
+    parser and records the energy (e_0_energy), the largest force and the
+    number of electronic steps of every completed ionic step; the elements of
+    a step are cleared once it has been read. The state is reset if the file
+    was truncated or rewritten, as by a restarted run, and after a parse
+    error, which leaves the pull parser unusable.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.head = b''
+        self.parser = ET.XMLPullParser(events=('start', 'end'))
+        self.path = []
+        self.columns = {'energy': [], 'fmax': [], 'nscf': []}
+        self._step = {'energy': np.nan, 'fmax': np.nan, 'nscf': 0}
+
+    def update(self):
+        with open(self.filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.offset or f.read(len(self.head)) != self.head:
+                self.reset()
+            f.seek(self.offset)
+            chunk = f.read()
+        if self.offset == 0:
+            self.head = chunk[:256]
+        self.offset += len(chunk)
+        try:
+            self._read(chunk)
+        except ET.ParseError:
+            # the next update parses the file again from its start
+            self.reset()
+            raise
+        return self
+
+    def _read(self, chunk: bytes):
+        self.parser.feed(chunk)
+        for event, elem in self.parser.read_events():
+            if event == 'start':
+                self.path.append(elem.tag)
+                continue
+            self.path.pop()
+            if elem.tag == 'calculation':
+                for name, value in self._step.items():
+                    self.columns[name].append(value)
+                self._step = {'energy': np.nan, 'fmax': np.nan, 'nscf': 0}
+                elem.clear()
+            elif len(self.path) > 0 and self.path[-1] == 'calculation':
+                if elem.tag == 'scstep':
+                    self._step['nscf'] += 1
+                elif elem.tag == 'varray' and elem.get('name') == 'forces' and len(elem) > 0:
+                    forces = np.fromstring(' '.join(v.text for v in elem), sep=' ').reshape((-1, 3))
+                    self._step['fmax'] = float(np.max(np.linalg.norm(forces, axis=1)))
+                elif elem.tag == 'energy':
+                    for i in elem.iter('i'):
+                        if i.get('name') == 'e_0_energy':
+                            self._step['energy'] = float(i.text)
+                # the children of a step, eigenvalues and DOS included, are dropped once read
+                elem.clear()
+
+    def arrays(self) -> dict:
+        return {name: np.array(values, dtype=float) for name, values in self.columns.items()}
+
+class Job:
+    """Watched files of one calculation directory and their readers"""
+
+    def __init__(self, directory: str, prefix: str, quantities: list, vasprun: bool) -> None:
+        self.prefix = prefix
+        self.readers = {os.path.join(directory, 'OSZICAR'): vasp_importers.OszicarReader(
+            os.path.join(directory, 'OSZICAR'), quantities)}
+        if vasprun:
+            path = os.path.join(directory, 'vasprun.xml')
+            self.readers[path] = VasprunFollower(path)
+        self.quantities = quantities
+        self.stamps = {}
+
+    def _changed(self, path: str) -> bool:
+        """Whether path changed since the previous call, from its size and
+        modification time only"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        stamp = (st.st_size, st.st_mtime_ns)
+        if self.stamps.get(path) == stamp:
+            return False
+        self.stamps[path] = stamp
+        return True
+
+    def poll(self) -> dict:
+        """Datasets of the files that changed, by name"""
+        datasets = {}
+        for path, reader in self.readers.items():
+            if not self._changed(path):
+                continue
+            try:
+                arrays = reader.update().arrays()
+            except (OSError, ET.ParseError):
+                # a file being replaced is read again at the next poll
+                self.stamps.pop(path, None)
+                continue
+            if isinstance(reader, VasprunFollower):
+                for name, values in arrays.items():
+                    datasets[self.prefix+'_vasprun_'+name] = values
+                datasets[self.prefix+'_vasprun_indices'] = np.arange(len(arrays['energy']))+1
+                continue
+            for quantity in self.quantities:
+                if quantity in arrays:
+                    datasets[self.prefix+'_'+quantity] = arrays[quantity]
+            datasets[self.prefix+'_indices'] = np.arange(reader.nsteps)+1
+            scf = [quantity for quantity in self.quantities if quantity.startswith('scf_') and quantity in arrays]
+            if scf:
+                datasets[self.prefix+'_scf_indices'] = np.arange(len(arrays[scf[0]]))+1
+        return datasets
+
+class Monitor:
+    """Jobs of directories pushing their new datasets into target, an
+    veusz.embed.Embedded window or any object with SetData(name, values)"""
+
+    def __init__(self, directories: list, quantities: list, vasprun: bool, target) -> None:
+        prefixes = vasp_importers.batch_prefixes([os.path.join(d, 'OSZICAR') for d in directories])
+        self.jobs = [Job(d, prefix, quantities, vasprun) for d, prefix in zip(directories, prefixes)]
+        self.quantities = quantities
+        self.vasprun = vasprun
+        self.target = target
+
+    def poll(self) -> int:
+        """Push the datasets of the jobs whose files changed; returns their number"""
+        count = 0
+        for job in self.jobs:
+            for name, values in job.poll().items():
+                self.target.SetData(name, values)
+                count += 1
+        return count
+
+    def plots(self) -> list:
+        """(graph name, x suffix, y suffix) of the plotted quantities"""
+        plots = []
+        for quantity in self.quantities:
+            if quantity in vasp_importers.OszicarReader.SCF:
+                plots.append((quantity, 'scf_indices', quantity))
+            elif quantity != 'scf_ionic':
+                plots.append((quantity, 'indices', quantity))
+        if self.vasprun:
+            plots.append(('fmax', 'vasprun_indices', 'vasprun_fmax'))
+        return plots
+
+    def draw(self, root):
+        """Grid of one graph per quantity with a line per job, drawn once"""
+        page = root.Add('page')
+        grid = page.Add('grid', columns=1 if len(self.plots()) < 3 else 2)
+        for i, (name, x, y) in enumerate(self.plots()):
+            graph = grid.Add('graph', name=name)
+            graph.x.label.val = 'Step'
+            graph.y.label.val = name
+            for job in self.jobs:
+                graph.Add('xy', name=job.prefix, marker='none', xData=job.prefix+'_'+x, yData=job.prefix+'_'+y,
+                          key=job.prefix)
+            if i == 0 and len(self.jobs) > 1:
+                graph.Add('key')
+
+def directories(patterns: list) -> list:
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))):
+            path = os.path.normpath(path)
+            if os.path.isdir(path) and path not in found:
+                found.append(path)
+    return found
+
+def main(argv: list=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('directories', nargs='+', help='calculation directories or globs')
+    parser.add_argument('--quantities', default='E0 dE', help='OSZICAR quantities, as in the OSZICAR plugin')
+    parser.add_argument('--vasprun', action='store_true', help='also follow vasprun.xml (energies, largest force)')
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between polls')
+    args = parser.parse_args(argv)
+
+    dirs = directories(args.directories)
+    if len(dirs) == 0:
+        parser.error('no directories match')
+    import veusz.embed as embed
+
+    window = embed.Embedded('VASP monitor')
+    monitor = Monitor(dirs, args.quantities.split(), args.vasprun, window)
+    monitor.poll()
+    monitor.draw(window.Root)
+    try:
+        while not window.IsClosed():
+            time.sleep(args.interval)
+            monitor.poll()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
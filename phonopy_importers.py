@@ -1,7 +1,99 @@
 import numpy as np
-import h5py
 import veusz.plugins as plugins
 
+import io
+import os
+import sys
+
+def _plugin_file(basename: str) -> str:
+    """Path of this plugin file: Veusz executes plugin files with exec instead
+    of importing them, leaving __file__ unset, so it is then taken from the
+    frames loading the plugin"""
+    if '__file__' in globals():
+        return os.path.abspath(__file__)
+    frame = sys._getframe(1)
+    while frame is not None:
+        for value in list(frame.f_locals.values()):
+            name = getattr(value, 'name', None) if isinstance(value, io.IOBase) else value
+            if isinstance(name, str) and os.path.basename(name) == basename and os.path.isfile(name):
+                return os.path.abspath(name)
+        frame = frame.f_back
+    raise ImportError('Cannot locate the plugin file ' + basename)
+
+# the directory of the plugin files, on the path so that the helpers shared
+# with vasp_importers are imported from it
+PLUGIN_DIR = os.path.dirname(_plugin_file('phonopy_importers.py'))
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+
+from importer_tools import _numbers, background, instrument_fields, instrumented, phase, progress
+
+def select_phonon_bands(frequency: 'h5py.Dataset', band_range: str, fwindow: str) -> np.ndarray:
+    """0-based indices of the bands in band_range ("first last", 1-based) that
+    reach into fwindow ("fmin fmax"); the frequency window is checked segment
+    by segment so that the frequencies are never read at once"""
+    nbands = frequency.shape[-1]
+    first, last = 1, nbands
+    if band_range.strip() != '':
+        first, last = _numbers(band_range, 'Band range', int)
+    indices = np.arange(max(first, 1)-1, min(last, nbands))
+    if fwindow.strip() != '' and len(indices) > 0:
+        fmin, fmax = _numbers(fwindow, 'Frequency window')
+        lower = np.full(len(indices), np.inf)
+        upper = np.full(len(indices), -np.inf)
+        for i in range(frequency.shape[0]):
+            segment = frequency[i, :, indices[0]:indices[-1]+1]
+            lower = np.minimum(lower, segment.min(axis=0))
+            upper = np.maximum(upper, segment.max(axis=0))
+        indices = indices[(upper >= fmin) & (lower <= fmax)]
+    if len(indices) == 0:
+        raise plugins.ImportPluginException('No bands in the band range and frequency window')
+    return indices
+
+def read_dispersion(filename: str, band_range: str='', fwindow: str='') -> dict:
+    """Read band.hdf5 segment by segment into NaN-separated, band-major output
+    arrays allocated once; the file is closed on return"""
+    # h5py is imported on first use to keep it out of the Veusz startup
+    import h5py
+
+    with phase('read band.hdf5'), h5py.File(filename, 'r') as phf:
+        frequency = phf['frequency']
+        distance = phf['distance'][:]
+        label = phf['label'][:]
+        segment_nqpoint = phf['segment_nqpoint'][:]
+        nseg = distance.shape[0]
+        nbands = frequency.shape[-1]
+
+        with phase('band selection'):
+            indices = select_phonon_bands(frequency, band_range, fwindow)
+        # every segment is preceded by a NaN separator
+        starts = np.cumsum(np.append(0, segment_nqpoint[:-1]+1)) + 1
+        ncols = int(np.sum(segment_nqpoint)) + nseg
+        freq = np.full((len(indices), ncols), np.nan)
+        dist = np.full(ncols, np.nan)
+        for i, (start, nq) in enumerate(zip(starts, segment_nqpoint)):
+            progress('Reading band.hdf5: segment %d of %d' % (i+1, nseg), i, nseg)
+            # a hyperslab of the selected span, as point selections are slow in h5py
+            segment = frequency[i, :nq, indices[0]:indices[-1]+1]
+            freq[:, start:start+nq] = segment[:, indices-indices[0]].T
+            dist[start:start+nq] = distance[i, :nq]
+
+    tickd = np.append(distance[:,0], distance[-1, segment_nqpoint[-1]-1])
+    tickl = [bytes.decode(i) for i in np.append(label[:,0], label[-1,-1])]
+    for i in np.arange(0, len(tickl)):
+        if tickl[i] == '$\Gamma$':
+            tickl[i] = '\Gamma'
+
+    return {
+        'distances': np.tile(dist, len(indices)),
+        'frequencies': freq.reshape(-1),
+        'tickd': tickd,
+        'tickl': tickl,
+        'nbands': nbands,
+        'band_indices': indices+1,
+        'distance': distance,
+    }
+
 class ImportPluginPhononDispersion(plugins.ImportPlugin):
     """An example plugin for reading a set of unformatted numbers
     from a file."""
@@ -18,54 +110,36 @@ class ImportPluginPhononDispersion(plugins.ImportPlugin):
     def __init__(self):
         plugins.ImportPlugin.__init__(self)
         self.fields = [
+            plugins.ImportFieldText('band_range', descr='Band range "first last" (blank for all bands)', default=''),
+            plugins.ImportFieldText('fwindow', descr='Frequency window "fmin fmax" in THz (blank for all bands)', default=''),
             plugins.ImportFieldCheck('details', descr='Detailed Information')
-        ]
+        ] + instrument_fields()
 
+    @background
+    @instrumented
     def doImport(self, params: plugins.ImportPluginParams):
         """Actually import data
         params is a ImportPluginParams object.
         Return a list of ImportDataset1D, ImportDataset2D objects
         """
 
-        phf = h5py.File(params.filename)
-        distance = phf['distance'][:]
-        frequency = phf['frequency'][:]
-        label = phf['label'][:]
-        nqpoint = phf['nqpoint'][0]
-        path = phf['path'][:]
-        segment_nqpoint = phf['segment_nqpoint'][:]
-
-        nseg = distance.shape[0]
-        nbands = frequency.shape[-1]
-        dist = np.concatenate((np.array([[np.nan]]*nseg), distance), axis=1).reshape((1,-1))
-        dist = np.repeat(dist, nbands, axis=0).flatten()
-
-        freq = np.insert(frequency, range(nseg), np.array([[np.nan]*nbands]), axis=0)
-        freq = np.concatenate(
-                sum(
-                    [[np.array([[np.nan]*nbands]), frequency[i,:,:]] for i in np.arange(nseg)],
-                []),
-            axis=0)
-        freq = freq.T.flatten()
-
-        tickd = np.append(distance[:,0], distance[-1,-1])
-        tickl = [bytes.decode(i) for i in np.append(label[:,0], label[-1,-1])]
-        for i in np.arange(0, len(tickl)):
-            if tickl[i] == '$\Gamma$':
-                tickl[i] = '\Gamma'
+        dispersion = read_dispersion(params.filename, params.field_results['band_range'],
+                                     params.field_results['fwindow'])
 
         details = []
         if params.field_results['details']:
             details = [
-                plugins.ImportDataset1D('nbands', [nbands]),
-                plugins.ImportDataset1D('distances1', distance)
+                plugins.ImportDataset1D('nbands', [len(dispersion['band_indices'])]),
+                plugins.ImportDataset1D('distances1', dispersion['distance'])
             ]
+            if len(dispersion['band_indices']) != dispersion['nbands']:
+                details.append(plugins.ImportDataset1D('band_indices', dispersion['band_indices']))
 
         return [
-            plugins.ImportDataset1D('distances', dist),
-            plugins.ImportDataset1D('frequencies', freq),
-            plugins.ImportDataset1D('tickd', tickd),
-            plugins.ImportDatasetText('tickl', tickl)
+            plugins.ImportDataset1D('distances', dispersion['distances']),
+            plugins.ImportDataset1D('frequencies', dispersion['frequencies']),
+            plugins.ImportDataset1D('tickd', dispersion['tickd']),
+            plugins.ImportDatasetText('tickl', dispersion['tickl'])
         ] +  details
     
 plugins.importpluginregistry += [
@@ -0,0 +1,53 @@
+"""Fixtures of the tests: small synthetic inputs written by
+benchmarks/synthetic.py, and the plugin modules imported from the repository
+with their session and on-disk caches isolated per test"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+# vasprun.xml (segments, points per segment, bands, ions, NEDOS) of the fixtures
+SMALL = dict(nsegments=3, npoints=20, nbands=12, nions=4, nedos=301)
+
+@pytest.fixture(scope='session')
+def calcs(tmp_path_factory) -> dict:
+    """Directories of synthetic calculations, by name: spin-polarized 'pbe',
+    'nsp' without spin, 'hybrid' with a weighted SCF block, 'projected'
+    with band projections and 'gapped' with the Fermi energy in a gap"""
+    import synthetic
+
+    root = tmp_path_factory.mktemp('calcs')
+    directories = {}
+    for name, options in [('pbe', {}), ('nsp', {'ispin': 1}), ('hybrid', {'hybrid_nscf': 10}),
+                          ('projected', {'projected': True}), ('gapped', {'nbands': 10})]:
+        directories[name] = str(root / name)
+        synthetic.write_vasprun(directories[name], **dict(SMALL, **options))
+    return directories
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Fresh parse cache directory and empty session caches for every test"""
+    monkeypatch.setenv('VEUSZ_PLUGINS_CACHE', str(tmp_path / 'cache'))
+    if 'vasp_importers' in sys.modules:
+        vasp_importers = sys.modules['vasp_importers']
+        monkeypatch.setattr(vasp_importers, 'parse_cache', vasp_importers.ParseCache())
+        vasp_importers._readers.clear()
+        vasp_importers._oszicar_readers.clear()
+
+@pytest.fixture
+def run_import():
+    """Run the doImport of a plugin with its default fields updated by
+    fields; returns the data of the datasets by name"""
+    import veusz.plugins as plugins
+
+    def run(module: str, plugin_name: str, filename: str, **fields) -> dict:
+        plugin = getattr(__import__(module), plugin_name)()
+        field_results = {field.name: field.default for field in plugin.fields}
+        field_results.update(fields)
+        params = plugins.ImportPluginParams(filename, 'utf-8', field_results)
+        return {dataset.name: dataset.data for dataset in plugin.doImport(params)}
+    return run
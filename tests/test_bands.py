@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+plugins = pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+@pytest.fixture
+def mbs(calcs):
+    directory = calcs['projected']
+    return vasp_importers.MyBandStructure(os.path.join(directory, 'vasprun.xml'), False,
+                                          os.path.join(directory, 'KPOINTS'), projected=True)
+
+def test_parse_path():
+    assert vasp_importers.MyBandStructure.parse_path('G-X-W') == [['G', 'X'], ['X', 'W']]
+    assert vasp_importers.MyBandStructure.parse_path('G-X|K-G') == [['G', 'X'], ['K', 'G']]
+
+def test_change_path_reorders_and_flips_branches(mbs):
+    (g, x), (_, w), (_, k) = mbs.branches
+    original = vasp_importers.MyBandStructure.from_arrays(mbs.to_arrays())
+    lengths = original.distances[original.end_indices] - original.distances[original.breaks]
+    # W-K and X-W backwards, then G-X again after a jump
+    assert mbs.change_path('-'.join([k, w, x]) + '|' + g + '-' + x)
+    assert mbs.branches == [[k, w], [w, x], [g, x]]
+    np.testing.assert_array_equal(mbs.breaks, [0, 20, 40])
+    np.testing.assert_array_equal(mbs.end_indices, [19, 39, 59])
+    index = np.concatenate([np.arange(59, 39, -1), np.arange(39, 19, -1), np.arange(20)])
+    for spin in original.bands:
+        np.testing.assert_array_equal(mbs.bands[spin], original.bands[spin][:,index])
+        np.testing.assert_array_equal(mbs.occupations[spin], original.occupations[spin][:,index])
+        np.testing.assert_array_equal(mbs.projections[spin], original.projections[spin][...,index])
+    # every branch keeps its length, and the path starts again where the previous branch ends
+    assert mbs.distances[0] == 0
+    assert np.all(np.diff(mbs.distances) >= 0)
+    np.testing.assert_allclose(mbs.distances[mbs.end_indices] - mbs.distances[mbs.breaks], lengths[[2, 1, 0]])
+    np.testing.assert_allclose(mbs.distances[mbs.breaks[1:]], mbs.distances[mbs.end_indices[:-1]])
+
+def test_change_path_repeats_a_branch(mbs):
+    g, x = mbs.branches[0]
+    bands = mbs.bands['up'].copy()
+    assert mbs.change_path('-'.join([g, x, g]))
+    np.testing.assert_array_equal(mbs.bands['up'], np.concatenate([bands[:,:20], bands[:,19::-1]], axis=1))
+    assert mbs.distances[-1] == pytest.approx(2*mbs.distances[19])
+
+def test_change_path_with_unknown_branch(mbs):
+    g, x = mbs.branches[0]
+    distances = mbs.distances.copy()
+    assert not mbs.change_path(g + '-L')
+    assert mbs.branches[0] == [g, x]
+    np.testing.assert_array_equal(mbs.distances, distances)
+
+def _reaching(mbs, emin: float, emax: float) -> np.ndarray:
+    """1-based indices of the bands of any spin reaching into [emin, emax]"""
+    bands = np.concatenate([mbs.bands[spin][:,None] for spin in mbs.bands], axis=1)
+    return np.flatnonzero(((bands >= emin) & (bands <= emax)).any(axis=(1, 2)) |
+                          ((bands.min(axis=(1, 2)) <= emin) & (bands.max(axis=(1, 2)) >= emax))) + 1
+
+def test_filter_bands_keeps_everything_by_default(mbs):
+    assert vasp_importers.filter_bands(mbs, '', True, '', mbs.efermi) is None
+    assert mbs.nbands == 12
+
+def test_filter_bands_by_energy_window(mbs):
+    bands = {spin: values.copy() for spin, values in mbs.bands.items()}
+    expected = _reaching(mbs, mbs.efermi-3, mbs.efermi+3)
+    indices = vasp_importers.filter_bands(mbs, '-3 3', True, '', mbs.efermi)
+    assert 0 < len(expected) < 12
+    np.testing.assert_array_equal(indices, expected)
+    assert mbs.nbands == len(indices)
+    for spin in bands:
+        # the spins share the kept bands
+        np.testing.assert_array_equal(mbs.bands[spin], bands[spin][indices-1])
+        assert mbs.occupations[spin].shape == mbs.projections[spin].shape[1:] == mbs.bands[spin].shape
+
+def test_filter_bands_by_absolute_window_and_range(mbs):
+    expected = _reaching(mbs, 0, 10)
+    indices = vasp_importers.filter_bands(mbs, '0 10', False, '%d 12' % (expected[0]+1), mbs.efermi)
+    np.testing.assert_array_equal(indices, expected[1:])
+
+def test_plugin_band_range(calcs, run_import):
+    filename = os.path.join(calcs['pbe'], 'vasprun.xml')
+    data = run_import('vasp_importers', 'ImportPluginBandStructure', filename, band_range='3 5', details=True)
+    np.testing.assert_array_equal(data['band_indices'], [3, 4, 5])
+    assert data['nbands'][0] == 3
+    assert len(data['bands_up']) == len(data['distances']) == 3*(60+3)
+    with pytest.raises(plugins.ImportPluginException):
+        run_import('vasp_importers', 'ImportPluginBandStructure', filename, ewindow='-1')
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+plugins = pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+def _datasets(results: list) -> list:
+    return [{name: data for _, name, data in datasets} for datasets, error in results]
+
+def test_batch_prefixes():
+    files = ['/runs/a/vasprun.xml', '/runs/b/c/vasprun.xml']
+    assert vasp_importers.batch_prefixes(files) == ['a', 'b_c']
+    assert vasp_importers.batch_prefixes(['/runs/a/1.xml', '/runs/a/2.xml']) == ['1.xml', '2.xml']
+
+def test_batch_import_spawned_workers(calcs):
+    files = [os.path.join(calcs[name], 'vasprun.xml') for name in ['pbe', 'nsp']]
+    fields = {'cache': 'Off'}
+    pooled = vasp_importers.batch_import('Band structure', files, 'utf-8', fields, workers=2)
+    direct = vasp_importers.batch_import('Band structure', files, 'utf-8', fields, workers=1)
+    assert [error for _, error in pooled] == [None, None]
+    for a, b in zip(_datasets(pooled), _datasets(direct)):
+        assert sorted(a) == sorted(b)
+        for name in a:
+            if isinstance(a[name], np.ndarray):
+                np.testing.assert_array_equal(a[name], b[name])
+
+def test_batch_errors_do_not_abort(calcs, tmp_path):
+    broken = tmp_path / 'broken' / 'vasprun.xml'
+    broken.parent.mkdir()
+    broken.write_text('<modeling>\n')
+    files = [os.path.join(calcs['pbe'], 'vasprun.xml'), str(broken)]
+    results = vasp_importers.batch_import('DOS', files, 'utf-8', {'cache': 'Off'}, workers=2)
+    assert results[0][1] is None and results[0][0]
+    assert results[1][0] is None and results[1][1]
+
+def test_batch_plugin_loaded_by_veusz(calcs, monkeypatch):
+    """Veusz executes plugin files with exec(f.read(), {}), without a file
+    name, and the workers must still find the plugin directory"""
+    monkeypatch.setattr(plugins, 'importpluginregistry', list(plugins.importpluginregistry))
+
+    def loadPlugins(pluginlist):
+        for plugin in pluginlist:
+            with open(plugin) as f:
+                exec(f.read(), {})
+
+    loadPlugins([os.path.join(vasp_importers.PLUGIN_DIR, 'vasp_importers.py')])
+    batch = plugins.importpluginregistry[-1]()
+    assert batch.name == vasp_importers.ImportPluginBatch.name
+    field_results = {field.name: field.default for field in batch.fields}
+    field_results.update(files=os.path.join(calcs['pbe'], '..', '*', ''), workers=2, cache='Off',
+                         kind='Band structure')
+    params = plugins.ImportPluginParams(os.path.join(calcs['pbe'], 'vasprun.xml'), 'utf-8', field_results)
+    names = [dataset.name for dataset in batch.doImport(params)]
+    assert 'batch_errors' not in names
+    assert {'pbe_bands_up', 'nsp_bands_up', 'hybrid_bands_up', 'projected_bands_up'} <= set(names)
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+@pytest.fixture
+def source(tmp_path) -> str:
+    filename = str(tmp_path / 'source.txt')
+    with open(filename, 'w') as f:
+        f.write('1 2 3\n')
+    return filename
+
+def _arrays(n: int=10) -> dict:
+    return {'values': np.arange(n, dtype=float), 'names': np.array(['a', 'b'])}
+
+def test_round_trip(tmp_path, source):
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    assert cache.load([source], 'kind') is None
+    cache.save([source], 'kind', _arrays())
+    arrays = cache.load([source], 'kind')
+    np.testing.assert_array_equal(arrays['values'], _arrays()['values'])
+    assert list(arrays['names']) == ['a', 'b']
+    # the kind and options are part of the key
+    assert cache.load([source], 'other') is None
+    assert cache.load([source], 'kind', (True,)) is None
+
+def test_changed_source_misses_and_replaces(tmp_path, source):
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    cache.save([source], 'kind', _arrays())
+    with open(source, 'a') as f:
+        f.write('4\n')
+    assert cache.load([source], 'kind') is None
+    cache.save([source], 'kind', _arrays(5))
+    assert len(cache._entries()) == 1
+    assert len(cache.load([source], 'kind')['values']) == 5
+
+def test_same_size_rewrite_misses(tmp_path, source):
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    cache.save([source], 'kind', _arrays())
+    st = os.stat(source)
+    with open(source, 'w') as f:
+        f.write('3 2 1\n')
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load([source], 'kind') is None
+
+def test_hash_content_ignores_touch(tmp_path, source):
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'), hash_content=True)
+    cache.save([source], 'kind', _arrays())
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load([source], 'kind') is not None
+
+def test_companion_file_invalidates(tmp_path, source):
+    companion = str(tmp_path / 'KPOINTS')
+    with open(companion, 'w') as f:
+        f.write('path\n')
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    cache.save([source, companion], 'kind', _arrays())
+    with open(companion, 'a') as f:
+        f.write('changed\n')
+    assert cache.load([source, companion], 'kind') is None
+
+def test_invalidate(tmp_path, source):
+    other = str(tmp_path / 'other.txt')
+    with open(other, 'w') as f:
+        f.write('other\n')
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    cache.save([source], 'kind', _arrays())
+    cache.save([other], 'kind', _arrays())
+    cache.invalidate(source)
+    assert cache.load([source], 'kind') is None
+    assert cache.load([other], 'kind') is not None
+    cache.invalidate()
+    assert cache._entries() == []
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    sources = []
+    for i in range(3):
+        sources.append(str(tmp_path / ('source%d.txt' % i)))
+        with open(sources[-1], 'w') as f:
+            f.write(str(i))
+        cache.save([sources[-1]], 'kind', _arrays(1000))
+        path = cache._path([sources[-1]], 'kind', ())
+        os.utime(path, (i, i))
+    entry = os.path.getsize(path)
+    cache.load([sources[0]], 'kind')
+    cache.max_bytes = 2*entry
+    cache._evict()
+    assert cache.load([sources[1]], 'kind') is None
+    assert cache.load([sources[0]], 'kind') is not None
+    assert cache.load([sources[2]], 'kind') is not None
+
+def test_oversize_entry_is_not_kept(tmp_path, source):
+    other = str(tmp_path / 'other.txt')
+    with open(other, 'w') as f:
+        f.write('other\n')
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    cache.save([other], 'kind', _arrays())
+    cache.save([source], 'kind', _arrays())
+    cache.max_bytes = 2*os.path.getsize(cache._path([other], 'kind', ()))
+    cache.save([source], 'kind', _arrays(10**5))
+    # neither the entry itself nor the others make way for it
+    assert len(cache.load([source], 'kind')['values']) == 10
+    assert cache.load([other], 'kind') is not None
+    assert sorted(os.listdir(cache.directory)) == sorted(cache._entries())
+
+def test_format_is_part_of_the_key(tmp_path, source, monkeypatch):
+    cache = vasp_importers.ParseCache(str(tmp_path / 'cache'))
+    cache.save([source], 'kind', _arrays())
+    monkeypatch.setattr(vasp_importers, 'CACHE_FORMAT', vasp_importers.CACHE_FORMAT + 1)
+    assert cache.load([source], 'kind') is None
+    cache.save([source], 'kind', _arrays(5))
+    assert len(cache.load([source], 'kind')['values']) == 5
+
+def test_cached_parse_modes(source):
+    calls = []
+    def parse():
+        calls.append(1)
+        return _arrays()
+
+    for mode, parsed in [('Use', 1), ('Use', 0), ('Refresh', 1), ('Use', 0), ('Off', 1)]:
+        del calls[:]
+        arrays = vasp_importers.cached_parse(mode, [source], 'kind', parse)
+        assert len(calls) == parsed, mode
+        np.testing.assert_array_equal(arrays['values'], _arrays()['values'])
+    vasp_importers.parse_cache.invalidate()
+    vasp_importers.cached_parse('Off', [source], 'kind', parse)
+    assert vasp_importers.parse_cache.load([source], 'kind') is None
+
+def test_rewritten_vasprun_is_parsed_again(calcs, tmp_path, run_import):
+    filename = str(tmp_path / 'vasprun.xml')
+    with open(os.path.join(calcs['pbe'], 'vasprun.xml')) as f:
+        text = f.read()
+    os.symlink(os.path.join(calcs['pbe'], 'KPOINTS'), str(tmp_path / 'KPOINTS'))
+    with open(filename, 'w') as f:
+        f.write(text)
+    first = run_import('vasp_importers', 'ImportPluginBandStructure', filename, sub_fermi=True)
+    # a later run in the same directory, of the same size but with another Fermi energy
+    st = os.stat(filename)
+    with open(filename, 'w') as f:
+        f.write(text.replace('<i name="efermi">%16.8f</i>' % 5, '<i name="efermi">%16.8f</i>' % 6))
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    second = run_import('vasp_importers', 'ImportPluginBandStructure', filename, sub_fermi=True)
+    np.testing.assert_allclose(second['bands_up'], first['bands_up'] - 1)
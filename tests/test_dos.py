@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+plugins = pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+def _densities(n: int=401, seed: int=0) -> tuple:
+    rng = np.random.default_rng(seed)
+    energies = np.round(np.linspace(-10, 10, n), 4)
+    return energies, rng.random((3, n))*(np.abs(energies) < 8)
+
+def _kernel(energies: np.ndarray, width: float, shape: str) -> np.ndarray:
+    de = energies[1]-energies[0]
+    x = de*np.arange(-(len(energies)-1), len(energies))
+    if shape == 'Gaussian':
+        kernel = np.exp(-4*np.log(2)*(x/width)**2)
+    else:
+        kernel = (width/2)**2/(x**2 + (width/2)**2)
+    return kernel/kernel.sum()
+
+@pytest.mark.parametrize('shape', ['Gaussian', 'Lorentzian'])
+@pytest.mark.parametrize('width', [0.05, 0.5, 3.])
+def test_broaden_matches_convolve(shape, width):
+    energies, densities = _densities()
+    n = len(energies)
+    kernel = _kernel(energies, width, shape)
+    expected = np.array([np.convolve(row, kernel)[n-1:2*n-1] for row in densities])
+    np.testing.assert_allclose(vasp_importers.broaden(energies, densities, width, shape), expected, atol=1e-12)
+
+@pytest.mark.parametrize('shape', ['Gaussian', 'Lorentzian'])
+def test_broadened_peak_width_and_area(shape):
+    energies = np.linspace(-20, 20, 4001)
+    delta = (energies == 0).astype(float)
+    peak = vasp_importers.broaden(energies, delta, 1.0, shape)
+    half = energies[peak >= peak.max()/2]
+    np.testing.assert_allclose(half[-1]-half[0], 1.0, atol=2*(energies[1]-energies[0]))
+    # the tails of the Lorentzian beyond the grid are lost
+    np.testing.assert_allclose(peak.sum(), 1.0, rtol=1e-12 if shape == 'Gaussian' else 0.05)
+
+def test_broaden_needs_a_uniform_grid():
+    energies, densities = _densities()
+    energies[200:] += 0.01
+    with pytest.raises(plugins.ImportPluginException):
+        vasp_importers.broaden(energies, densities, 0.1)
+
+def test_resample_matches_interp():
+    energies, densities = _densities()
+    grid = np.linspace(-12, 12, 777)
+    expected = np.array([np.interp(grid, energies, row, left=0, right=0) for row in densities])
+    np.testing.assert_allclose(vasp_importers.resample(energies, densities, grid), expected, atol=1e-12)
+
+def test_energy_grid():
+    np.testing.assert_allclose(vasp_importers.energy_grid('-1 1 0.5'), [-1, -0.5, 0, 0.5, 1])
+    assert vasp_importers.energy_grid(' ') is None
+    for egrid in ['1 -1 0.5', '-1 1 0', '-1 1', 'a b c']:
+        with pytest.raises(plugins.ImportPluginException):
+            vasp_importers.energy_grid(egrid)
+
+def test_dos_plugin_broadening_and_grid(calcs, run_import):
+    filename = os.path.join(calcs['pbe'], 'vasprun.xml')
+    plain = run_import('vasp_importers', 'ImportPluginDOS', filename)
+    data = run_import('vasp_importers', 'ImportPluginDOS', filename, broadening=0.3, egrid='-2 2 0.01')
+    np.testing.assert_allclose(data['energies'], vasp_importers.energy_grid('-2 2 0.01'))
+    energies = np.asarray(plain['energies'])
+    expected = vasp_importers.resample(energies, vasp_importers.broaden(
+        energies, np.array([plain['tdos_up'], plain['tdos_dw']]), 0.3), data['energies'])
+    np.testing.assert_allclose([data['tdos_up'], data['tdos_dw']], expected, atol=1e-12)
@@ -0,0 +1,111 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+# two branches of 41 k-points, so that edges can sit on the branch ends
+DISTANCES = np.concatenate([np.linspace(0, 1, 41), np.linspace(1, 1.8, 41)])
+
+def _band_structure(efermi: float, occupations: dict={}, **bands):
+    """Band structure of (band, kpoint) arrays per spin along DISTANCES"""
+    npts = np.array([41, 41])
+    end_indices = np.cumsum(npts) - 1
+    return SimpleNamespace(bands={spin: np.array(value) for spin, value in bands.items()}, efermi=efermi,
+                           occupations=occupations, distances=DISTANCES, breaks=end_indices - npts + 1,
+                           end_indices=end_indices)
+
+def _parabola(e0: float, d0: float, mass: float) -> np.ndarray:
+    """Band of the given effective mass, in electron masses, at d0"""
+    return e0 + vasp_importers.HBAR2_2ME/mass*(DISTANCES - d0)**2
+
+def test_edge_mass_of_a_parabola():
+    for mass in [0.1, 1.0, -0.4, 7.5]:
+        band = _parabola(1.0, DISTANCES[20], mass)
+        assert vasp_importers.edge_mass(band, DISTANCES, 20, 0, 40) == pytest.approx(mass, rel=1e-12)
+
+def test_edge_mass_stays_within_the_branch():
+    band = _parabola(0.0, DISTANCES[40], 0.5)
+    # another branch leaving the same k-point
+    band[41:] = 5.0
+    assert vasp_importers.edge_mass(band, DISTANCES, 40, 0, 40) == pytest.approx(0.5, rel=1e-12)
+    assert vasp_importers.edge_mass(band, DISTANCES, 40, 0, 40, npoints=1) == pytest.approx(0.5, rel=1e-12)
+
+def test_indirect_gap_and_masses():
+    valence = _parabola(0.0, DISTANCES[20], -0.8)
+    conduction = _parabola(1.5, DISTANCES[60], 0.3)
+    edges = vasp_importers.band_edges(_band_structure(0.7, up=[valence - 3, valence, conduction]))
+    assert edges['type'] == 'indirect'
+    assert edges['vbm'] == 0.0 and edges['cbm'] == 1.5 and edges['gap'] == 1.5
+    assert edges['direct_gap'] == pytest.approx(np.min(conduction - valence))
+    up = edges['up']
+    assert (up['vbm_band'], up['vbm_k'], up['cbm_band'], up['cbm_k']) == (1, 20, 2, 60)
+    assert up['mass_h'] == pytest.approx(-0.8) and up['mass_e'] == pytest.approx(0.3)
+
+def test_direct_gap():
+    valence = _parabola(0.0, DISTANCES[30], -1.0)
+    conduction = _parabola(2.0, DISTANCES[30], 1.0)
+    edges = vasp_importers.band_edges(_band_structure(1.0, up=[valence, conduction]))
+    assert edges['type'] == 'direct'
+    assert edges['gap'] == 2.0 and edges['direct_gap'] == pytest.approx(2.0)
+
+def test_direct_gap_is_taken_within_a_spin():
+    valence = _parabola(0.0, DISTANCES[30], -1.0)
+    conduction = _parabola(2.0, DISTANCES[30], 1.0)
+    edges = vasp_importers.band_edges(_band_structure(1.0, up=[valence, conduction], dw=[valence - 0.2, conduction - 0.5]))
+    assert edges['spins'] == ['up', 'dw']
+    assert (edges['up']['vbm'], edges['up']['cbm']) == (0.0, 2.0)
+    assert (edges['dw']['vbm'], edges['dw']['cbm']) == (-0.2, 1.5)
+    # the global edges are in different spins, which no direct transition joins
+    assert edges['vbm'] == 0.0 and edges['cbm'] == 1.5 and edges['gap'] == 1.5
+    assert edges['direct_gap'] == pytest.approx(1.7)
+    assert edges['type'] == 'indirect'
+
+def test_band_crossing_the_fermi_energy_is_a_metal():
+    band = np.linspace(-1, 1, len(DISTANCES))
+    edges = vasp_importers.band_edges(_band_structure(0.0, up=[band - 3, band, band + 3]))
+    assert edges['type'] == 'metal'
+    assert edges['gap'] == 0.0 and edges['direct_gap'] == 0.0
+
+def test_occupations_take_precedence_over_the_fermi_energy():
+    valence = _parabola(0.0, DISTANCES[20], -0.8)
+    conduction = _parabola(1.5, DISTANCES[60], 0.3)
+    occupations = {'up': np.array([np.ones_like(valence), np.zeros_like(conduction)])}
+    # a Fermi energy below the valence band maximum, as after a shift of the display
+    edges = vasp_importers.band_edges(_band_structure(-0.5, occupations, up=[valence, conduction]))
+    assert edges['type'] == 'indirect'
+    assert edges['vbm'] == 0.0 and edges['gap'] == 1.5
+
+def test_edge_datasets_of_the_plugin(calcs, run_import):
+    filename = os.path.join(calcs['pbe'], 'vasprun.xml')
+    data = run_import('vasp_importers', 'ImportPluginBandStructure', filename, edges=True, sub_fermi=True)
+    if data['gap_type'][0] == 'metal':
+        assert data['gap'][0] == 0.0
+    else:
+        assert data['gap'][0] == pytest.approx(data['cbm'][0] - data['vbm'][0])
+    for spin in ['up', 'dw']:
+        bands = np.asarray(data['bands_'+spin])
+        # the markers sit on the band maxima and minima around the Fermi energy
+        vbm, cbm = data['edges_e_'+spin]
+        assert vbm == np.nanmax(bands[bands <= 0]) and cbm == np.nanmin(bands[bands > 0])
+        assert data['edges_l_'+spin][0].startswith('VBM') and data['edges_l_'+spin][1].startswith('CBM')
+
+def test_bsdos_edges_with_the_fermi_energy_at_the_vbm(calcs, tmp_path, run_import):
+    vr = vasp_importers.read_vasprun(os.path.join(calcs['gapped'], 'vasprun.xml'))
+    vbm = np.max(vr.eigenvalues[vr.occupations > 0.5])
+    with open(os.path.join(calcs['gapped'], 'vasprun.xml')) as f:
+        text = f.read()
+    os.symlink(os.path.join(calcs['gapped'], 'KPOINTS'), str(tmp_path / 'KPOINTS'))
+    filename = str(tmp_path / 'vasprun.xml')
+    with open(filename, 'w') as f:
+        f.write(text.replace('<i name="efermi">%16.8f</i>' % 5, '<i name="efermi">%16.8f</i>' % vbm))
+    bands = run_import('vasp_importers', 'ImportPluginBandStructure', filename, edges=True)
+    bsdos = run_import('vasp_importers', 'ImportPluginBSDOS', filename, edges=True)
+    for data in [bands, bsdos]:
+        assert data['gap_type'][0] == 'indirect'
+        assert data['vbm'][0] == pytest.approx(vbm)
+    assert bsdos['gap'][0] == pytest.approx(bands['gap'][0])
+    assert bsdos['direct_gap'][0] == pytest.approx(bands['direct_gap'][0])
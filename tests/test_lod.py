@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+def _peaks(ncurves: int, n: int=30001, seed: int=0) -> tuple:
+    """Energies and ncurves DOS-like curves of narrow Gaussians on noise"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-20, 20, n)
+    centers = rng.uniform(-15, 15, (ncurves, 30, 1))
+    ys = (rng.random((ncurves, 30, 1))*np.exp(-(x-centers)**2/0.02)).sum(axis=1) + 0.01*rng.random((ncurves, n))
+    return x, ys
+
+def _keeps_extrema(ys: np.ndarray, index: np.ndarray) -> bool:
+    return set(ys.argmin(axis=1)) | set(ys.argmax(axis=1)) <= set(index.tolist())
+
+def test_off_and_short_curves_keep_everything():
+    ys = np.random.default_rng(0).random((3, 50))
+    np.testing.assert_array_equal(vasp_importers.lod_indices(ys, 'Off'), np.arange(50))
+    np.testing.assert_array_equal(vasp_importers.lod_indices(ys, 'Min-max', 100), np.arange(50))
+
+@pytest.mark.parametrize('ncurves', [1, 2, 10, 40, 100])
+def test_minmax_target_holds_for_all_curves(ncurves):
+    x, ys = _peaks(ncurves)
+    index = vasp_importers.lod_indices(ys, 'Min-max', 2000)
+    assert len(index) <= 2000
+    assert index[0] == 0 and index[-1] == ys.shape[1]-1
+    assert np.all(np.diff(index) > 0)
+    assert _keeps_extrema(ys, index)
+
+def test_minmax_keeps_the_extrema_of_every_curve_below_the_target():
+    ys = np.sin(np.linspace(0, 9, 600)[None,:]*np.arange(1, 501)[:,None]*0.01)
+    index = vasp_importers.lod_indices(ys, 'Min-max', 200)
+    assert _keeps_extrema(ys, index)
+
+@pytest.mark.parametrize('tolerance', [1e-3, 1e-2, 0.2])
+def test_douglas_peucker_bound_and_extrema(tolerance):
+    x, ys = _peaks(5, n=5001)
+    # one small curve next to large ones is simplified relative to its own range
+    ys[0] *= 1e-3
+    index = vasp_importers.lod_indices(ys, 'Douglas-Peucker', tolerance=tolerance, x=x)
+    assert _keeps_extrema(ys, index)
+    for y in ys:
+        error = np.abs(np.interp(x, x[index], y[index]) - y).max()
+        assert error <= tolerance*np.ptp(y) + 1e-12
+
+def test_douglas_peucker_straight_line():
+    x = np.linspace(0, 1, 101)
+    index = vasp_importers.lod_indices(np.vstack([2*x, -x]), 'Douglas-Peucker', tolerance=1e-6, x=x)
+    np.testing.assert_array_equal(index, [0, 100])
+
+@pytest.mark.parametrize('method', ['Min-max', 'Douglas-Peucker'])
+def test_decimated_bands_keep_the_layout(calcs, run_import, method):
+    filename = os.path.join(calcs['pbe'], 'vasprun.xml')
+    full = run_import('vasp_importers', 'ImportPluginBandStructure', filename)
+    lod = run_import('vasp_importers', 'ImportPluginBandStructure', filename, lod=method, lod_points=24,
+                     lod_tolerance=0.05)
+    assert len(lod['distances']) == len(lod['bands_up']) == len(lod['bands_dw'])
+    assert len(lod['bands_up']) < len(full['bands_up'])
+    # the k-path separators and ticks are unchanged
+    assert np.isnan(lod['bands_up']).sum() == np.isnan(full['bands_up']).sum()
+    np.testing.assert_array_equal(lod['tickd'], full['tickd'])
+    assert np.nanmax(lod['bands_up']) == np.nanmax(full['bands_up'])
+    assert np.nanmin(lod['bands_up']) == np.nanmin(full['bands_up'])
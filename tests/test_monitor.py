@@ -0,0 +1,60 @@
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.plugins')
+import monitor
+
+def _step(energy: float, nscf: int=2) -> str:
+    return (' <calculation>\n' + '  <scstep></scstep>\n'*nscf +
+            '  <varray name="forces" >\n   <v> 0.0 0.0 %f </v>\n  </varray>\n' % abs(energy) +
+            '  <energy>\n   <i name="e_0_energy"> %f </i>\n  </energy>\n </calculation>\n' % energy)
+
+def _write(filename: str, text: str, mode: str='w'):
+    with open(filename, mode) as f:
+        f.write(text)
+
+HEADER = '<?xml version="1.0" encoding="ISO-8859-1"?>\n<modeling>\n'
+
+def test_follows_appended_steps(tmp_path):
+    filename = str(tmp_path / 'vasprun.xml')
+    _write(filename, HEADER + _step(-1.0) + _step(-2.0, 3)[:40])
+    follower = monitor.VasprunFollower(filename)
+    np.testing.assert_array_equal(follower.update().arrays()['energy'], [-1.0])
+    _write(filename, _step(-2.0, 3)[40:], 'a')
+    arrays = follower.update().arrays()
+    np.testing.assert_array_equal(arrays['energy'], [-1.0, -2.0])
+    np.testing.assert_array_equal(arrays['fmax'], [1.0, 2.0])
+    np.testing.assert_array_equal(arrays['nscf'], [2, 3])
+
+def test_rewritten_file_is_read_from_its_start(tmp_path):
+    filename = str(tmp_path / 'vasprun.xml')
+    _write(filename, HEADER + _step(-1.0))
+    follower = monitor.VasprunFollower(filename)
+    follower.update()
+    # a restarted run, already longer than the previous one
+    _write(filename, HEADER.replace('ISO-8859-1', 'iso-8859-1') + _step(-3.0) + _step(-4.0))
+    np.testing.assert_array_equal(follower.update().arrays()['energy'], [-3.0, -4.0])
+
+def test_parse_error_resets_the_follower(tmp_path):
+    filename = str(tmp_path / 'vasprun.xml')
+    _write(filename, HEADER + _step(-1.0) + ' <calculation>\n  </energy>\n')
+    follower = monitor.VasprunFollower(filename)
+    with pytest.raises(ET.ParseError):
+        follower.update()
+    _write(filename, HEADER + _step(-1.0) + _step(-2.0))
+    np.testing.assert_array_equal(follower.update().arrays()['energy'], [-1.0, -2.0])
+
+def test_job_reads_a_broken_file_again(tmp_path):
+    filename = str(tmp_path / 'vasprun.xml')
+    _write(str(tmp_path / 'OSZICAR'), '')
+    _write(filename, HEADER + '<calculation></calculatiom>\n')
+    job = monitor.Job(str(tmp_path), 'job', ['E0'], True)
+    assert 'job_vasprun_energy' not in job.poll()
+    # the same size and modification time as the broken file
+    st = os.stat(filename)
+    _write(filename, HEADER + '<calculation></calculation>\n')
+    os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+    np.testing.assert_array_equal(job.poll()['job_vasprun_energy'], [np.nan])
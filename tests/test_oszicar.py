@@ -0,0 +1,103 @@
+import gzip
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.plugins')
+import synthetic
+import vasp_importers
+
+QUANTITIES = ['E0', 'F', 'dE', 'mag', 'nscf', 'scf_E', 'scf_rmsc', 'scf_ionic']
+
+def _assert_same(reader, expected):
+    arrays, expected = reader.arrays(), expected.arrays()
+    assert sorted(arrays) == sorted(expected)
+    for quantity in expected:
+        np.testing.assert_array_equal(arrays[quantity], expected[quantity])
+
+def _full(filename: str):
+    return vasp_importers.OszicarReader(filename, QUANTITIES).update()
+
+@pytest.fixture
+def oszicar(tmp_path) -> str:
+    return synthetic.write_oszicar(str(tmp_path / 'OSZICAR'), nionic=20, nscf=6)
+
+def test_columns(oszicar):
+    arrays = _full(oszicar).arrays()
+    assert len(arrays['E0']) == len(arrays['mag']) == 20
+    np.testing.assert_array_equal(arrays['nscf'], np.full(20, 6))
+    assert len(arrays['scf_E']) == len(arrays['scf_ionic']) == 120
+    # rms(c) is missing from the first electronic steps
+    assert np.isnan(arrays['scf_rmsc'][:3]).all() and not np.isnan(arrays['scf_rmsc'][3:6]).any()
+
+def test_md_columns(tmp_path):
+    filename = synthetic.write_oszicar(str(tmp_path / 'OSZICAR'), nionic=5, nscf=3, md=True)
+    arrays = vasp_importers.OszicarReader(filename).update().arrays()
+    assert {'T', 'E', 'F', 'E0', 'EK', 'SP', 'SK'} <= set(arrays)
+    assert 'mag' not in arrays and len(arrays['T']) == 5
+
+def test_plugin_datasets(oszicar, run_import):
+    for incremental in [False, True]:
+        data = run_import('vasp_importers', 'ImportPluginOszicar', oszicar, quantities='E0 nscf scf_E',
+                          incremental=incremental, sub_final=True)
+        assert data['E0'][-1] == 0.0
+        np.testing.assert_array_equal(data['indices'], np.arange(20)+1)
+        np.testing.assert_array_equal(data['scf_indices'], np.arange(120)+1)
+        np.testing.assert_array_equal(data['scf_E'], _full(oszicar).arrays()['scf_E'])
+
+def test_appended_chunks_match_a_full_read(oszicar, tmp_path):
+    with open(oszicar, 'rb') as f:
+        data = f.read()
+    growing = str(tmp_path / 'growing')
+    reader = vasp_importers.OszicarReader(growing, QUANTITIES)
+    # cuts inside lines are left for the next update
+    for end in [0, 1, 100, 101, 1000, 2500, 2501, 4000, len(data)]:
+        with open(growing, 'wb') as f:
+            f.write(data[:end])
+        reader.update()
+        assert reader.offset == data.rfind(b'\n', 0, end) + 1
+    _assert_same(reader, _full(oszicar))
+
+def test_rewritten_file_is_read_again(oszicar, tmp_path):
+    filename = str(tmp_path / 'rerun')
+    shutil.copy(oszicar, filename)
+    reader = vasp_importers.OszicarReader(filename, QUANTITIES).update()
+    # a new run writing a longer OSZICAR from the start
+    synthetic.write_oszicar(filename, nionic=30, nscf=6, seed=1)
+    reader.update()
+    _assert_same(reader, _full(filename))
+
+def test_truncated_file_is_read_again(oszicar, tmp_path):
+    filename = str(tmp_path / 'restart')
+    shutil.copy(oszicar, filename)
+    reader = vasp_importers.OszicarReader(filename, QUANTITIES).update()
+    with open(oszicar, 'rb') as f:
+        data = f.read()
+    with open(filename, 'wb') as f:
+        f.write(data[:len(data)//3])
+    reader.update()
+    _assert_same(reader, _full(filename))
+    assert len(reader.arrays()['E0']) < 20
+
+def test_new_quantities_reread(oszicar):
+    reader = vasp_importers.OszicarReader(oszicar, ['E0']).update()
+    assert sorted(reader.arrays()) == ['E0']
+    reader.require(['dE'])
+    reader.update()
+    assert sorted(reader.arrays()) == ['E0', 'dE']
+    assert len(reader.arrays()['dE']) == 20
+
+def test_compressed(oszicar):
+    with open(oszicar, 'rb') as src, gzip.open(oszicar + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    reader = vasp_importers.OszicarReader(oszicar + '.gz', QUANTITIES).update()
+    # compressed files are read in full on every update
+    reader.update()
+    _assert_same(reader, _full(oszicar))
+
+def test_follow_oszicar_shares_the_reader(oszicar):
+    reader = vasp_importers.follow_oszicar(oszicar, ['E0'])
+    assert vasp_importers.follow_oszicar(os.path.relpath(oszicar), ['dE']) is reader
+    assert {'E0', 'dE'} <= set(reader.arrays())
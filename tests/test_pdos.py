@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+
+plugins = pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+ORBITALS = ['s', 'py', 'pz', 'px', 'dxy']
+
+@pytest.fixture
+def dos() -> dict:
+    """Raw DOS arrays of dos_arrays for two Fe and two O sites"""
+    rng = np.random.default_rng(0)
+    return {'elements': np.array(['Fe', 'Fe', 'O', 'O']), 'orbitals': np.array(ORBITALS),
+            'pdos': rng.random((4, 2, 11, len(ORBITALS)))}
+
+def test_elements_and_orbitals(dos):
+    arrays = vasp_importers.pdos_arrays(dos)
+    assert set(arrays) == {'pdos_%s%s_%s' % (elem, orbital, spin) for elem in ['Fe', 'O']
+                           for orbital in ['', '_s', '_p', '_d'] for spin in ['up', 'dw']}
+    np.testing.assert_allclose(arrays['pdos_Fe_up'], dos['pdos'][:2,0].sum(axis=(0, 2)))
+    np.testing.assert_allclose(arrays['pdos_O_p_dw'], dos['pdos'][2:,1,:,1:4].sum(axis=(0, 2)))
+
+def test_selected_elements_and_orbitals(dos):
+    arrays = vasp_importers.pdos_arrays(dos, ['O', 'Mn'], ['px', 'd'])
+    assert set(arrays) == {'pdos_O%s_%s' % (orbital, spin) for orbital in ['', '_px', '_d'] for spin in ['up', 'dw']}
+    np.testing.assert_allclose(arrays['pdos_O_px_up'], dos['pdos'][2:,0,:,3].sum(axis=0))
+    np.testing.assert_allclose(arrays['pdos_O_d_up'], dos['pdos'][2:,0,:,4].sum(axis=0))
+
+def test_site_groups(dos):
+    sites = vasp_importers.parse_sites('top=1,3-4 Fe2=2')
+    assert sites == [('top', [0, 2, 3]), ('Fe2', [1])]
+    # site groups replace the element groups, unless elements are asked for
+    arrays = vasp_importers.pdos_arrays(dos, orbitals=['s'], sites=sites)
+    assert set(arrays) == {'pdos_%s%s_%s' % (name, orbital, spin) for name in ['top', 'Fe2']
+                           for orbital in ['', '_s'] for spin in ['up', 'dw']}
+    np.testing.assert_allclose(arrays['pdos_top_s_up'], dos['pdos'][[0, 2, 3],0,:,0].sum(axis=0))
+    np.testing.assert_allclose(arrays['pdos_Fe2_dw'], dos['pdos'][1,1].sum(axis=1))
+    arrays = vasp_importers.pdos_arrays(dos, ['Fe'], sites=sites)
+    np.testing.assert_allclose(arrays['pdos_Fe_up'], arrays['pdos_top_up'] - dos['pdos'][2:,0].sum(axis=(0, 2))
+                               + arrays['pdos_Fe2_up'])
+
+@pytest.mark.parametrize('spec', ['top', '=1', 'top=a', 'top=1-b', 'top=0', 'top=4-2', 'top=1,'])
+def test_invalid_site_groups(spec):
+    with pytest.raises(plugins.ImportPluginException):
+        vasp_importers.parse_sites(spec)
+
+def test_sites_beyond_the_structure(dos):
+    with pytest.raises(plugins.ImportPluginException):
+        vasp_importers.pdos_arrays(dos, sites=vasp_importers.parse_sites('top=1-5'))
+
+def test_dos_plugin_sites(calcs, run_import):
+    filename = os.path.join(calcs['pbe'], 'vasprun.xml')
+    data = run_import('vasp_importers', 'ImportPluginDOS', filename, sites='all=1-4', orbitals='s')
+    elements = run_import('vasp_importers', 'ImportPluginDOS', filename, orbitals='s')
+    total = sum(np.asarray(elements[name]) for name in elements
+                if name.startswith('pdos_') and name.endswith('_s_up'))
+    np.testing.assert_allclose(data['pdos_all_s_up'], total)
+    assert not any(name.startswith('pdos_') and not name.startswith('pdos_all_') for name in data)
+    with pytest.raises(plugins.ImportPluginException):
+        run_import('vasp_importers', 'ImportPluginDOS', filename, sites='all=1-9')
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+plugins = pytest.importorskip('veusz.plugins')
+h5py = pytest.importorskip('h5py')
+import phonopy_importers
+import synthetic
+
+@pytest.fixture
+def band_hdf5(tmp_path) -> str:
+    return synthetic.write_band_hdf5(str(tmp_path / 'band.hdf5'), nsegments=3, npoints=11, nbands=9)
+
+def _frequencies(filename: str) -> np.ndarray:
+    """(band, segment, qpoint) frequencies read at once"""
+    with h5py.File(filename, 'r') as f:
+        return f['frequency'][:].transpose((2, 0, 1))
+
+def test_all_bands(band_hdf5):
+    dispersion = phonopy_importers.read_dispersion(band_hdf5)
+    frequencies = _frequencies(band_hdf5)
+    np.testing.assert_array_equal(dispersion['band_indices'], np.arange(9)+1)
+    # a NaN before every segment of every band
+    freq = dispersion['frequencies'].reshape((9, 3, 12))
+    assert np.isnan(freq[:,:,0]).all()
+    np.testing.assert_array_equal(freq[:,:,1:], frequencies)
+    dist = dispersion['distances'].reshape((9, 3, 12))
+    np.testing.assert_array_equal(dist[:,:,1:], np.broadcast_to(dispersion['distance'], (9, 3, 11)))
+    assert len(dispersion['tickd']) == len(dispersion['tickl']) == 4
+
+def test_band_range_and_frequency_window(band_hdf5):
+    frequencies = _frequencies(band_hdf5)
+    fmin, fmax = 5.0, 8.0
+    reaching = np.flatnonzero((frequencies.max(axis=(1, 2)) >= fmin) & (frequencies.min(axis=(1, 2)) <= fmax))
+    assert 0 < len(reaching) < 9
+    dispersion = phonopy_importers.read_dispersion(band_hdf5, '2 8', '%g %g' % (fmin, fmax))
+    expected = reaching[(reaching >= 1) & (reaching <= 7)]
+    np.testing.assert_array_equal(dispersion['band_indices'], expected+1)
+    freq = dispersion['frequencies'].reshape((len(expected), 3, 12))
+    np.testing.assert_array_equal(freq[:,:,1:], frequencies[expected])
+    assert dispersion['nbands'] == 9
+
+@pytest.mark.parametrize('band_range, fwindow', [('1', ''), ('a b', ''), ('', '100 200')])
+def test_invalid_selection(band_hdf5, band_range, fwindow):
+    with pytest.raises(plugins.ImportPluginException):
+        phonopy_importers.read_dispersion(band_hdf5, band_range, fwindow)
+
+def test_plugin_details(band_hdf5, run_import):
+    data = run_import('phonopy_importers', 'ImportPluginPhononDispersion', band_hdf5, band_range='1 3', details=True)
+    np.testing.assert_array_equal(data['band_indices'], [1, 2, 3])
+    assert data['nbands'][0] == 3
+    assert len(data['frequencies']) == len(data['distances']) == 3*3*12
+    assert 'band_indices' not in run_import('phonopy_importers', 'ImportPluginPhononDispersion', band_hdf5,
+                                            details=True)
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.embed')
+pytest.importorskip('veusz.document.commandinterface')
+import vasp_plotters
+
+class Setting:
+    def __init__(self) -> None:
+        self.writes = 0
+        self._val = None
+
+    @property
+    def val(self):
+        return self._val
+
+    @val.setter
+    def val(self, value):
+        self.writes += 1
+        self._val = value
+
+class Widget:
+    """Widget of a document tree with the part of the embedding interface
+    used by the plot tools: settings and widgets are reached by their path"""
+
+    def __init__(self, interface, path: str, wtype: str) -> None:
+        self.interface = interface
+        self.path = path
+        self.widgettype = wtype
+        self.children = []
+        self.settings = {}
+        interface.widgets[path] = self
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def childnames(self) -> list:
+        return [widget.name for widget in self.children]
+
+    def Add(self, wtype: str, name: str, autoadd: bool=True, **settings):
+        assert name not in self.childnames, name
+        self.interface.adds += 1
+        widget = Widget(self.interface, self.path.rstrip('/') + '/' + name, wtype)
+        self.children.append(widget)
+        for key, value in settings.items():
+            widget.setting(key).val = value
+        if wtype == 'graph' and autoadd:
+            widget.Add('axis', name='x')
+            widget.Add('axis', name='y')
+        return widget
+
+    def setting(self, path: str) -> Setting:
+        return self.settings.setdefault(path, Setting())
+
+    def fromPath(self, path: str):
+        widgets = self.interface.widgets
+        if path in widgets:
+            return widgets[path]
+        head, _, rest = path.rpartition('/')
+        while head not in widgets:
+            head, _, tail = head.rpartition('/')
+            rest = tail + '/' + rest
+        return widgets[head].setting(rest)
+
+    def __getattr__(self, name: str):
+        for widget in self.__dict__.get('children', []):
+            if widget.name == name:
+                return widget
+        raise AttributeError(name)
+
+class Interface:
+    def __init__(self, data: dict) -> None:
+        self.data = data
+        self.widgets = {}
+        self.adds = 0
+        self.Root = Widget(self, '', 'document')
+        self.Root.Add('page', name='page').Add('graph', name='graph')
+
+    def GetData(self, name: str) -> tuple:
+        return self.data[name], None, None, None
+
+    def hidden(self, graph: str) -> dict:
+        """Whether every xy widget of graph is hidden, by name"""
+        return {widget.name: bool(widget.setting('hide').val) for widget in self.Root.fromPath(graph).children
+                if widget.widgettype == 'xy'}
+
+@pytest.fixture
+def interface() -> Interface:
+    return Interface({name: np.array([0.0, 1.0]) for name in ['tickd', 'tickd_a', 'tickd_b']})
+
+def test_band_structure_is_updated_in_place(interface):
+    fields = {'graph': '/page/graph', 'spin': True, 'edges': False, 'prefix': '', 'suffix': ''}
+    vasp_plotters.PlotBandStructurePlugin().apply(interface, fields)
+    adds = interface.adds
+    writes = interface.Root.fromPath('/page/graph/bands_up/xData').writes
+    vasp_plotters.PlotBandStructurePlugin().apply(interface, fields)
+    # the second run finds every widget, and its settings already set
+    assert interface.adds == adds
+    assert interface.Root.fromPath('/page/graph/bands_up/xData').writes == writes
+    vasp_plotters.PlotBandStructurePlugin().apply(interface, dict(fields, spin=False))
+    assert interface.adds == adds
+    assert interface.hidden('/page/graph') == {'ticks': True, 'bands_up': False, 'bands_dw': True}
+
+def test_band_structure_keeps_the_curves_of_other_suffixes(interface):
+    fields = {'graph': '/page/graph', 'spin': True, 'edges': False, 'prefix': '', 'suffix': '_a'}
+    vasp_plotters.PlotBandStructurePlugin().apply(interface, fields)
+    vasp_plotters.PlotBandStructurePlugin().apply(interface, dict(fields, spin=False, suffix='_b'))
+    assert interface.hidden('/page/graph') == {'ticks': True, 'bands_up_a': False, 'bands_dw_a': False,
+                                               'bands_up_b': False}
+
+def test_dos_hides_the_curves_of_its_own_suffix_only(interface):
+    fields = {'graph': '/page/graph', 'spin': True, 'orbitals': ', Fe_d', 'prefix': '', 'suffix': '_a'}
+    vasp_plotters.PlotDOSPlugin().apply(interface, fields)
+    vasp_plotters.PlotDOSPlugin().apply(interface, dict(fields, suffix='_b'))
+    adds = interface.adds
+    vasp_plotters.PlotDOSPlugin().apply(interface, dict(fields, orbitals='', suffix='_b'))
+    assert interface.adds == adds
+    assert interface.hidden('/page/graph') == {
+        'tdos_up_a': False, 'tdos_dw_a': False, 'pdos_Fe_d_up_a': False, 'pdos_Fe_d_dw_a': False,
+        'tdos_up_b': False, 'tdos_dw_b': False, 'pdos_Fe_d_up_b': True, 'pdos_Fe_d_dw_b': True,
+    }
+
+def test_bsdos_is_updated_in_place(interface):
+    fields = {'widget': '/page', 'spin': True, 'colscale': [3.0, 1.0], 'prefix': ',', 'suffix': '_a,_a'}
+    vasp_plotters.PlotBSDOSPlugin().apply(interface, fields)
+    adds = interface.adds
+    vasp_plotters.PlotBSDOSPlugin().apply(interface, dict(fields, spin=False))
+    assert interface.adds == adds
+    assert interface.hidden('/page/bsdos/bs') == {'ticks': True, 'bands_up_a': False, 'bands_dw_a': True}
+    assert interface.hidden('/page/bsdos/dos') == {'tdos_up_a': False, 'tdos_dw_a': True}
@@ -0,0 +1,96 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip('veusz.plugins')
+import vasp_importers
+
+def _band_structure(directory: str, streaming: bool=True, projected: bool=False):
+    return vasp_importers.MyBandStructure(
+        os.path.join(directory, 'vasprun.xml'), os.path.basename(directory) == 'hybrid',
+        os.path.join(directory, 'KPOINTS'), os.path.join(directory, 'KPATH.in'),
+        streaming=streaming, projected=projected)
+
+def _assert_same_bands(mbs, expected):
+    assert mbs.efermi == expected.efermi
+    assert list(mbs.bands) == list(expected.bands)
+    for spin in expected.bands:
+        np.testing.assert_array_equal(mbs.bands[spin], expected.bands[spin])
+    for spin in expected.occupations:
+        np.testing.assert_array_equal(mbs.occupations[spin], expected.occupations[spin])
+    # pymatgen rounds the reciprocal lattice differently
+    np.testing.assert_allclose(mbs.distances, expected.distances, atol=1e-6)
+    np.testing.assert_array_equal(mbs.breaks, expected.breaks)
+    assert mbs.branches == expected.branches
+
+@pytest.mark.parametrize('name', ['pbe', 'nsp', 'hybrid', 'projected'])
+def test_streaming_matches_pymatgen(calcs, name):
+    pytest.importorskip('pymatgen')
+    projected = name == 'projected'
+    mbs = _band_structure(calcs[name], projected=projected)
+    expected = _band_structure(calcs[name], streaming=False, projected=projected)
+    _assert_same_bands(mbs, expected)
+    assert list(mbs.occupations) == list(expected.occupations)
+    assert mbs.projection_names == expected.projection_names
+    for spin in expected.projections:
+        np.testing.assert_allclose(mbs.projections[spin], expected.projections[spin], rtol=1e-6)
+
+def test_streaming_plugin_matches_pymatgen(calcs, run_import):
+    pytest.importorskip('pymatgen')
+    filename = os.path.join(calcs['pbe'], 'vasprun.xml')
+    data = run_import('vasp_importers', 'ImportPluginBandStructure', filename, cache='Off')
+    expected = run_import('vasp_importers', 'ImportPluginBandStructure', filename, cache='Off', streaming=False)
+    assert sorted(data) == sorted(expected)
+    for name in ['bands_up', 'bands_dw', 'tickd']:
+        np.testing.assert_allclose(data[name], expected[name], atol=1e-6)
+    assert data['tickl'] == expected['tickl']
+
+@pytest.mark.parametrize('suffix, compress', [('.gz', gzip.open), ('.bz2', bz2.open), ('.xz', lzma.open)])
+def test_compressed_vasprun(calcs, tmp_path, suffix, compress):
+    directory = str(tmp_path / 'pbe')
+    shutil.copytree(calcs['pbe'], directory)
+    for name in ['vasprun.xml', 'KPOINTS']:
+        with open(os.path.join(directory, name), 'rb') as src, compress(os.path.join(directory, name+suffix), 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(os.path.join(directory, name))
+    mbs = vasp_importers.load_band_structure(os.path.join(directory, 'vasprun.xml'+suffix), False, cache='Off')
+    _assert_same_bands(mbs, _band_structure(calcs['pbe']))
+
+@pytest.mark.parametrize('name', ['pbe', 'nsp', 'hybrid'])
+def test_eigenval_matches_vasprun(calcs, name):
+    directory = calcs[name]
+    mbs = vasp_importers.load_eigenval(os.path.join(directory, 'EIGENVAL'), name == 'hybrid', cache='Off')
+    _assert_same_bands(mbs, _band_structure(directory))
+
+@pytest.mark.parametrize('name', ['pbe', 'nsp'])
+def test_doscar_matches_vasprun(calcs, name):
+    directory = calcs[name]
+    dos = vasp_importers.doscar_arrays(os.path.join(directory, 'DOSCAR'), os.path.join(directory, 'POSCAR'))
+    expected = vasp_importers.dos_arrays(vasp_importers.read_vasprun(os.path.join(directory, 'vasprun.xml'), dos=True))
+    assert sorted(dos) == sorted(expected)
+    for key, value in expected.items():
+        np.testing.assert_array_equal(dos[key], value)
+
+def test_doscar_sites_without_poscar(calcs):
+    dos = vasp_importers.doscar_arrays(os.path.join(calcs['pbe'], 'DOSCAR'))
+    assert list(dos['elements']) == ['site1', 'site2', 'site3', 'site4']
+
+def test_eigenval_doscar_plugin_matches_bsdos(calcs, run_import):
+    directory = calcs['pbe']
+    data = run_import('vasp_importers', 'ImportPluginEigenvalDOSCAR', os.path.join(directory, 'EIGENVAL'), cache='Off')
+    expected = run_import('vasp_importers', 'ImportPluginBSDOS', os.path.join(directory, 'vasprun.xml'), cache='Off')
+    for name in ['bands_up', 'bands_dw', 'energies', 'tdos_up', 'tdos_dw']:
+        np.testing.assert_allclose(data[name], expected[name], atol=1e-6)
+
+def test_eigenval_doscar_edges_match_bsdos(calcs, run_import):
+    directory = calcs['gapped']
+    data = run_import('vasp_importers', 'ImportPluginEigenvalDOSCAR', os.path.join(directory, 'EIGENVAL'), edges=True)
+    expected = run_import('vasp_importers', 'ImportPluginBSDOS', os.path.join(directory, 'vasprun.xml'), edges=True)
+    assert data['gap_type'] == expected['gap_type'] != ['metal']
+    for name in ['vbm', 'cbm', 'gap', 'direct_gap', 'mass_h_up', 'mass_e_dw']:
+        np.testing.assert_allclose(data[name], expected[name], atol=1e-6)
@@ -1,65 +1,985 @@
 import numpy as np
-from pymatgen.electronic_structure.core import Spin
-from pymatgen.electronic_structure.bandstructure import BandStructure, BandStructureSymmLine
-from pymatgen.io.vasp.inputs import Kpoints
-from pymatgen.io.vasp.outputs import BSVasprun, Vasprun
-from pymatgen.io.vasp.outputs import Oszicar
 import veusz.plugins as plugins
 
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from multiprocessing import get_context
+import bz2
+import glob
+import gzip
+import hashlib
+import io
+import lzma
 import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+
+def _plugin_file(basename: str) -> str:
+    """Path of this plugin file: Veusz executes plugin files with exec instead
+    of importing them, leaving __file__ unset, so it is then taken from the
+    frames loading the plugin"""
+    if '__file__' in globals():
+        return os.path.abspath(__file__)
+    frame = sys._getframe(1)
+    while frame is not None:
+        for value in list(frame.f_locals.values()):
+            name = getattr(value, 'name', None) if isinstance(value, io.IOBase) else value
+            if isinstance(name, str) and os.path.basename(name) == basename and os.path.isfile(name):
+                return os.path.abspath(name)
+        frame = frame.f_back
+    raise ImportError('Cannot locate the plugin file ' + basename)
+
+# the directory of the plugin files, on the path of this process and of the
+# spawned batch workers, which import importer_tools, batch_worker and this
+# file from it
+PLUGIN_DIR = os.path.dirname(_plugin_file('vasp_importers.py'))
+if PLUGIN_DIR not in sys.path:
+    sys.path.append(PLUGIN_DIR)
+
+from importer_tools import _numbers, background, instrument_fields, instrumented, phase, progress, timed
+
+# compressed inputs are decompressed while they are read
+COMPRESSIONS = OrderedDict([('.gz', gzip.open), ('.xz', lzma.open), ('.bz2', bz2.open)])
+
+def compression(filename: str) -> str:
+    """Compression extension of filename, or '' for a plain file"""
+    ext = os.path.splitext(filename)[1].lower()
+    return ext if ext in COMPRESSIONS else ''
+
+def open_file(filename: str, mode: str='rb', fileobj=None):
+    """Open a plain or compressed (.gz, .xz, .bz2) file as a stream, reading
+    the already opened binary fileobj of filename if given"""
+    ext = compression(filename)
+    if ext == '':
+        return open(filename, mode) if fileobj is None else fileobj
+    return COMPRESSIONS[ext](filename if fileobj is None else fileobj, mode)
+
+def find_file(dirname: str, name: str) -> str:
+    """Path of name in dirname, or of its compressed copy if only that exists"""
+    path = os.path.join(dirname, name)
+    for candidate in [path] + [path+ext for ext in COMPRESSIONS]:
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+def extensions(*exts) -> set:
+    """File extensions of plugins, plain and compressed: Veusz compares the
+    last suffix only, so a compressed file is offered by its compression"""
+    return set(exts) | set(COMPRESSIONS)
+
+def convert_label(label: str) -> str:
+    return '\\Gamma' if label == 'GAMMA' else label
+
+def read_kpoints(filename: str):
+    """Minimal KPOINTS reader returning the comment line, the number of
+    k-points (divisions for line mode) and the labels of line-mode end points"""
+    with open_file(filename, 'rt') as f:
+        lines = [line.strip() for line in f]
+    comment = lines[0]
+    nkpts = int(lines[1].split()[0])
+    labels = []
+    if lines[2][:1].lower() == 'l':
+        for line in lines[4:]:
+            terms = line.split(None, 3)
+            if len(terms) < 3:
+                continue
+            try:
+                [float(term) for term in terms[:3]]
+            except ValueError:
+                continue
+            labels.append(terms[3].lstrip('!').strip() if len(terms) > 3 else '')
+    return comment, nkpts, labels
+
+def path_distances(kpts: np.ndarray, npts) -> np.ndarray:
+    """Distances along a path made of consecutive segments of npts[i]
+    cartesian k-points, every segment starting where the previous one ends"""
+    steps = np.zeros(len(kpts))
+    steps[1:] = np.linalg.norm(np.diff(kpts, axis=0), axis=1)
+    steps[np.cumsum(npts)[:-1]] = 0.0
+    return np.cumsum(steps)
+
+def _minmax_indices(ys: np.ndarray, nbuckets: int) -> np.ndarray:
+    """Sorted indices of the minimum and maximum of every (curve, point) curve
+    of ys in nbuckets buckets, and of the ends"""
+    n = ys.shape[1]
+    size = -(-n // nbuckets)
+    nbuckets = -(-n // size)
+    pad = ((0, 0), (0, nbuckets*size-n))
+    lo = np.pad(ys, pad, constant_values=np.inf).reshape((len(ys), nbuckets, size)).argmin(axis=2)
+    hi = np.pad(ys, pad, constant_values=-np.inf).reshape((len(ys), nbuckets, size)).argmax(axis=2)
+    offsets = np.arange(nbuckets)*size
+    return np.unique(np.concatenate([(lo+offsets).ravel(), (hi+offsets).ravel(), [0, n-1]]))
+
+def lod_indices(ys: np.ndarray, method: str, npoints: int=2000, tolerance: float=1e-3, x: np.ndarray=None) -> np.ndarray:
+    """Sorted indices of the points of the (curve, point) array ys kept for a
+    lower level of detail, the same for all curves as they share their x
+
+    'Min-max' keeps the minimum and maximum of every curve in buckets, as many
+    as fit in npoints points for all curves together, and at least the extrema
+    of every curve. 'Douglas-Peucker' keeps the minimum and maximum of every
+    curve and the points where any curve deviates from the chord by more than
+    tolerance times the range of that curve. The ends are always kept.
+    """
+    ys = np.atleast_2d(ys)
+    n = ys.shape[1]
+    if method == 'Off' or n <= 2:
+        return np.arange(n)
+
+    if method == 'Min-max':
+        if n <= npoints:
+            return np.arange(n)
+        # the extrema of the curves differ, so fewer buckets than npoints/2 may be
+        # needed, down to the number where every curve has its own points
+        fewest = max((npoints-2) // (2*len(ys)), 1)
+        nbuckets = max(npoints // 2, fewest)
+        while True:
+            index = _minmax_indices(ys, nbuckets)
+            if len(index) <= npoints or nbuckets == fewest:
+                return index
+            nbuckets = max(min(nbuckets-1, nbuckets*npoints // len(index)), fewest)
+
+    if x is None or np.ptp(x) == 0:
+        x = np.arange(n, dtype=float)
+    scale = np.ptp(ys, axis=1)
+    scale[scale == 0] = 1.0
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    keep[ys.argmin(axis=1)] = True
+    keep[ys.argmax(axis=1)] = True
+    kept = np.flatnonzero(keep)
+    stack = list(zip(kept[:-1], kept[1:]))
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        t = (x[a+1:b] - x[a]) / ((x[b] - x[a]) or 1.0)
+        deviation = (np.abs(ys[:,a+1:b] - ys[:,a:a+1] - np.outer(ys[:,b]-ys[:,a], t)) / scale[:,None]).max(axis=0)
+        i = int(np.argmax(deviation))
+        if deviation[i] > tolerance:
+            keep[a+1+i] = True
+            stack += [(a, a+1+i), (a+1+i, b)]
+    return np.flatnonzero(keep)
+
+def _parse_rows(elem: ET.Element) -> np.ndarray:
+    return np.fromstring(' '.join([child.text for child in elem]), sep=' ').reshape((len(elem), -1))
+
+def orbital_type(orbital: str) -> str:
+    """Angular momentum (s, p, d or f) of a VASP orbital field name"""
+    return 'd' if orbital == 'x2-y2' else orbital[0]
+
+def projection_groups(elements: list, orbitals: list) -> tuple:
+    """Names and (group, site, orbital) masks of the fat-band groups: every
+    element summed over all orbitals and over each angular momentum"""
+    elements = np.asarray(elements)
+    types = np.array([orbital_type(orbital) for orbital in orbitals])
+    names, masks = [], []
+    for element in dict.fromkeys(elements.tolist()):
+        sites = elements == element
+        names.append(element)
+        masks.append(np.outer(sites, np.ones(len(types), dtype=bool)))
+        for ltype in dict.fromkeys(types.tolist()):
+            names.append(element+'_'+ltype)
+            masks.append(np.outer(sites, types == ltype))
+    return names, np.array(masks, dtype=np.float32)
+
+class VasprunReader:
+    """Streaming reader for the parts of vasprun.xml needed by the importers
+
+    Only the final reciprocal lattice (including the 2*pi factor), the k-point
+    list, the Fermi energy and the eigenvalues/occupations are kept, plus the
+    total and site-projected DOS and the element of every site if dos is set.
+    If projected is set, the band projections are reduced one k-point at a
+    time into float32 (spin, kpoint, band, group) weights of the groups of
+    projection_groups, so that the (spin, kpoint, band, ion, orbital) block is
+    never held in memory. The first skip k-points (the weighted SCF block of
+    hybrid band runs) are dropped while parsing, their eigenvalues and
+    projections are never converted. Every other element is cleared as soon
+    as it has been read so that memory use is bounded by the preallocated
+    arrays and not by the size of the file. The bytes read of the (compressed)
+    file are reported as the progress of the import.
+    """
+
+    def __init__(self, filename: str, dos: bool=False, projected: bool=False, skip: int=0) -> None:
+        self.read_dos = dos
+        self.read_projected = projected
+        self.skip = skip
+        self.efermi = None
+        self.nbands = None
+        self.ispin = 1
+        self.rec_lattice = None
+        self.kpoints = None
+        self.weights = None
+        self.eigenvalues = None
+        self.occupations = None
+        self.elements = []
+        self.orbitals = []
+        self.dos_energies = None
+        self.tdos = None
+        self.pdos = None
+        self.projected_orbitals = []
+        self.projection_names = []
+        self.projections = None
+        self._projector = None
+        name, size = os.path.basename(filename), os.path.getsize(filename)
+        with phase('parse vasprun.xml'), open(filename, 'rb') as raw, open_file(filename, fileobj=raw) as f:
+            self._parse(f, lambda block: progress('Reading %s: %s' % (name, block or 'header'), raw.tell(), size))
+
+        if self.eigenvalues is None or self.rec_lattice is None or self.efermi is None:
+            raise ValueError('Incomplete vasprun.xml: ' + str(filename))
+        if dos and self.tdos is None:
+            raise ValueError('No DOS in vasprun.xml: ' + str(filename))
+        if projected and self.projections is None:
+            raise ValueError('No projections in vasprun.xml: ' + str(filename))
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the parsed arrays"""
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def _allocate(self):
+        if self.kpoints is None or self.nbands is None:
+            raise ValueError('Eigenvalues found before k-points and NBANDS')
+        shape = (self.ispin, len(self.kpoints), self.nbands)
+        self.eigenvalues = np.empty(shape)
+        self.occupations = np.empty(shape)
+
+    def _project(self, ispin: int, ik: int, values: np.ndarray):
+        """Reduce the (band, ion, orbital) projections of one k-point"""
+        if self._projector is None:
+            self.projection_names, self._projector = projection_groups(self.elements, self.projected_orbitals)
+            self.projections = np.empty((self.ispin, len(self.kpoints), self.nbands, len(self.projection_names)),
+                                        dtype=np.float32)
+        values = values.reshape((self.nbands, len(self.elements), len(self.projected_orbitals)))
+        self.projections[ispin, ik] = np.einsum('bio,gio->bg', values, self._projector)
+
+    def _parse(self, f, report):
+        path = []
+        keep = False
+        structure = ''
+        dos_comment = None
+        # block being read ('eigenvalues', 'projected', 'total' or 'partial') and its depth
+        block, block_depth = None, 0
+        ispin = iion = 0
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == 'set' and block is not None:
+                    depth = len(path) - block_depth
+                    if block == 'projected':
+                        # projected/array/set/set(spin)/set(kpoint)/set(band), the
+                        # eigenvalues nested in projected are skipped
+                        if path[block_depth+1] != 'array':
+                            pass
+                        elif depth == 3:
+                            ispin = int(elem.get('comment')[4:]) - 1
+                        elif depth == 4:
+                            keep = ispin < self.ispin and int(elem.get('comment').split()[-1]) > self.skip
+                    elif block == 'partial':
+                        # partial/array/set/set(ion)/set(spin)
+                        if depth == 3:
+                            iion = int(elem.get('comment').split()[-1]) - 1
+                        elif depth == 4:
+                            ispin = int(elem.get('comment').split()[-1]) - 1
+                            keep = ispin < self.ispin
+                    elif depth == 3:
+                        # eigenvalues/array/set/set(spin)/set(kpoint) and total/array/set/set(spin);
+                        # spins beyond ISPIN are the magnetization of non-collinear runs
+                        ispin = int(elem.get('comment').split()[-1]) - 1
+                        keep = block == 'total' and ispin < self.ispin
+                    elif depth == 4:
+                        keep = int(elem.get('comment').split()[-1]) > self.skip
+                elif tag == 'structure':
+                    structure = elem.get('name', '')
+                elif tag == 'dos':
+                    dos_comment = elem.get('comment')
+                elif tag == 'varray':
+                    keep = (len(path) == 2 and path[-1] == 'kpoints') or \
+                        (structure == 'finalpos' and elem.get('name') == 'rec_basis')
+                elif tag == 'eigenvalues' and path[-1] == 'calculation':
+                    # eigenvalues nested in <projected> or *_kpoints_opt are skipped
+                    self._allocate()
+                    block, block_depth = tag, len(path)
+                elif self.read_projected and tag == 'projected' and path[-1] == 'calculation':
+                    block, block_depth = tag, len(path)
+                elif self.read_dos and (tag == 'total' or tag == 'partial') and path[-1] == 'dos' \
+                        and dos_comment != 'kpoints_opt':
+                    block, block_depth = tag, len(path)
+                elif (self.read_dos or self.read_projected) and tag == 'array' and path[-1] == 'atominfo' and elem.get('name') == 'atoms':
+                    keep = True
+                path.append(tag)
+                continue
+
+            path.pop()
+            if tag == 'r' or tag == 'v' or tag == 'rc' or tag == 'c':
+                if not keep:
+                    elem.clear()
+                continue
+            if tag == 'set':
+                report(block)
+            if tag == 'i':
+                name = elem.get('name')
+                if name == 'efermi' and path[-1] == 'dos' and dos_comment != 'kpoints_opt':
+                    self.efermi = float(elem.text)
+                elif name == 'NBANDS':
+                    self.nbands = int(elem.text)
+                elif name == 'ISPIN':
+                    self.ispin = int(elem.text)
+            elif tag == 'field' and block == 'partial':
+                if elem.text.strip() != 'energy':
+                    self.orbitals.append(elem.text.strip())
+            elif tag == 'field' and block == 'projected' and len(path) == block_depth + 2:
+                self.projected_orbitals.append(elem.text.strip())
+            elif tag == 'varray' and keep:
+                name = elem.get('name')
+                if name == 'kpointlist':
+                    self.kpoints = _parse_rows(elem)[self.skip:]
+                elif name == 'weights':
+                    self.weights = _parse_rows(elem)[self.skip:,0]
+                elif name == 'rec_basis':
+                    self.rec_lattice = 2*np.pi*_parse_rows(elem)
+                keep = False
+            elif tag == 'set' and keep:
+                if block is None or (block == 'projected' and len(path) - block_depth > 4):
+                    # the atominfo rows are read when their array ends and the
+                    # band sets of projections with their k-point
+                    continue
+                if block == 'projected':
+                    ik = int(elem.get('comment').split()[-1]) - 1 - self.skip
+                    self._project(ispin, ik, np.fromstring(' '.join(r.text for r in elem.iter('r')), sep=' '))
+                    keep = False
+                    elem.clear()
+                    continue
+                rows = _parse_rows(elem)
+                if block == 'eigenvalues':
+                    ik = int(elem.get('comment').split()[-1]) - 1 - self.skip
+                    self.eigenvalues[ispin, ik] = rows[:,0]
+                    self.occupations[ispin, ik] = rows[:,1]
+                elif block == 'total':
+                    if self.tdos is None:
+                        self.dos_energies = rows[:,0].copy()
+                        self.tdos = np.empty((self.ispin, len(rows)))
+                    self.tdos[ispin] = rows[:,1]
+                else:
+                    if self.pdos is None:
+                        self.pdos = np.empty((len(self.elements), self.ispin, len(rows), rows.shape[1]-1))
+                    self.pdos[iion, ispin] = rows[:,1:]
+                keep = False
+            elif tag == 'array' and keep:
+                symbols = {'X': 'Xe', 'r': 'Zr'}
+                self.elements = [symbols.get(rc[0].text.strip(), rc[0].text.strip()) for rc in elem.find('set')]
+                keep = False
+            elif tag == block:
+                block = None
+            elif tag == 'structure':
+                structure = ''
+            elem.clear()
+
+# bytes of parsed arrays the session cache of readers may keep alive
+READER_CACHE_BYTES = 256*2**20
+_readers = OrderedDict()
+_reader_holds = 0
+
+def _trim_readers():
+    """Drop the least recently used readers beyond READER_CACHE_BYTES, unless
+    an import is still sharing them"""
+    if _reader_holds > 0:
+        return
+    total = sum(vr.nbytes for vr in _readers.values())
+    while len(_readers) > 0 and total > READER_CACHE_BYTES:
+        total -= _readers.popitem(last=False)[1].nbytes
+
+@contextmanager
+def shared_readers():
+    """Keep the readers of read_vasprun until the block ends, whatever their
+    size, so that an import reading a file several times parses it once"""
+    global _reader_holds
+    _reader_holds += 1
+    try:
+        yield
+    finally:
+        _reader_holds -= 1
+        _trim_readers()
+
+def read_vasprun(filename: str, dos: bool=False, projected: bool=False, skip: int=0) -> VasprunReader:
+    """Return a VasprunReader for filename, shared within the session through
+    a LRU cache keyed on path, size and modification time and bounded by
+    READER_CACHE_BYTES. The reader may have skipped fewer than skip k-points,
+    see VasprunReader.skip."""
+    st = os.stat(filename)
+    path = os.path.abspath(filename)
+    key = (path, st.st_size, st.st_mtime_ns)
+    vr = _readers.get(key)
+    if vr is None or (dos and not vr.read_dos) or (projected and not vr.read_projected) or vr.skip > skip:
+        if vr is not None:
+            dos, projected = dos or vr.read_dos, projected or vr.read_projected
+            skip = min(skip, vr.skip)
+        for stale in [k for k in _readers if k[0] == path]:
+            del _readers[stale]
+        vr = VasprunReader(filename, dos=dos, projected=projected, skip=skip)
+        _readers[key] = vr
+    _readers.move_to_end(key)
+    _trim_readers()
+    return vr
+
+def dos_arrays(vr: VasprunReader) -> dict:
+    """Arrays behind the DOS datasets: the total DOS per spin and, when present,
+    the raw (site, spin, energy, orbital) projections with the element of
+    every site and the orbital names"""
+    arrays = {'energies': vr.dos_energies, 'efermi': np.array(vr.efermi)}
+    for i, sspin in enumerate(['up', 'dw'][:vr.ispin]):
+        arrays['tdos_'+sspin] = vr.tdos[i]
+    if vr.pdos is not None:
+        arrays['pdos'] = vr.pdos
+        arrays['elements'] = np.array(vr.elements, dtype=str)
+        arrays['orbitals'] = np.array(vr.orbitals, dtype=str)
+    return arrays
+
+def read_poscar(filename: str) -> tuple:
+    """Lattice vectors (rows, in Angstrom) and the element of every site of a
+    POSCAR or CONTCAR; the elements are None for VASP 4 files without symbols"""
+    with open_file(filename, 'rt') as f:
+        lines = [f.readline() for _ in range(7)]
+    scale = np.array(lines[1].split()[:3], dtype=float)
+    lattice = np.array([line.split()[:3] for line in lines[2:5]], dtype=float)
+    if len(scale) == 1 and scale[0] < 0:
+        # a negative scale is the volume of the cell
+        scale = np.cbrt(-scale / abs(np.linalg.det(lattice)))
+    lattice = lattice * scale
+    if lines[5].split()[0].isdigit():
+        return lattice, None
+    symbols, counts = lines[5].split(), [int(term) for term in lines[6].split()]
+    # POTCAR-style symbols such as Fe_pv/abc123
+    symbols = [re.split(r'[_/]', symbol)[0] for symbol in symbols]
+    return lattice, [symbol for symbol, count in zip(symbols, counts) for _ in range(count)]
+
+def _read_numbers(filename: str, skip: int) -> tuple:
+    """The first skip lines of a text file and the numbers after them, parsed
+    in bulk"""
+    with open_file(filename) as f:
+        head = [f.readline().decode() for _ in range(skip)]
+        numbers = np.fromstring(f.read(), sep=' ')
+    return head, numbers
+
+def read_doscar_efermi(filename: str) -> float:
+    with open_file(filename, 'rt') as f:
+        return float([f.readline() for _ in range(6)][5].split()[3])
+
+class EigenvalReader:
+    """Reader of EIGENVAL with the attributes of VasprunReader used for band
+    structures; EIGENVAL holds the k-points in fractional coordinates only,
+    so the reciprocal lattice is taken from POSCAR or CONTCAR. The Fermi
+    energy is read from DOSCAR if given, or else taken as the highest
+    occupied eigenvalue."""
+
+    skip = 0
+    projections = None
+
+    @timed('parse EIGENVAL')
+    def __init__(self, filename: str, poscar_fn: str, doscar_fn: str='') -> None:
+        head, numbers = _read_numbers(filename, 6)
+        self.ispin = int(head[0].split()[3])
+        nkpts, self.nbands = [int(term) for term in head[5].split()[1:3]]
+        # every k-point is "kx ky kz weight" then a row per band of the index,
+        # the eigenvalue per spin and, since VASP 5, the occupation per spin
+        ncols = (len(numbers) // max(nkpts, 1) - 4) // max(self.nbands, 1)
+        if nkpts == 0 or ncols not in (1 + self.ispin, 1 + 2*self.ispin) or \
+                len(numbers) != nkpts * (4 + self.nbands*ncols):
+            raise ValueError('Incomplete EIGENVAL: ' + str(filename))
+        numbers = numbers.reshape((nkpts, -1))
+        self.kpoints = numbers[:,:3]
+        self.weights = numbers[:,3]
+        rows = numbers[:,4:].reshape((nkpts, self.nbands, ncols))
+        self.eigenvalues = rows[:,:,1:1+self.ispin].transpose((2,0,1))
+        self.occupations = rows[:,:,1+self.ispin:].transpose((2,0,1)) if ncols > 1 + self.ispin else None
+
+        lattice, _ = read_poscar(poscar_fn)
+        self.rec_lattice = 2*np.pi*np.linalg.inv(lattice).T
+        if doscar_fn != '' and os.path.exists(doscar_fn):
+            self.efermi = read_doscar_efermi(doscar_fn)
+        elif self.occupations is not None:
+            self.efermi = float(np.max(self.eigenvalues[self.occupations > 0.5]))
+        else:
+            self.efermi = 0.0
+
+# orbital names of vasprun.xml for the numbers of PDOS columns in DOSCAR
+DOSCAR_ORBITALS = {
+    3: ['s', 'p', 'd'],
+    4: ['s', 'p', 'd', 'f'],
+    9: ['s', 'py', 'pz', 'px', 'dxy', 'dyz', 'dz2', 'dxz', 'x2-y2'],
+    16: ['s', 'py', 'pz', 'px', 'dxy', 'dyz', 'dz2', 'dxz', 'x2-y2',
+         'fy3x2', 'fxyz', 'fyz2', 'fz3', 'fxz2', 'fzx2', 'fx3'],
+}
+
+@timed('parse DOSCAR')
+def doscar_arrays(filename: str, poscar_fn: str='') -> dict:
+    """The arrays of dos_arrays read from DOSCAR, with the elements of the
+    sites from POSCAR or CONTCAR if given, or else the sites named site1,
+    site2..."""
+    head, numbers = _read_numbers(filename, 6)
+    nions = int(head[0].split()[0])
+    # NCDIJ: 1 without spin polarization, 2 for ISPIN=2, 4 for non-collinear runs
+    ncdij = int(head[0].split()[3]) if len(head[0].split()) > 3 else 1
+    nedos, efermi = int(float(head[5].split()[2])), float(head[5].split()[3])
+    ispin = 2 if ncdij == 2 else 1
+
+    total = numbers[:nedos*(1 + 2*ispin)].reshape((nedos, -1))
+    arrays = {'energies': total[:,0].copy(), 'efermi': np.array(efermi)}
+    for i, sspin in enumerate(['up', 'dw'][:ispin]):
+        arrays['tdos_'+sspin] = total[:,1+i].copy()
+
+    rest = numbers[nedos*(1 + 2*ispin):]
+    if nions > 0 and len(rest) > 0:
+        # every site repeats the header line before its (energy, orbital) rows
+        if len(rest) % nions != 0 or (len(rest)//nions - 5) % nedos != 0:
+            raise ValueError('Incomplete DOSCAR: ' + str(filename))
+        ncols = (len(rest)//nions - 5) // nedos - 1
+        ncomponents = 4 if ncdij == 4 else ispin
+        orbitals = DOSCAR_ORBITALS.get(ncols // ncomponents)
+        if orbitals is None or ncols % ncomponents != 0:
+            raise ValueError('Unknown PDOS columns in DOSCAR: ' + str(filename))
+        pdos = rest.reshape((nions, -1))[:,5:].reshape((nions, nedos, ncols+1))[:,:,1:]
+        # columns interleave the spin (or magnetization) components of every orbital;
+        # non-collinear runs keep the total only
+        pdos = pdos.reshape((nions, nedos, len(orbitals), ncomponents))[...,:ispin]
+        elements = read_poscar(poscar_fn)[1] if poscar_fn != '' and os.path.exists(poscar_fn) else None
+        if elements is None or len(elements) != nions:
+            elements = ['site%d' % (i+1) for i in range(nions)]
+        arrays['pdos'] = np.ascontiguousarray(pdos.transpose((0,3,1,2)))
+        arrays['elements'] = np.array(elements, dtype=str)
+        arrays['orbitals'] = np.array(orbitals, dtype=str)
+    return arrays
+
+def find_structure(dirname: str) -> str:
+    """POSCAR in dirname, or CONTCAR if there is no POSCAR, plain or compressed"""
+    for name in ['POSCAR', 'CONTCAR']:
+        path = find_file(dirname, name)
+        if os.path.exists(path):
+            return path
+    return ''
+
+def parse_sites(s: str) -> list:
+    """Parse site groups such as "top=1-4,9 Fe2=5" into (name, indices) pairs
+    with 0-based site indices"""
+    groups = []
+    for term in s.split():
+        name, _, spec = term.partition('=')
+        if not name or not spec:
+            raise plugins.ImportPluginException('Invalid site group "%s", expected name=1-4,9' % term)
+        indices = []
+        for item in spec.split(','):
+            first, _, last = item.partition('-')
+            try:
+                first, last = int(first), int(last or first)
+            except ValueError:
+                first, last = 0, 0
+            if not 1 <= first <= last:
+                raise plugins.ImportPluginException('Invalid sites "%s" in group "%s", expected 1-4,9'
+                                                    % (item, term))
+            indices += range(first-1, last)
+        groups.append((name, indices))
+    return groups
+
+@timed('PDOS reduction')
+def pdos_arrays(dos: dict, elements: list=None, orbitals: list=None, sites: list=None) -> dict:
+    """PDOS of element and site groups, summed over all orbitals and over every
+    requested orbital, computed by one tensor reduction of the raw projections
+
+    elements restricts the element groups (all elements if None, unless sites
+    are given), orbitals are s/p/d/f or orbital names such as px or dxy (the
+    angular momenta present if None) and sites are (name, indices) groups.
+    """
+    if 'pdos' not in dos:
+        return {}
+    site_elements = dos['elements']
+    names = dos['orbitals'].tolist()
+    types = [orbital_type(name) for name in names]
+    if orbitals is None:
+        orbitals = list(dict.fromkeys(types))
+    channels = [orbital for orbital in orbitals if orbital in names or orbital in types]
+    if elements is None:
+        elements = [] if sites else list(dict.fromkeys(site_elements.tolist()))
+
+    groups = [(elem, site_elements == elem) for elem in elements if elem in site_elements]
+    for name, indices in (sites or []):
+        if max(indices) >= len(site_elements):
+            raise plugins.ImportPluginException('Site %d of group "%s" beyond the %d sites'
+                                                % (max(indices)+1, name, len(site_elements)))
+        mask = np.zeros(len(site_elements), dtype=bool)
+        mask[indices] = True
+        groups.append((name, mask))
+    if len(groups) == 0:
+        return {}
+
+    # first column sums all orbitals, the others pick one orbital or one l
+    weights = np.zeros((len(names), len(channels)+1))
+    weights[:,0] = 1.0
+    for j, channel in enumerate(channels):
+        weights[:,j+1] = [name == channel or ltype == channel for name, ltype in zip(names, types)]
+    sites_mask = np.array([mask for _, mask in groups], dtype=float)
+    reduced = np.einsum('gi,isno,oc->gsnc', sites_mask, dos['pdos'], weights, optimize=True)
+
+    arrays = {}
+    for g, (name, _) in enumerate(groups):
+        for i, sspin in enumerate(['up', 'dw'][:reduced.shape[1]]):
+            arrays['pdos_'+name+'_'+sspin] = reduced[g,i,:,0]
+            for j, channel in enumerate(channels):
+                arrays['pdos_'+name+'_'+channel+'_'+sspin] = reduced[g,i,:,j+1]
+    return arrays
+
+# part of every cache key, to be raised whenever the arrays stored for a kind
+# of parse change so that entries of older versions are parsed again
+CACHE_FORMAT = 2
+
+class ParseCache:
+    """Persistent on-disk cache of parsed arrays
+
+    Entries are keyed on the absolute path, size and modification time of the
+    source files (and optionally a hash of their content) together with the
+    kind of parse and its options. Every entry is a .npz file in one directory
+    whose total size is kept below max_bytes by removing the least recently
+    used entries first. An entry larger than max_bytes on its own is not kept.
+    """
+
+    def __init__(self, directory: str=None, max_bytes: int=None, hash_content: bool=False) -> None:
+        if directory is None:
+            directory = os.environ.get('VEUSZ_PLUGINS_CACHE',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'veusz-plugins'))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('VEUSZ_PLUGINS_CACHE_SIZE', 2**30))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+
+    @staticmethod
+    def _digest(*terms) -> str:
+        return hashlib.sha1(repr(terms).encode()).hexdigest()[:16]
+
+    def _stamp(self, filename: str) -> tuple:
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return (filename, None)
+        if not self.hash_content:
+            return (filename, st.st_size, st.st_mtime_ns)
+        sha = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                sha.update(chunk)
+        return (filename, st.st_size, sha.hexdigest())
+
+    def _prefix(self, filenames: list, kind: str, options: tuple) -> str:
+        return self._digest(os.path.abspath(filenames[0])) + '-' + self._digest(CACHE_FORMAT, kind, options)
+
+    def _path(self, filenames: list, kind: str, options: tuple) -> str:
+        stamps = [self._stamp(os.path.abspath(fn)) for fn in filenames]
+        return os.path.join(self.directory, self._prefix(filenames, kind, options) + '-' + self._digest(stamps) + '.npz')
+
+    def load(self, filenames: list, kind: str, options: tuple=()) -> dict:
+        """Return the cached arrays for the current state of filenames or None"""
+        path = self._path(filenames, kind, options)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return arrays
+
+    def save(self, filenames: list, kind: str, arrays: dict, options: tuple=()):
+        """Store arrays, replacing entries made from older versions of filenames"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(filenames, kind, options)
+        tmp = path + '.tmp%d' % os.getpid()
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        if os.path.getsize(tmp) > self.max_bytes:
+            # it would only evict every other entry and then itself
+            os.remove(tmp)
+            return
+        prefix = self._prefix(filenames, kind, options)
+        self._remove(lambda entry: entry.startswith(prefix))
+        os.replace(tmp, path)
+        self._evict()
+
+    def invalidate(self, filename: str=None):
+        """Remove every entry made from filename, or the whole cache"""
+        if filename is None:
+            self._remove(lambda entry: True)
+        else:
+            prefix = self._digest(os.path.abspath(filename)) + '-'
+            self._remove(lambda entry: entry.startswith(prefix))
+
+    def _entries(self) -> list:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [name for name in names if name.endswith('.npz')]
+
+    def _remove(self, condition):
+        for entry in self._entries():
+            if condition(entry):
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+
+    def _evict(self):
+        entries = []
+        for entry in self._entries():
+            try:
+                st = os.stat(os.path.join(self.directory, entry))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry))
+        total = sum(entry[1] for entry in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, entry))
+            except OSError:
+                pass
+            total -= size
+
+parse_cache = ParseCache()
+
+def cached_parse(mode: str, filenames: list, kind: str, parse, options: tuple=()) -> dict:
+    """Run parse() through parse_cache according to the 'cache' import field:
+    'Use' reads and fills the cache, 'Refresh' re-parses and replaces the
+    entry and 'Off' bypasses the cache entirely"""
+    if mode == 'Use':
+        with phase('cache load'):
+            arrays = parse_cache.load(filenames, kind, options)
+        if arrays is not None:
+            return arrays
+    with phase('parse ' + kind):
+        arrays = parse()
+    if mode != 'Off':
+        try:
+            with phase('cache save'):
+                parse_cache.save(filenames, kind, arrays, options)
+        except OSError:
+            # an unwritable cache directory must not break the import
+            pass
+    return arrays
 
 class MyBandStructure:
-    def __init__(self, filename: str, hybrid: bool, kpoints_fn: str='', kpath_fn: str='') -> None:
+    def __init__(self, filename: str, hybrid: bool, kpoints_fn: str='', kpath_fn: str='', streaming: bool=True,
+                 projected: bool=False) -> None:
+        # fat-band weights per spin as (group, band, kpoint) float32 arrays
+        self.projection_names = []
+        self.projections = {}
+        # (band, kpoint) occupations per spin, empty if the input has none
+        self.occupations = {}
+        if streaming:
+            try:
+                self._read_stream(filename, hybrid, kpoints_fn, kpath_fn, projected)
+                return
+            except (OSError, ValueError, ET.ParseError):
+                # leave layouts the streaming reader does not understand to pymatgen
+                pass
         if not hybrid:
-            self._read_pbe(filename)
+            self._read_pbe(filename, kpoints_fn, projected)
         else:
-            self._read_hybrid(filename, kpoints_fn, kpath_fn)
-        
-    def _read_pbe(self, filename: str):
-        vr = BSVasprun(filename, parse_projected_eigen=True)
-        bs = vr.get_band_structure()
+            self._read_hybrid(filename, kpoints_fn, kpath_fn, projected)
+
+    @staticmethod
+    def _hybrid_header(kpoints_fn: str):
+        """Number of weighted SCF k-points and points per branch, written
+        in the comment line of KPOINTS for hybrid band calculations"""
+        comment, _, _ = read_kpoints(kpoints_fn)
+        terms = comment.split()
+        nbranches = int(terms[7])
+        return int(terms[4]), [int(term) for term in terms[8:8+nbranches]]
+
+    @staticmethod
+    def _kpath(hybrid: bool, kpoints_fn: str, kpath_fn: str) -> tuple:
+        """SCF k-points before the path, points per branch and end-point labels"""
+        if not hybrid:
+            _, divisions, labels = read_kpoints(kpoints_fn)
+            return 0, [divisions]*(len(labels) // 2), labels
+        beg, npts = MyBandStructure._hybrid_header(kpoints_fn)
+        _, _, labels = read_kpoints(kpath_fn)
+        return beg, npts, labels
+
+    def _read_stream(self, filename: str, hybrid: bool, kpoints_fn: str, kpath_fn: str, projected: bool=False):
+        beg, npts, labels = MyBandStructure._kpath(hybrid, kpoints_fn, kpath_fn)
+        self._read_reader(read_vasprun(filename, projected=projected, skip=beg), beg, npts, labels, projected)
+
+    @classmethod
+    def from_eigenval(cls, filename: str, hybrid: bool, kpoints_fn: str, kpath_fn: str, poscar_fn: str,
+                      doscar_fn: str=''):
+        """Band structure of EIGENVAL, see EigenvalReader"""
+        mbs = cls.__new__(cls)
+        mbs.projection_names = []
+        mbs.projections = {}
+        mbs.occupations = {}
+        beg, npts, labels = MyBandStructure._kpath(hybrid, kpoints_fn, kpath_fn)
+        mbs._read_reader(EigenvalReader(filename, poscar_fn, doscar_fn), beg, npts, labels)
+        return mbs
+
+    def _read_reader(self, vr, beg: int, npts: list, labels: list, projected: bool=False):
+        """Take the path of the k-points after beg of a VasprunReader or
+        EigenvalReader vr, in branches of npts points between labels"""
+        self.efermi = vr.efermi
+        self.nbands = vr.nbands
+        # a reader shared with an earlier import may have kept the SCF k-points
+        beg -= vr.skip
+        if len(labels) < 2 or sum(npts) != len(vr.kpoints) - beg:
+            raise ValueError('KPOINTS does not describe the k-path')
+
+        kpts = vr.kpoints[beg:] @ vr.rec_lattice
+        self.end_indices = np.cumsum(npts) - 1
+        self.breaks = self.end_indices - np.array(npts) + 1
+        self.distances = path_distances(kpts, npts)
+        self.bands = {spin: vr.eigenvalues[i,beg:].T for i, spin in enumerate(['up', 'dw'][:vr.ispin])}
+        if vr.occupations is not None:
+            self.occupations = {spin: vr.occupations[i,beg:].T for i, spin in enumerate(['up', 'dw'][:vr.ispin])}
+        self.branches = [[convert_label(labels[2*i]), convert_label(labels[2*i+1])] for i in range(len(labels)//2)]
+        if projected:
+            self.projection_names = vr.projection_names
+            self.projections = {spin: vr.projections[i,beg:].transpose((2,1,0))
+                                for i, spin in enumerate(['up', 'dw'][:vr.ispin])}
+
+    @timed('projections')
+    def _read_projections(self, projections: dict, elements: list):
+        """Reduce the (band, kpoint, orbital, ion) projections of pymatgen"""
+        from pymatgen.electronic_structure.core import Orbital, Spin
+
+        for spin, weights in projections.items():
+            orbitals = [orbital.name for orbital in Orbital][:weights.shape[2]]
+            self.projection_names, projector = projection_groups(elements, orbitals)
+            self.projections['up' if spin == Spin.up else 'dw'] = \
+                np.einsum('bkoi,gio->gbk', weights, projector).astype(np.float32)
+
+    # pymatgen takes seconds to import, so it is only loaded for the layouts
+    # the streaming reader leaves to it
+    def _read_pbe(self, filename: str, kpoints_fn: str='', projected: bool=False):
+        from pymatgen.electronic_structure.core import Spin
+        from pymatgen.io.vasp.outputs import BSVasprun
+
+        with phase('pymatgen BSVasprun'):
+            vr = BSVasprun(filename, parse_projected_eigen=projected)
+        with phase('get_band_structure'):
+            # KPOINTS is passed on, as pymatgen does not look for every compressed copy
+            bs = vr.get_band_structure(kpoints_fn or None, line_mode=True)
         self.efermi = bs.efermi
         self.nbands = bs.nb_bands
         self.breaks = [branch['start_index'] for branch in bs.branches]
         self.end_indices = [branch['end_index'] for branch in bs.branches]
         self.distances = bs.distance
-        self.bands = {spin: bands for spin, bands in bs.bands.items()}
+        self.bands = {('up' if spin == Spin.up else 'dw'): bands for spin, bands in bs.bands.items()}
+        # the line-mode band structure keeps every k-point of vasprun.xml
+        self.occupations = {('up' if spin == Spin.up else 'dw'): eigenvalues[:,:,1].T
+                            for spin, eigenvalues in vr.eigenvalues.items()}
+        self.branches = [[convert_label(i) for i in branch['name'].split('-')] for branch in bs.branches]
+        if projected:
+            self._read_projections(bs.projections, [site.specie.symbol for site in bs.structure])
 
-        convert = lambda label: '\Gamma' if label == 'GAMMA' else label
-        self.branches = [[convert(i) for i in branch['name'].split('-')] for branch in bs.branches]
+    def _read_hybrid(self, filename: str, kpoints_fn: str, kpath_fn: str, projected: bool=False):
+        from pymatgen.electronic_structure.core import Spin
+        from pymatgen.io.vasp.inputs import Kpoints
+        from pymatgen.io.vasp.outputs import BSVasprun
 
-    def _read_hybrid(self, filename: str, kpoints_fn: str, kpath_fn: str):
-        vr = BSVasprun(filename, parse_projected_eigen=True)
-        bs = vr.get_band_structure()
-        self.efermi = bs.efermi
-        self.nbands = bs.nb_bands
+        with phase('pymatgen BSVasprun'):
+            vr = BSVasprun(filename, parse_projected_eigen=projected)
+        self.efermi = vr.efermi
         
-        kpoints = Kpoints.from_file(kpoints_fn)
-        terms = kpoints.comment.split()
-        nkpts = int(terms[6])
-        nbranches = int(terms[7])
-        npts = [int(term) for term in terms[8:8+nbranches]]
-        beg = int(terms[4])
-        kpts = np.array([kp.cart_coords for kp in bs.kpoints[beg:]])
-        self.breaks = np.array([np.sum(npts[0:i]) for i in np.arange(len(npts))], dtype=int)
-        self.end_indices = np.array([np.sum(npts[0:i])-1 for i in np.arange(1, len(npts)+1)])
-
-        previous_distance = 0.0
-        distance = []
-        head = 0
-        for length in npts:
-            diff = np.linalg.norm(np.diff(kpts[head:head+length], axis=0), axis=1)
-            dist = np.array([np.sum(diff[0:i]) for i in np.arange(len(diff)+1)]) + previous_distance
-            distance.append(dist)
-            previous_distance = dist[-1]
-            head += length
-        self.distances = np.concatenate(distance, axis=0)
-
-        self.bands = {spin: bands[:,beg:] for spin, bands in bs.bands.items()}
+        # the band structure is built from the raw arrays, without the
+        # Kpoint objects of get_band_structure for the SCF k-points
+        beg, npts = MyBandStructure._hybrid_header(kpoints_fn)
+        kpts = np.array(vr.actual_kpoints[beg:]) @ vr.final_structure.lattice.reciprocal_lattice.matrix
+        self.end_indices = np.cumsum(npts) - 1
+        self.breaks = self.end_indices - np.array(npts) + 1
+        self.distances = path_distances(kpts, npts)
+
+        self.bands = {('up' if spin == Spin.up else 'dw'): eigenvalues[beg:,:,0].T
+                      for spin, eigenvalues in vr.eigenvalues.items()}
+        self.occupations = {('up' if spin == Spin.up else 'dw'): eigenvalues[beg:,:,1].T
+                            for spin, eigenvalues in vr.eigenvalues.items()}
+        self.nbands = len(next(iter(self.bands.values())))
 
         kpath = Kpoints.from_file(kpath_fn)
-        convert = lambda label: '\Gamma' if label == 'GAMMA' else label
-        self.branches = [[convert(kpath.labels[2*i]), convert(kpath.labels[2*i+1])] for i in np.arange(len(kpath.labels)/2, dtype=int)]
+        self.branches = [[convert_label(kpath.labels[2*i]), convert_label(kpath.labels[2*i+1])] for i in np.arange(len(kpath.labels)/2, dtype=int)]
+        if projected:
+            # (kpoint, band, ion, orbital) to (band, kpoint, orbital, ion)
+            self._read_projections({spin: weights[beg:].transpose((1,0,3,2)) for spin, weights in vr.projected_eigenvalues.items()},
+                                   vr.atomic_symbols)
+
+    def select_bands(self, emin: float=-np.inf, emax: float=np.inf, first: int=1, last: int=None) -> np.ndarray:
+        """Keep bands first..last (1-based) that reach into [emin, emax] for any
+        spin, so that all spins keep sharing one distances dataset. Return the
+        1-based indices of the kept bands."""
+        bmin = np.min([bands.min(axis=1) for bands in self.bands.values()], axis=0)
+        bmax = np.max([bands.max(axis=1) for bands in self.bands.values()], axis=0)
+        keep = np.logical_and(bmax >= emin, bmin <= emax)
+        keep[:max(first-1, 0)] = False
+        if last is not None:
+            keep[last:] = False
+        self.bands = {key: bands[keep] for key, bands in self.bands.items()}
+        self.occupations = {key: occupations[keep] for key, occupations in self.occupations.items()}
+        self.projections = {key: weights[:,keep] for key, weights in self.projections.items()}
+        self.nbands = int(np.sum(keep))
+        return np.flatnonzero(keep) + 1
+
+    @timed('level of detail')
+    def decimate(self, method: str, npoints: int=2000, tolerance: float=1e-3):
+        """Keep the k-points of every branch chosen by lod_indices for all bands
+        and spins, with npoints shared between branches by their length"""
+        if method == 'Off':
+            return
+        ys = np.concatenate(list(self.bands.values()))
+        ntotal = ys.shape[1]
+        segments = []
+        for start, end in zip(self.breaks, self.end_indices):
+            npts = max(npoints*(end+1-start)//ntotal, 2)
+            segments.append(start + lod_indices(ys[:,start:end+1], method, npts, tolerance,
+                                                self.distances[start:end+1]))
+        npts = np.array([len(segment) for segment in segments])
+        index = np.concatenate(segments)
+        self.distances = self.distances[index]
+        self.bands = {key: bands[:,index] for key, bands in self.bands.items()}
+        self.occupations = {key: occupations[:,index] for key, occupations in self.occupations.items()}
+        self.projections = {key: weights[...,index] for key, weights in self.projections.items()}
+        self.end_indices = np.cumsum(npts) - 1
+        self.breaks = self.end_indices - npts + 1
+
+    def to_arrays(self) -> dict:
+        arrays = {
+            'efermi': np.array(self.efermi),
+            'nbands': np.array(self.nbands),
+            'breaks': np.asarray(self.breaks),
+            'end_indices': np.asarray(self.end_indices),
+            'distances': np.asarray(self.distances),
+            'branches': np.array(self.branches, dtype=str),
+        }
+        for name, bands in self.bands.items():
+            arrays['bands_'+name] = bands
+        for name, occupations in self.occupations.items():
+            arrays['occupations_'+name] = occupations
+        if self.projections:
+            arrays['projection_names'] = np.array(self.projection_names, dtype=str)
+            for name, weights in self.projections.items():
+                arrays['projections_'+name] = weights
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        mbs = cls.__new__(cls)
+        mbs.efermi = float(arrays['efermi'])
+        mbs.nbands = int(arrays['nbands'])
+        mbs.breaks = arrays['breaks']
+        mbs.end_indices = arrays['end_indices']
+        mbs.distances = arrays['distances']
+        mbs.branches = arrays['branches'].tolist()
+        mbs.bands = {name: arrays['bands_'+name] for name in ['up', 'dw'] if 'bands_'+name in arrays}
+        mbs.occupations = {name: arrays['occupations_'+name] for name in ['up', 'dw'] if 'occupations_'+name in arrays}
+        mbs.projection_names = arrays['projection_names'].tolist() if 'projection_names' in arrays else []
+        mbs.projections = {name: arrays['projections_'+name] for name in ['up', 'dw'] if 'projections_'+name in arrays}
+        return mbs
 
     @staticmethod
     def parse_path(s: str) -> list:
@@ -76,51 +996,334 @@ class MyBandStructure:
                 last_term = cur_term
         return branches
 
+    @timed('change path')
     def change_path(self, s: str) -> bool:
         branches = MyBandStructure.parse_path(s)
-        indices = []
-        flip = []
+        # (left, right) -> (branch index, traversed backwards), first branch wins
+        pairs = {}
+        for i, (left, right) in enumerate(self.branches):
+            pairs.setdefault((left, right), (i, False))
+            pairs.setdefault((right, left), (i, True))
+        if any((left, right) not in pairs for left, right in branches):
+            return False
+
+        # one gather index for the whole new path, reversed for flipped branches
+        segments = []
         for branch in branches:
-            found = False
-            for i in np.arange(len(self.branches)):
-                if self.branches[i][0] == branch[0] and self.branches[i][1] == branch[1]:
-                    indices.append(i)
-                    flip.append(False)
-                    found = True
-                    break
-                elif self.branches[i][0] == branch[1] and self.branches[i][1] == branch[0]:
-                    indices.append(i)
-                    flip.append(True)
-                    found = True
-                    break
-            if not found:
-                return False
-        
-        distances = []
-        bands = {spin: [] for spin in self.bands.keys()}
-        npts = []
+            i, flip = pairs[tuple(branch)]
+            segment = np.arange(self.breaks[i], self.end_indices[i]+1)
+            segments.append(segment[::-1] if flip else segment)
+        npts = np.array([len(segment) for segment in segments])
+        index = np.concatenate(segments)
+        starts = np.repeat(index[np.cumsum(npts)-npts], npts)
+
+        local = np.abs(self.distances[index] - self.distances[starts])
+        self.end_indices = np.cumsum(npts) - 1
+        self.breaks = self.end_indices - npts + 1
+        lengths = local[self.end_indices]
+        self.distances = local + np.repeat(np.cumsum(lengths) - lengths, npts)
+        self.bands = {key: bands[:,index] for key, bands in self.bands.items()}
+        self.occupations = {key: occupations[:,index] for key, occupations in self.occupations.items()}
+        self.projections = {key: weights[...,index] for key, weights in self.projections.items()}
         self.branches = branches
-        last_distance = 0
-        for i, f in zip(indices, flip):
-            distance = self.distances[self.breaks[i]:self.end_indices[i]+1]
-            if f:
-                distance = np.flip(distance)
-            distance = np.abs(distance - distance[0]) + last_distance
-            last_distance = distance[-1]
-            distances.append(distance)
-            for key in bands.keys():
-                band = self.bands[key][:,self.breaks[i]:self.end_indices[i]+1]
-                bands[key].append(band if not f else np.fliplr(band))
-            npts.append(len(distance))
-        self.distances = np.concatenate(distances)
-        for key in bands.keys():
-            bands[key] = np.concatenate(bands[key], axis=1)
-        self.bands = bands
-        self.breaks = np.array([np.sum(npts[0:i]) for i in np.arange(len(npts))], dtype=int)
-        self.end_indices = np.array([np.sum(npts[0:i])-1 for i in np.arange(1, len(npts)+1)], dtype=int)
 
         return True
 
+def load_band_structure(filename: str, hybrid: bool, streaming: bool=True, cache: str='Use',
+                        projected: bool=False) -> MyBandStructure:
+    """Read the band structure of filename through the parse cache; KPOINTS
+    and, for hybrid runs, KPATH.in are taken from the same directory"""
+    dirname = os.path.dirname(filename)
+    kpoints_fn = find_file(dirname, 'KPOINTS')
+    kpath_fn = find_file(dirname, 'KPATH.in')
+
+    filenames = [filename, kpoints_fn] + ([kpath_fn] if hybrid else [])
+    parse = lambda: MyBandStructure(filename, hybrid=hybrid, kpoints_fn=kpoints_fn, kpath_fn=kpath_fn,
+                                    streaming=streaming, projected=projected).to_arrays()
+    return MyBandStructure.from_arrays(cached_parse(cache, filenames, 'bands', parse, (hybrid, projected)))
+
+def load_eigenval(filename: str, hybrid: bool, cache: str='Use') -> MyBandStructure:
+    """Read the band structure of EIGENVAL through the parse cache, with
+    KPOINTS, KPATH.in, POSCAR (or CONTCAR) and DOSCAR from the same directory"""
+    dirname = os.path.dirname(filename)
+    kpoints_fn = find_file(dirname, 'KPOINTS')
+    kpath_fn = find_file(dirname, 'KPATH.in')
+    poscar_fn = find_structure(dirname)
+    doscar_fn = find_file(dirname, 'DOSCAR')
+    if poscar_fn == '':
+        raise plugins.ImportPluginException('POSCAR or CONTCAR is needed next to EIGENVAL for the reciprocal lattice')
+
+    filenames = [filename, kpoints_fn, poscar_fn] + ([kpath_fn] if hybrid else []) + \
+        ([doscar_fn] if os.path.exists(doscar_fn) else [])
+    parse = lambda: MyBandStructure.from_eigenval(filename, hybrid, kpoints_fn, kpath_fn, poscar_fn, doscar_fn).to_arrays()
+    try:
+        return MyBandStructure.from_arrays(cached_parse(cache, filenames, 'eigenval', parse, (hybrid,)))
+    except (OSError, ValueError) as e:
+        raise plugins.ImportPluginException(str(e))
+
+def load_doscar(filename: str, cache: str='Use') -> dict:
+    """Read the DOS arrays of DOSCAR through the parse cache, with the elements
+    from POSCAR (or CONTCAR) in the same directory"""
+    poscar_fn = find_structure(os.path.dirname(filename))
+    try:
+        return cached_parse(cache, [filename] + ([poscar_fn] if poscar_fn else []), 'doscar',
+                            lambda: doscar_arrays(filename, poscar_fn))
+    except (OSError, ValueError) as e:
+        raise plugins.ImportPluginException(str(e))
+
+@timed('band filter')
+def filter_bands(mbs: MyBandStructure, ewindow: str, relative: bool, band_range: str, efermi: float):
+    """Apply the energy window ("emin emax", relative to efermi if relative)
+    and band range ("first last") import fields; blank fields keep everything"""
+    if ewindow.strip() == '' and band_range.strip() == '':
+        return None
+    emin, emax = -np.inf, np.inf
+    if ewindow.strip() != '':
+        emin, emax = _numbers(ewindow, 'Energy window')
+        if relative:
+            emin, emax = emin+efermi, emax+efermi
+    first, last = 1, None
+    if band_range.strip() != '':
+        first, last = _numbers(band_range, 'Band range', int)
+    return mbs.select_bands(emin, emax, first, last)
+
+@timed('band datasets')
+def band_datasets(mbs: MyBandStructure, efermi: float) -> list:
+    """NaN-separated distances and bands datasets and the k-path ticks"""
+    datasets = []
+    distances = np.insert(mbs.distances, mbs.breaks, np.nan, axis=0).reshape((1,-1))
+    distances = np.repeat(distances, mbs.nbands, axis=0).flatten()
+    datasets.append(plugins.ImportDataset1D('distances', distances))
+
+    for name in mbs.bands.keys():
+        dat = mbs.bands[name]-efermi
+        dat = np.insert(dat, mbs.breaks, np.nan, axis=1).flatten()
+        datasets.append(plugins.ImportDataset1D('bands_'+name, dat))
+
+    # fat-band weights share the NaN-separated layout of the bands
+    for name, weights in mbs.projections.items():
+        weights = np.insert(weights, mbs.breaks, np.nan, axis=2).reshape((len(mbs.projection_names), -1))
+        for group, dat in zip(mbs.projection_names, weights):
+            datasets.append(plugins.ImportDataset1D('weights_'+group+'_'+name, dat))
+
+    dist = mbs.distances[0]
+    last_left, last_right = mbs.branches[0]
+    tickd, tickl = [dist], [last_left]
+    for i, branch in enumerate(mbs.branches):
+        dist = mbs.distances[mbs.end_indices[i]]
+        tickd.append(dist)
+        left, right = branch
+        if i > 0 and last_right != left:
+            tickl[-1] = last_right + '|' + left
+        tickl.append(right)
+        last_left, last_right = left, right
+    datasets += [
+        plugins.ImportDataset1D('tickd', tickd),
+        plugins.ImportDatasetText('tickl', tickl)
+    ]
+
+    return datasets
+
+# hbar^2/(2 m_e) in eV Angstrom^2, turning parabola curvatures into masses
+HBAR2_2ME = 3.80998212
+# points on either side of a band edge fitted for its effective mass
+EDGE_FIT_POINTS = 3
+
+def edge_mass(band: np.ndarray, distances: np.ndarray, k: int, start: int, end: int,
+              npoints: int=EDGE_FIT_POINTS) -> float:
+    """Effective mass, in electron masses, of the parabola E(k) + a (d - d(k))^2
+    fitted to npoints on either side of k within the branch [start, end];
+    negative at maxima (holes)"""
+    window = slice(max(k-npoints, start), min(k+npoints, end)+1)
+    dd = (distances[window] - distances[k])**2
+    de = band[window] - band[k]
+    if np.sum(dd*dd) == 0:
+        return np.nan
+    a = np.sum(de*dd) / np.sum(dd*dd)
+    return HBAR2_2ME/a if a != 0 else np.inf
+
+@timed('band edges')
+def band_edges(mbs: MyBandStructure) -> dict:
+    """Valence band maximum and conduction band minimum of every spin, the gap
+    and its character and the effective masses at the edges
+
+    States are occupied by their occupation in the calculation, or if the
+    input has none, when they lie at or below the Fermi energy of VASP; a band
+    holding both occupied and empty states crosses the Fermi level, making the
+    system a metal with no gap. The edges are found by masked reductions over all bands and k-points,
+    with the extrema per k-point giving the smallest direct gap. Returns the
+    global 'vbm', 'cbm', 'gap', 'direct_gap' and 'type' and per spin the band
+    and k-point indices ('vbm_band', 'vbm_k', 'cbm_band', 'cbm_k') and masses
+    ('mass_h', 'mass_e') of its edges.
+    """
+    spins = list(mbs.bands)
+    bands = np.array([mbs.bands[spin] for spin in spins])
+    if mbs.occupations:
+        occupied = np.array([mbs.occupations[spin] for spin in spins]) > 0.5
+    else:
+        occupied = bands <= mbs.efermi
+    valence = np.where(occupied, bands, -np.inf)
+    conduction = np.where(occupied, np.inf, bands)
+    # (spin, kpoint) band extrema
+    top, bottom = valence.max(axis=1), conduction.min(axis=1)
+
+    edges = {'spins': spins}
+    for i, spin in enumerate(spins):
+        kv, kc = int(np.argmax(top[i])), int(np.argmin(bottom[i]))
+        bv, bc = int(np.argmax(valence[i,:,kv])), int(np.argmin(conduction[i,:,kc]))
+        masses = []
+        for band, k in [(bands[i,bv], kv), (bands[i,bc], kc)]:
+            branch = np.searchsorted(mbs.breaks, k, side='right') - 1
+            masses.append(edge_mass(band, mbs.distances, k, mbs.breaks[branch], mbs.end_indices[branch]))
+        edges[spin] = {'vbm': top[i,kv], 'cbm': bottom[i,kc], 'vbm_band': bv, 'vbm_k': kv,
+                       'cbm_band': bc, 'cbm_k': kc, 'mass_h': masses[0], 'mass_e': masses[1]}
+
+    vbm, cbm = float(top.max()), float(bottom.min())
+    metal = bool(np.any(occupied.any(axis=2) & ~occupied.all(axis=2)))
+    direct_gap = float(np.min(bottom - top))
+    if metal or not np.isfinite(vbm) or not np.isfinite(cbm):
+        edges.update(vbm=vbm, cbm=cbm, gap=0.0 if metal else np.nan, direct_gap=0.0 if metal else np.nan,
+                     type='metal' if metal else '')
+    else:
+        # a direct gap matches the global one up to rounding
+        edges.update(vbm=vbm, cbm=cbm, gap=cbm-vbm, direct_gap=direct_gap,
+                     type='direct' if direct_gap - (cbm-vbm) < 1e-6 else 'indirect')
+    return edges
+
+def _tick_label(mbs: MyBandStructure, k: int) -> str:
+    """Label of the path end point at k-point k, '' between them"""
+    for i, branch in enumerate(mbs.branches):
+        if k == mbs.breaks[i]:
+            return branch[0]
+        if k == mbs.end_indices[i]:
+            return branch[1]
+    return ''
+
+def edge_datasets(mbs: MyBandStructure, edges: dict, efermi: float) -> list:
+    """vbm, cbm, gap, direct_gap, gap_type and, per spin, the effective masses
+    (mass_h_*, mass_e_*) and edges_d_*, edges_e_* and edges_l_* marker
+    positions and labels of the edges on the distances axis, with energies
+    relative to efermi like the bands datasets"""
+    datasets = [
+        plugins.ImportDataset1D('vbm', [edges['vbm']-efermi]),
+        plugins.ImportDataset1D('cbm', [edges['cbm']-efermi]),
+        plugins.ImportDataset1D('gap', [edges['gap']]),
+        plugins.ImportDataset1D('direct_gap', [edges['direct_gap']]),
+        plugins.ImportDatasetText('gap_type', [edges['type']]),
+    ]
+    for spin in edges['spins']:
+        edge = edges[spin]
+        labels = []
+        for name, k in [('VBM', edge['vbm_k']), ('CBM', edge['cbm_k'])]:
+            tick = _tick_label(mbs, k)
+            labels.append(name + (' (' + tick + ')' if tick else ''))
+        datasets += [
+            plugins.ImportDataset1D('mass_h_'+spin, [edge['mass_h']]),
+            plugins.ImportDataset1D('mass_e_'+spin, [edge['mass_e']]),
+            plugins.ImportDataset1D('edges_d_'+spin, mbs.distances[[edge['vbm_k'], edge['cbm_k']]]),
+            plugins.ImportDataset1D('edges_e_'+spin, [edge['vbm']-efermi, edge['cbm']-efermi]),
+            plugins.ImportDatasetText('edges_l_'+spin, labels),
+        ]
+    return datasets
+
+def dos_efermi(dos: dict, style: str) -> float:
+    """Fermi energy of the DOS arrays, either as written by VASP ('Direct') or
+    the highest energy below it with a non-zero total DOS ('Non-zero')"""
+    efermi = float(dos['efermi'])
+    if style == 'Non-zero':
+        efermi = dos['energies'][np.logical_and(dos['energies']<efermi, dos['tdos_up']>0)][-1]
+    return efermi
+
+@timed('DOS broadening')
+def broaden(energies: np.ndarray, densities: np.ndarray, width: float, shape: str='Gaussian') -> np.ndarray:
+    """Convolve the (channel, energy) densities on the uniform energies with a
+    Gaussian or Lorentzian of full width at half maximum width, all channels
+    in one FFT; the kernel spans the whole grid and has unit sum, so that the
+    integrals are kept but for the tails beyond the grid"""
+    n = len(energies)
+    de = (energies[-1]-energies[0])/(n-1)
+    # vasprun.xml and DOSCAR round the energies to 4 decimals
+    if not np.allclose(np.diff(energies), de, rtol=1e-2, atol=1e-4):
+        raise plugins.ImportPluginException('DOS broadening needs a uniform energy grid')
+    x = de*np.arange(-(n-1), n)
+    if shape == 'Gaussian':
+        sigma = width/(2*np.sqrt(2*np.log(2)))
+        kernel = np.exp(-0.5*(x/sigma)**2)
+    else:
+        kernel = 1/(x**2 + (width/2)**2)
+    kernel /= np.sum(kernel)
+    # zero padded beyond the full convolution (3n-2 points) so that nothing wraps around
+    size = 1 << (3*n-3).bit_length()
+    spectrum = np.fft.rfft(densities, size, axis=-1)*np.fft.rfft(kernel, size)
+    return np.fft.irfft(spectrum, size, axis=-1)[..., n-1:2*n-1]
+
+def resample(energies: np.ndarray, densities: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """Linear interpolation of the (channel, energy) densities onto grid, zero
+    outside energies, with the interpolation weights shared by all channels"""
+    right = np.clip(np.searchsorted(energies, grid), 1, len(energies)-1)
+    t = (grid-energies[right-1])/(energies[right]-energies[right-1])
+    values = densities[..., right-1]*(1-t) + densities[..., right]*t
+    values[..., (grid < energies[0]) | (grid > energies[-1])] = 0
+    return values
+
+def energy_grid(egrid: str) -> np.ndarray:
+    """Energies of the "emin emax step" grid field, None if blank"""
+    if egrid.strip() == '':
+        return None
+    emin, emax, step = _numbers(egrid, 'Energy grid', count=3)
+    if step <= 0 or emax <= emin:
+        raise plugins.ImportPluginException('Energy grid must have emin < emax and step > 0, got "%s"' % egrid)
+    return emin + step*np.arange(int(round((emax-emin)/step))+1)
+
+@timed('DOS datasets')
+def dos_datasets(dos: dict, efermi: float, elements: list=None, orbitals: list=None, sites: list=None,
+                 lod: tuple=('Off',), broadening: tuple=(0., 'Gaussian'),
+                 grid: np.ndarray=None) -> list:
+    """energies, total DOS and PDOS datasets from the arrays of dos_arrays,
+    broadened by the (width, shape) broadening, resampled onto the grid of
+    energies relative to efermi, decimated together by lod_indices with the
+    (method, npoints, tolerance) lod"""
+    densities = OrderedDict((name, dos[name]) for name in ['tdos_up', 'tdos_dw'] if name in dos)
+    densities.update(pdos_arrays(dos, elements, orbitals, sites))
+    energies = dos['energies'] - efermi
+    values = np.array(list(densities.values()))
+    if broadening[0] > 0:
+        values = broaden(energies, values, *broadening)
+    if grid is not None:
+        values = resample(energies, values, grid)
+        energies = grid
+    index = lod_indices(values, *lod, x=energies)
+    datasets = [plugins.ImportDataset1D('energies', energies[index])]
+    for name, data in zip(densities, values):
+        datasets.append(plugins.ImportDataset1D(name, data[index]))
+    return datasets
+
+def lod_fields() -> list:
+    """Import fields of the level of detail, see lod_indices"""
+    return [
+        plugins.ImportFieldCombo('lod', descr='Level of detail', items=['Off', 'Min-max', 'Douglas-Peucker'], default='Off', editable=False),
+        plugins.ImportFieldInt('lod_points', descr='Min-max target points (all curves together)', default=2000, minval=4),
+        plugins.ImportFieldFloat('lod_tolerance', descr='Douglas-Peucker tolerance (fraction of the range of each curve)', default=1e-3, minval=0.),
+    ]
+
+def lod_options(field_results: dict) -> tuple:
+    return field_results['lod'], field_results['lod_points'], field_results['lod_tolerance']
+
+def broadening_fields() -> list:
+    """Import fields of the DOS broadening and energy grid, see dos_datasets"""
+    return [
+        plugins.ImportFieldFloat('broadening', descr='DOS broadening FWHM in eV (0 for none)', default=0., minval=0.),
+        plugins.ImportFieldCombo('broadening_shape', descr='DOS broadening shape', items=['Gaussian', 'Lorentzian'], default='Gaussian', editable=False),
+        plugins.ImportFieldText('egrid', descr='DOS energy grid "emin emax step", as the energies dataset (blank for the file\'s)', default=''),
+    ]
+
+def broadening_options(field_results: dict) -> dict:
+    """Keyword arguments of dos_datasets from the fields of broadening_fields"""
+    return {
+        'broadening': (field_results['broadening'], field_results['broadening_shape']),
+        'grid': energy_grid(field_results['egrid']),
+    }
+
 class ImportPluginBandStructure(plugins.ImportPlugin):
     """Plugins to import band structure from vasprun.xml"""
 
@@ -131,7 +1334,7 @@ class ImportPluginBandStructure(plugins.ImportPlugin):
     # Uncomment this line for the plugin to get its own tab
     #promote_tab='Example'
 
-    file_extensions = set(['.xml'])
+    file_extensions = extensions('.xml')
 
     def __init__(self):
         plugins.ImportPlugin.__init__(self)
@@ -140,9 +1343,23 @@ class ImportPluginBandStructure(plugins.ImportPlugin):
             plugins.ImportFieldCheck("sub_fermi", descr="Substract Fermi energy"),
             plugins.ImportFieldCheck('hybrid', descr='Hybrid functionals', default=False),
             plugins.ImportFieldText('kpath', descr='K-Path (blank for defualt)', default=''),
+            plugins.ImportFieldText('ewindow', descr='Energy window "emin emax" (blank for all bands)', default=''),
+            plugins.ImportFieldCheck('ewindow_fermi', descr='Energy window relative to Fermi energy', default=True),
+            plugins.ImportFieldText('band_range', descr='Band range "first last" (blank for all bands)', default=''),
+            plugins.ImportFieldCheck('projected', descr='Fat bands (element and orbital weights)', default=False),
+            plugins.ImportFieldCheck('streaming', descr='Streaming vasprun.xml parser', default=True),
+            plugins.ImportFieldCombo('cache', descr='Parse cache', items=['Use', 'Refresh', 'Off'], default='Use', editable=False),
+            plugins.ImportFieldCheck('edges', descr='Band edges, gap and effective masses', default=False),
             plugins.ImportFieldCheck('details', descr='Detailed information'),
-        ]
+        ] + lod_fields() + instrument_fields()
 
+    def load(self, params: plugins.ImportPluginParams) -> MyBandStructure:
+        return load_band_structure(params.filename, params.field_results['hybrid'],
+                                   params.field_results['streaming'], params.field_results['cache'],
+                                   params.field_results['projected'])
+
+    @background
+    @instrumented
     def doImport(self, params: plugins.ImportPluginParams):
         """Actually import data
         params is a ImportPluginParams object.
@@ -150,54 +1367,32 @@ class ImportPluginBandStructure(plugins.ImportPlugin):
         """
         datasets = []
 
-        kpoints_fn = ''
-        kpath_fn = ''
-        if params.field_results['hybrid']:
-            dirname = os.path.dirname(params.filename)
-            kpoints_fn = os.path.join(dirname, 'KPOINTS')
-            kpath_fn = os.path.join(dirname, 'KPATH.in')
-            
-        mbs = MyBandStructure(params.filename, hybrid=params.field_results['hybrid'], kpoints_fn=kpoints_fn, kpath_fn=kpath_fn)
+        mbs = self.load(params)
         if params.field_results['kpath'] != '':
             mbs.change_path(params.field_results['kpath'])
 
         efermi = mbs.efermi
+        # the edges are searched in all bands and k-points, before any filtering
+        edges = band_edges(mbs) if params.field_results['edges'] else None
+        band_indices = filter_bands(mbs, params.field_results['ewindow'], params.field_results['ewindow_fermi'],
+                                    params.field_results['band_range'], efermi)
         if params.field_results['import_fermi']:
             datasets.append(plugins.ImportDataset1D('efermi', [efermi]))
         if not params.field_results['sub_fermi']:
             efermi = 0
+        if edges is not None:
+            datasets += edge_datasets(mbs, edges, efermi)
 
-        distances = np.insert(mbs.distances, mbs.breaks, np.nan, axis=0).reshape((1,-1))
-        distances = np.repeat(distances, mbs.nbands, axis=0).flatten()
-        datasets.append(plugins.ImportDataset1D('distances', distances))
-
-        for spin in mbs.bands.keys():
-            name = 'up' if spin == Spin.up else 'dw'
-            dat = mbs.bands[spin]-efermi
-            dat = np.insert(dat, mbs.breaks, np.nan, axis=1).flatten()
-            datasets.append(plugins.ImportDataset1D('bands_'+name, dat))
-
-        dist = mbs.distances[0]
-        last_left, last_right = mbs.branches[0]
-        tickd, tickl = [dist], [last_left]
-        for i, branch in enumerate(mbs.branches):
-            dist = mbs.distances[mbs.end_indices[i]]
-            tickd.append(dist)
-            left, right = branch
-            if i > 0 and last_right != left:
-                tickl[-1] = last_right + '|' + left
-            tickl.append(right)
-            last_left, last_right = left, right
-        datasets += [
-            plugins.ImportDataset1D('tickd', tickd),
-            plugins.ImportDatasetText('tickl', tickl)
-        ]
+        mbs.decimate(*lod_options(params.field_results))
+        datasets += band_datasets(mbs, efermi)
 
         if params.field_results['details']:
             datasets += [
                 plugins.ImportDataset1D('nbands', [mbs.nbands]),
                 plugins.ImportDataset1D('distances1', mbs.distances)
             ]
+            if band_indices is not None:
+                datasets.append(plugins.ImportDataset1D('band_indices', band_indices))
 
         return datasets
 
@@ -213,49 +1408,306 @@ class ImportPluginDOS(plugins.ImportPlugin):
     # Uncomment this line for the plugin to get its own tab
     #promote_tab='Example'
 
-    file_extensions = set(['.xml'])
+    file_extensions = extensions('.xml')
 
     def __init__(self):
         plugins.ImportPlugin.__init__(self)
         self.fields = [
             plugins.ImportFieldCheck("import_epdos", descr="Import Elementwise PDOS", default=True),
+            plugins.ImportFieldText('elements', descr='PDOS elements (blank for all)', default=''),
+            plugins.ImportFieldText('orbitals', descr='PDOS orbitals, e.g. "s p" or "px dxy" (blank for s/p/d/f)', default=''),
+            plugins.ImportFieldText('sites', descr='PDOS site groups, e.g. "top=1-4,9"', default=''),
             plugins.ImportFieldCombo("efermi_style", descr="Fermi energy style", items=['Direct', 'Non-zero'], default='Non-zero', editable=False),
             plugins.ImportFieldCheck("import_fermi", descr="Import Fermi energy", default=True),
-            plugins.ImportFieldCheck("sub_fermi", descr="Substract Fermi energy")
-            ]
+            plugins.ImportFieldCheck("sub_fermi", descr="Substract Fermi energy"),
+            plugins.ImportFieldCombo('cache', descr='Parse cache', items=['Use', 'Refresh', 'Off'], default='Use', editable=False),
+            ] + broadening_fields() + lod_fields() + instrument_fields()
+
+    def load(self, params: plugins.ImportPluginParams) -> dict:
+        return cached_parse(params.field_results['cache'], [params.filename], 'dos',
+                            lambda: dos_arrays(read_vasprun(params.filename, dos=True)))
 
+    @background
+    @instrumented
     def doImport(self, params: plugins.ImportPluginParams):
         """Actually import data
         params is a ImportPluginParams object.
         Return a list of ImportDataset1D, ImportDataset2D objects
         """
         datasets = []
-        vr = Vasprun(params.filename, parse_projected_eigen=True)
-        dos = vr.complete_dos
-        efermi = dos.efermi
-        if params.field_results['efermi_style'] == 'Non-zero':
-            efermi = dos.energies[np.logical_and(dos.energies<dos.efermi, dos.densities[Spin.up]>0)][-1]
+        dos = self.load(params)
+        efermi = dos_efermi(dos, params.field_results['efermi_style'])
         if params.field_results['import_fermi']:
             datasets.append(plugins.ImportDataset1D('efermi', [efermi]))
         if not params.field_results['sub_fermi']:
             efermi = 0
 
-        datasets.append(plugins.ImportDataset1D('energies', dos.energies-efermi))
-        for spin in dos.densities.keys():
-            name = 'tdos_up' if spin == Spin.up else 'tdos_dw'
-            datasets.append(plugins.ImportDataset1D(name, dos.densities[spin]-efermi))
+        if not params.field_results['import_epdos']:
+            dos.pop('pdos', None)
+        elements = params.field_results['elements'].split() or None
+        orbitals = params.field_results['orbitals'].split() or None
+        sites = parse_sites(params.field_results['sites'])
+        datasets += dos_datasets(dos, efermi, elements, orbitals, sites, lod_options(params.field_results),
+                                 **broadening_options(params.field_results))
+
+        return datasets
+
+class ImportPluginBSDOS(plugins.ImportPlugin):
+    """Plugin to import band structure and DOS from vasprun.xml in one pass"""
+
+    name = "Band Structure and DOS plugin"
+    author = "Leran Lu"
+    description = "Reads the band structure, DOS and PDOS from vasprun.xml in a single pass"
+
+    # Uncomment this line for the plugin to get its own tab
+    #promote_tab='Example'
+
+    file_extensions = extensions('.xml')
+
+    def __init__(self):
+        plugins.ImportPlugin.__init__(self)
+        self.fields = [
+            plugins.ImportFieldCombo("efermi_style", descr="Fermi energy style", items=['Direct', 'Non-zero'], default='Non-zero', editable=False),
+            plugins.ImportFieldCheck("import_fermi", descr="Import Fermi energy", default=True),
+            plugins.ImportFieldCheck("sub_fermi", descr="Substract Fermi energy"),
+            plugins.ImportFieldCheck('hybrid', descr='Hybrid functionals', default=False),
+            plugins.ImportFieldText('kpath', descr='K-Path (blank for defualt)', default=''),
+            plugins.ImportFieldText('ewindow', descr='Energy window "emin emax" (blank for all bands)', default=''),
+            plugins.ImportFieldCheck('ewindow_fermi', descr='Energy window relative to Fermi energy', default=True),
+            plugins.ImportFieldText('band_range', descr='Band range "first last" (blank for all bands)', default=''),
+            plugins.ImportFieldCombo('cache', descr='Parse cache', items=['Use', 'Refresh', 'Off'], default='Use', editable=False),
+            plugins.ImportFieldCheck('edges', descr='Band edges, gap and effective masses', default=False),
+            plugins.ImportFieldCheck('details', descr='Detailed information'),
+        ] + broadening_fields() + lod_fields() + instrument_fields()
 
-        edos = dos.get_element_dos()
-        for elem in edos.keys():
-            odos = dos.get_element_spd_dos(elem)
-            for spin in edos[elem].densities.keys():
-                sspin = 'up' if spin == Spin.up else 'dw'
-                datasets.append(plugins.ImportDataset1D('pdos_'+str(elem)+'_'+sspin, edos[elem].densities[spin]))
-                for k in odos.keys():
-                    datasets.append(plugins.ImportDataset1D('pdos_'+str(elem)+'_'+str(k)+'_'+sspin, data=odos[k].densities[spin]))
+    def load(self, params: plugins.ImportPluginParams) -> tuple:
+        """DOS arrays and band structure"""
+        # the DOS goes first so that a cache miss parses the file once, with the
+        # band structure reusing the reader kept by read_vasprun
+        with shared_readers():
+            dos = cached_parse(params.field_results['cache'], [params.filename], 'dos',
+                               lambda: dos_arrays(read_vasprun(params.filename, dos=True)))
+            return dos, load_band_structure(params.filename, params.field_results['hybrid'],
+                                            cache=params.field_results['cache'])
+
+    @background
+    @instrumented
+    def doImport(self, params: plugins.ImportPluginParams):
+        """Actually import data
+        params is a ImportPluginParams object.
+        Return a list of ImportDataset1D, ImportDataset2D objects
+        """
+        datasets = []
+        dos, mbs = self.load(params)
+        if params.field_results['kpath'] != '':
+            mbs.change_path(params.field_results['kpath'])
+
+        # the DOS style only shifts the energies, it does not change the occupations
+        efermi = dos_efermi(dos, params.field_results['efermi_style'])
+        edges = band_edges(mbs) if params.field_results['edges'] else None
+        band_indices = filter_bands(mbs, params.field_results['ewindow'], params.field_results['ewindow_fermi'],
+                                    params.field_results['band_range'], efermi)
+        if params.field_results['import_fermi']:
+            datasets.append(plugins.ImportDataset1D('efermi', [efermi]))
+        if not params.field_results['sub_fermi']:
+            efermi = 0
+        if edges is not None:
+            datasets += edge_datasets(mbs, edges, efermi)
+
+        mbs.decimate(*lod_options(params.field_results))
+        datasets += band_datasets(mbs, efermi)
+        datasets += dos_datasets(dos, efermi, lod=lod_options(params.field_results),
+                                 **broadening_options(params.field_results))
+
+        if params.field_results['details']:
+            datasets += [
+                plugins.ImportDataset1D('nbands', [mbs.nbands]),
+                plugins.ImportDataset1D('distances1', mbs.distances)
+            ]
+            if band_indices is not None:
+                datasets.append(plugins.ImportDataset1D('band_indices', band_indices))
 
         return datasets
 
+class ImportPluginEigenval(ImportPluginBandStructure):
+    """Plugin to import band structure from EIGENVAL, a lighter alternative
+    to vasprun.xml producing the same datasets"""
+
+    name = "EIGENVAL plugin"
+    author = "Leran Lu"
+    description = "Reads the band structure from EIGENVAL, with KPOINTS and POSCAR (and DOSCAR for the Fermi energy)"
+
+    file_extensions = set(['*'])
+
+    def __init__(self):
+        ImportPluginBandStructure.__init__(self)
+        # EIGENVAL has no projections and a single parser
+        self.fields = [field for field in self.fields if field.name not in ('projected', 'streaming')]
+
+    def load(self, params: plugins.ImportPluginParams) -> MyBandStructure:
+        return load_eigenval(params.filename, params.field_results['hybrid'], params.field_results['cache'])
+
+class ImportPluginDOSCAR(ImportPluginDOS):
+    """Plugin to import DOS and PDOS from DOSCAR, a lighter alternative to
+    vasprun.xml producing the same datasets"""
+
+    name = "DOSCAR plugin"
+    author = "Leran Lu"
+    description = "Reads the DOS and PDOS from DOSCAR, with the elements from POSCAR"
+
+    file_extensions = set(['*'])
+
+    def load(self, params: plugins.ImportPluginParams) -> dict:
+        return load_doscar(params.filename, params.field_results['cache'])
+
+class ImportPluginEigenvalDOSCAR(ImportPluginBSDOS):
+    """Plugin to import band structure from EIGENVAL and DOS from the DOSCAR
+    next to it"""
+
+    name = "EIGENVAL and DOSCAR plugin"
+    author = "Leran Lu"
+    description = "Reads the band structure from EIGENVAL and the DOS and PDOS from DOSCAR in the same directory"
+
+    file_extensions = set(['*'])
+
+    def load(self, params: plugins.ImportPluginParams) -> tuple:
+        cache = params.field_results['cache']
+        dos = load_doscar(find_file(os.path.dirname(params.filename), 'DOSCAR'), cache)
+        return dos, load_eigenval(params.filename, params.field_results['hybrid'], cache)
+
+def _floats(values: list) -> np.ndarray:
+    """Convert a list of byte strings to floats, NaN for blanks and overflows"""
+    try:
+        return np.array(values, dtype=bytes).astype(float)
+    except ValueError:
+        converted = []
+        for value in values:
+            try:
+                converted.append(float(value))
+            except ValueError:
+                converted.append(np.nan)
+        return np.array(converted)
+
+class OszicarReader:
+    """Incremental single-pass OSZICAR parser
+
+    update() scans only the bytes appended since the previous call with
+    compiled regular expressions and appends column arrays for the tracked
+    quantities: the ionic-step values (E0, F, dE, mag and the MD terms T, E,
+    EK, SP, SK), the number of electronic steps per ionic step (nscf) and the
+    electronic-step values (scf_E, scf_dE, scf_deps, scf_ncg, scf_rms, scf_rmsc)
+    together with the ionic step they belong to (scf_ionic). The offset stops
+    before a partially written last line, which is parsed once it is complete,
+    and the state is reset if the file was truncated or rewritten.
+    """
+
+    IONIC = {
+        'F': re.compile(rb'\sF=\s*(\S+)'),
+        'E0': re.compile(rb'E0=\s*(\S+)'),
+        'dE': re.compile(rb'd E\s*=\s*(\S+)'),
+        'mag': re.compile(rb'mag=\s*(\S+)'),
+        'T': re.compile(rb'T=\s*(\S+)'),
+        'E': re.compile(rb'\sE=\s*(\S+)'),
+        'EK': re.compile(rb'EK=\s*(\S+)'),
+        'SP': re.compile(rb'SP=\s*(\S+)'),
+        'SK': re.compile(rb'SK=\s*(\S+)'),
+    }
+    # electronic steps, e.g. "DAV:   3    -0.1E+02   -0.2E-01   -0.3E-02  1664   0.1E+00    0.2E-01",
+    # with the last column (rms(c)) missing for the first steps
+    SCF = {quantity: re.compile(rb'\n[A-Z][A-Z ]{2}: *\d+' + rb' +\S+'*i + rb'(?: +(\S+))?')
+           for i, quantity in enumerate(['scf_E', 'scf_dE', 'scf_deps', 'scf_ncg', 'scf_rms', 'scf_rmsc'])}
+
+    # lines are matched after a newline, which is much faster than ^ with re.M
+    _ionic_line = re.compile(rb'\n *\d+ +[TF]=[^\n]*')
+    _scf_step = re.compile(rb'\n[A-Z][A-Z ]{2}: *(\d+) ')
+
+    def __init__(self, filename: str, quantities: list=None) -> None:
+        self.filename = filename
+        self.quantities = set(self.IONIC) if quantities is None else set(quantities) | {'E0'}
+        self.reset()
+
+    def require(self, quantities: list):
+        """Track more quantities, re-reading the file if any of them is new"""
+        if not set(quantities) <= self.quantities:
+            self.quantities |= set(quantities)
+            self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.head = b''
+        self.nsteps = 0
+        self.nscf_groups = 0
+        self.columns = {}
+
+    def _extend(self, quantity: str, values: np.ndarray):
+        self.columns.setdefault(quantity, []).append(values)
+
+    @timed('parse OSZICAR')
+    def update(self):
+        with open_file(self.filename) as f:
+            if compression(self.filename) != '':
+                # compressed files are archived, and cannot be seeked cheaply
+                self.reset()
+            elif os.fstat(f.fileno()).st_size < self.offset or f.read(len(self.head)) != self.head:
+                self.reset()
+            f.seek(self.offset)
+            chunk = f.read()
+        end = chunk.rfind(b'\n') + 1
+        chunk = chunk[:end]
+        if self.offset == 0:
+            self.head = chunk[:256]
+        self.offset += end
+
+        chunk = b'\n' + chunk
+        lines = self._ionic_line.findall(chunk)
+        ionic = b'\n'.join(lines)
+        for quantity in self.quantities & self.IONIC.keys():
+            pattern = self.IONIC[quantity]
+            values = pattern.findall(ionic)
+            if len(values) == 0 and quantity not in self.columns:
+                continue
+            if len(values) != len(lines):
+                values = [m.group(1) if m else b'nan' for m in map(pattern.search, lines)]
+            if quantity not in self.columns:
+                self._extend(quantity, np.full(self.nsteps, np.nan))
+            self._extend(quantity, _floats(values))
+
+        if self.quantities & (self.SCF.keys() | {'scf_ionic', 'nscf'}):
+            # electronic steps are numbered from 1 within every ionic step
+            first = np.array(self._scf_step.findall(chunk), dtype=bytes) == b'1'
+            self._extend('scf_ionic', self.nscf_groups + np.cumsum(first))
+            self.nscf_groups += int(np.sum(first))
+            for quantity in self.quantities & self.SCF.keys():
+                column = np.array(self.SCF[quantity].findall(chunk), dtype=bytes)
+                self._extend(quantity, _floats(np.where(column == b'', b'nan', column)))
+
+        self.nsteps += len(lines)
+        return self
+
+    def arrays(self) -> dict:
+        """Arrays of the tracked quantities present in the file"""
+        arrays = {}
+        for quantity, chunks in self.columns.items():
+            if len(chunks) > 1:
+                chunks[:] = [np.concatenate(chunks)]
+            if quantity in self.quantities:
+                arrays[quantity] = chunks[0]
+        if 'nscf' in self.quantities and 'scf_ionic' in self.columns:
+            counts = np.bincount(self.columns['scf_ionic'][0].astype(int), minlength=self.nsteps+2)
+            arrays['nscf'] = counts[1:self.nsteps+1]
+        return arrays
+
+_oszicar_readers = {}
+
+def follow_oszicar(filename: str, quantities: list=None) -> OszicarReader:
+    """OszicarReader of filename kept for the session and updated in place"""
+    path = os.path.abspath(filename)
+    if path not in _oszicar_readers:
+        _oszicar_readers[path] = OszicarReader(path, quantities)
+    elif quantities is not None:
+        _oszicar_readers[path].require(quantities)
+    return _oszicar_readers[path].update()
+
 class ImportPluginOszicar(plugins.ImportPlugin):
     """An example plugin for reading a set of unformatted numbers
     from a file."""
@@ -272,34 +1724,202 @@ class ImportPluginOszicar(plugins.ImportPlugin):
     def __init__(self):
         plugins.ImportPlugin.__init__(self)
         self.fields = [
-            plugins.ImportFieldText('quantities', descr='Quantities (e.g. "E0 dE")'),
+            plugins.ImportFieldText('quantities', descr='Quantities (e.g. "E0 dE", "nscf scf_dE scf_rms")'),
             plugins.ImportFieldCheck('indices', descr='Create Indices', default=True),
             plugins.ImportFieldCheck('sub_final', descr="Substract final energy"),
-            ]
+            plugins.ImportFieldCheck('incremental', descr='Incremental (parse only new lines of running jobs)', default=False),
+            plugins.ImportFieldCombo('cache', descr='Parse cache', items=['Use', 'Refresh', 'Off'], default='Use', editable=False),
+            ] + instrument_fields()
 
+    @background
+    @instrumented
     def doImport(self, params: plugins.ImportPluginParams):
         """Actually import data
         params is a ImportPluginParams object.
         Return a list of ImportDataset1D, ImportDataset2D objects
         """
         datasets = []
-        ionic_steps = Oszicar(params.filename).ionic_steps
-        nsteps = len(ionic_steps)
         quantities = [i.strip() for i in str(params.field_results['quantities']).split()]
+        if params.field_results['incremental']:
+            steps = follow_oszicar(params.filename, quantities).arrays()
+        else:
+            steps = cached_parse(params.field_results['cache'], [params.filename], 'oszicar',
+                                 lambda: OszicarReader(params.filename, quantities).update().arrays(),
+                                 tuple(sorted(quantities)))
+        nsteps = len(steps.get('E0', ()))
         for quantity in quantities:
-            if quantity in ionic_steps[0]:
-                dataset = np.array([i[quantity] for i in ionic_steps])
+            if quantity in steps:
+                dataset = steps[quantity]
                 if params.field_results['sub_final'] and quantity in ['E0', 'F']:
-                    dataset -= dataset[-1]
+                    dataset = dataset - dataset[-1]
                 datasets.append(plugins.ImportDataset1D(quantity, dataset))
 
         if params.field_results['indices']:
-            datasets = [plugins.ImportDataset1D('indices', np.arange(nsteps)+1)] + datasets
+            indices = [plugins.ImportDataset1D('indices', np.arange(nsteps)+1)]
+            scf = [quantity for quantity in quantities if quantity in steps and quantity.startswith('scf_')]
+            if scf:
+                indices.append(plugins.ImportDataset1D('scf_indices', np.arange(len(steps[scf[0]]))+1))
+            datasets = indices + datasets
+
+        return datasets
+
+BATCH_KINDS = OrderedDict([
+    ('Band structure', ImportPluginBandStructure),
+    ('DOS', ImportPluginDOS),
+    ('Band structure and DOS', ImportPluginBSDOS),
+    ('EIGENVAL', ImportPluginEigenval),
+    ('DOSCAR', ImportPluginDOSCAR),
+    ('EIGENVAL and DOSCAR', ImportPluginEigenvalDOSCAR),
+    ('OSZICAR', ImportPluginOszicar),
+])
+
+def batch_files(filename: str, spec: str) -> list:
+    """Files of a batch: spec holds globs or directories separated by ';',
+    relative to the directory of filename; directories stand for the file with
+    the same name as filename inside them, plain or compressed. A blank spec
+    takes the directories next to the one of filename."""
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    basename = basename[:len(basename)-len(compression(basename))]
+    files = []
+    for pattern in (spec.split(';') if spec.strip() != '' else ['../*/']):
+        pattern = os.path.join(dirname, os.path.expanduser(pattern.strip()))
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isdir(path):
+                path = find_file(path, basename)
+            path = os.path.normpath(path)
+            if os.path.isfile(path) and path not in files:
+                files.append(path)
+    if len(files) == 0:
+        raise plugins.ImportPluginException('No files match "%s"' % spec)
+    return files
+
+def batch_prefixes(files: list) -> list:
+    """Dataset prefixes of files: their directories relative to the common one,
+    or their paths if several files share a directory"""
+    names = [os.path.dirname(f) for f in files]
+    if len(set(names)) < len(names):
+        names = files
+    common = os.path.commonpath(names) if len(names) > 1 else os.path.dirname(names[0])
+    return [re.sub(r'[^\w.+-]+', '_', os.path.relpath(name, common)) for name in names]
+
+def _batch_import(kind: str, filename: str, encoding: str, fields: dict) -> tuple:
+    """Import filename with the plugin of kind, taking the fields it shares with
+    the batch plugin; returns the datasets as picklable (text, name, data) and
+    the error message, as the exceptions of parsers may not be picklable"""
+    plugin = BATCH_KINDS[kind]()
+    field_results = {field.name: field.default for field in plugin.fields}
+    field_results.update((name, value) for name, value in fields.items() if name in field_results)
+    params = plugins.ImportPluginParams(filename=filename, encoding=encoding, field_results=field_results)
+    try:
+        datasets = plugin.doImport(params)
+    except Exception as e:
+        return None, '%s: %s' % (type(e).__name__, e)
+    return [(isinstance(ds, plugins.ImportDatasetText), ds.name, ds.data) for ds in datasets], None
+
+def batch_import(kind: str, files: list, encoding: str, fields: dict, workers: int=0) -> list:
+    """Import files in a pool of worker processes (all cores for workers=0, or
+    in this process for one worker); returns a (datasets, error) pair per file,
+    so that a failing file does not abort the batch"""
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers == 1:
+        results = []
+        for i, filename in enumerate(files):
+            progress('Importing ' + filename, i, len(files))
+            results.append(_batch_import(kind, filename, encoding, fields))
+        return results
+
+    # spawned, as forking the Veusz process from the import thread is unsafe
+    import batch_worker
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+    pending = set()
+    try:
+        futures = [executor.submit(batch_worker.import_file, kind, filename, encoding, fields) for filename in files]
+        pending.update(futures)
+        while pending:
+            progress('Imported %d of %d files' % (len(files) - len(pending), len(files)), len(files) - len(pending), len(files))
+            pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED).not_done
+    finally:
+        # on cancellation the files being imported are left to finish in the background
+        executor.shutdown(wait=not pending, cancel_futures=True)
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            # a worker that died, e.g. out of memory, breaks the pool
+            results.append((None, '%s: %s' % (type(e).__name__, e)))
+    return results
+
+class ImportPluginBatch(plugins.ImportPlugin):
+    """Plugin to import many calculations in parallel, with a dataset prefix
+    per calculation"""
+
+    name = "Batch import plugin"
+    author = "Leran Lu"
+    description = "Reads vasprun.xml, EIGENVAL, DOSCAR or OSZICAR of many calculations in parallel, prefixing datasets with directory names"
+
+    # Uncomment this line for the plugin to get its own tab
+    #promote_tab='Example'
+
+    file_extensions = set(['*'])
+
+    def __init__(self):
+        plugins.ImportPlugin.__init__(self)
+        self.fields = [
+            plugins.ImportFieldText('files', descr='Globs or directories relative to the file, separated by ";" (blank for "../*/")', default=''),
+            plugins.ImportFieldCombo('kind', descr='Import', items=list(BATCH_KINDS), default='Band structure', editable=False),
+            plugins.ImportFieldInt('workers', descr='Worker processes (0 for all cores)', default=0, minval=0),
+            plugins.ImportFieldCombo("efermi_style", descr="Fermi energy style", items=['Direct', 'Non-zero'], default='Non-zero', editable=False),
+            plugins.ImportFieldCheck("import_fermi", descr="Import Fermi energy", default=True),
+            plugins.ImportFieldCheck("sub_fermi", descr="Substract Fermi energy"),
+            plugins.ImportFieldCheck('hybrid', descr='Hybrid functionals', default=False),
+            plugins.ImportFieldText('kpath', descr='K-Path (blank for defualt)', default=''),
+            plugins.ImportFieldText('ewindow', descr='Energy window "emin emax" (blank for all bands)', default=''),
+            plugins.ImportFieldCheck('ewindow_fermi', descr='Energy window relative to Fermi energy', default=True),
+            plugins.ImportFieldText('band_range', descr='Band range "first last" (blank for all bands)', default=''),
+            plugins.ImportFieldCheck('edges', descr='Band edges, gap and effective masses', default=False),
+            plugins.ImportFieldText('quantities', descr='OSZICAR quantities (e.g. "E0 dE")'),
+            plugins.ImportFieldCombo('cache', descr='Parse cache', items=['Use', 'Refresh', 'Off'], default='Use', editable=False),
+        ] + broadening_fields() + lod_fields() + instrument_fields()
+
+    @background
+    @instrumented
+    def doImport(self, params: plugins.ImportPluginParams):
+        """Actually import data
+        params is a ImportPluginParams object.
+        Return a list of ImportDataset1D, ImportDataset2D objects
+        """
+        fields = dict(params.field_results)
+        files = batch_files(params.filename, fields.pop('files'))
+        kind, workers = fields.pop('kind'), fields.pop('workers')
+        # one profile of the whole batch, the files can still be timed one by one
+        fields.pop('profile')
+        prefixes = batch_prefixes(files)
+
+        datasets, imported, errors = [], [], []
+        for prefix, (results, error) in zip(prefixes, batch_import(kind, files, params.encoding, fields, workers)):
+            if error is not None:
+                errors.append('%s: %s' % (prefix, error))
+                continue
+            imported.append(prefix)
+            for text, name, data in results:
+                dataset = plugins.ImportDatasetText if text else plugins.ImportDataset1D
+                datasets.append(dataset(prefix + '_' + name, data))
+        if len(imported) == 0:
+            raise plugins.ImportPluginException('\n'.join(errors))
 
+        datasets.append(plugins.ImportDatasetText('batch_prefixes', imported))
+        if errors:
+            datasets.append(plugins.ImportDatasetText('batch_errors', errors))
         return datasets
 
 plugins.importpluginregistry += [
     ImportPluginBandStructure,
     ImportPluginDOS,
-    ImportPluginOszicar
+    ImportPluginBSDOS,
+    ImportPluginEigenval,
+    ImportPluginDOSCAR,
+    ImportPluginEigenvalDOSCAR,
+    ImportPluginOszicar,
+    ImportPluginBatch
 ]
\ No newline at end of file
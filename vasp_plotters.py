@@ -1,24 +1,71 @@
+import re
+from contextlib import contextmanager
+
 import veusz.document.commandinterface as commandinterface
 import veusz.embed as embed
 import veusz.plugins as plugins
 
+@contextmanager
+def batched(interface: commandinterface.CommandInterface):
+    """Hold the document updates while a tool changes widgets, so that
+    applying it redraws once; the changes are already recorded as one
+    operation when the tool is run from the Veusz window"""
+    document = getattr(interface, 'document', None)
+    if document is None or not hasattr(document, 'suspendUpdates'):
+        yield
+        return
+    document.suspendUpdates()
+    try:
+        yield
+    finally:
+        document.enableUpdates()
+
+def update(widget: embed.WidgetNode, settings: dict):
+    """Set the settings of widget, given by their path relative to it
+    ('PlotLine/style'), skipping those already at their value"""
+    for path, value in settings.items():
+        setting = widget.fromPath(widget.path + '/' + path)
+        if setting.val != value:
+            setting.val = value
+
+def child(parent: embed.WidgetNode, wtype: str, name: str, settings: dict) -> embed.WidgetNode:
+    """Widget name of parent with settings, updated in place if a previous
+    run of the tool drew it and added otherwise"""
+    if name in parent.childnames:
+        widget = parent.fromPath(parent.path + '/' + name)
+        if widget.widgettype == wtype:
+            update(widget, settings)
+            return widget
+    widget = parent.Add(wtype, name=name, **{key: value for key, value in settings.items() if '/' not in key})
+    update(widget, {key: value for key, value in settings.items() if '/' in key})
+    return widget
+
+def hide_unused(graph: embed.WidgetNode, names: list, drawn: list):
+    """Hide the widgets of names drawn by a previous run with other fields
+    (spin, orbitals) but not by this one"""
+    for name in names:
+        if name not in drawn and name in graph.childnames:
+            update(graph.fromPath(graph.path + '/' + name), {'hide': True})
+
 def draw_bs_kpath(interface: commandinterface.CommandInterface, graph: embed.WidgetNode, tickd: str, tickl: str):
-    ticks = graph.Add('xy', name='ticks')
-    ticks.xData.val = tickd
-    ticks.yData.val = tickd
-    ticks.hide.val = True
-    ticks.labels.val = tickl
-
-    x = graph.x
-    x.autoRange.val = 'exact'
-    x.mode.val = 'labels'
-    x.MajorTicks.manualTicks.val = interface.GetData(tickd)[0].tolist()
-    x.MinorTicks.hide.val = True
-    x.GridLines.style.val = 'dotted'
-    x.GridLines.hide.val = False
-
-def draw_bands(graph: embed.WidgetNode, distances: str, bands: str):
-    xy = graph.Add('xy', name=bands, marker='none', xData=distances, yData=bands)
+    child(graph, 'xy', 'ticks', {'xData': tickd, 'yData': tickd, 'hide': True, 'labels': tickl})
+    update(graph.x, {
+        'autoRange': 'exact',
+        'mode': 'labels',
+        'MajorTicks/manualTicks': interface.GetData(tickd)[0].tolist(),
+        'MinorTicks/hide': True,
+        'GridLines/style': 'dotted',
+        'GridLines/hide': False,
+    })
+
+def draw_bands(graph: embed.WidgetNode, distances: str, bands: str, style: str='solid'):
+    xy = child(graph, 'xy', bands, {'marker': 'none', 'xData': distances, 'yData': bands, 'hide': False,
+                                    'PlotLine/style': style})
+    return xy
+
+def draw_edges(graph: embed.WidgetNode, distances: str, energies: str, labels: str):
+    xy = child(graph, 'xy', energies, {'marker': 'circle', 'xData': distances, 'yData': energies, 'labels': labels,
+                                       'hide': False, 'PlotLine/hide': True})
     return xy
 
 class PlotBandStructurePlugin(plugins.ToolsPlugin):
@@ -31,11 +78,16 @@ class PlotBandStructurePlugin(plugins.ToolsPlugin):
         self.fields = [
             plugins.FieldWidget('graph', descr='Draw on graph', default='', widgettypes='graph'),
             plugins.FieldBool('spin', descr='Spin polarized'),
+            plugins.FieldBool('edges', descr='Mark band edges (imported with edges)'),
             plugins.FieldText('prefix', descr='Prefix'),
             plugins.FieldText('suffix', descr='Suffix'),
         ]
 
     def apply(self, interface: commandinterface.CommandInterface, fields: dict):
+        with batched(interface):
+            self.draw(interface, fields)
+
+    def draw(self, interface: commandinterface.CommandInterface, fields: dict):
         graph = interface.Root.fromPath(fields['graph'])
         spin = fields['spin']
         prefix = fields['prefix']
@@ -43,31 +95,38 @@ class PlotBandStructurePlugin(plugins.ToolsPlugin):
 
         distances = prefix + 'distances' + suffix
         bands = [prefix+'bands_up'+suffix, prefix+'bands_dw'+suffix]
+        edges = [prefix+'edges_e_up'+suffix, prefix+'edges_e_dw'+suffix]
         tickd, tickl = prefix+'tickd'+suffix, prefix+'tickl'+suffix
 
-        bands_up = draw_bands(graph, distances, bands[0])
-        bands_dw = None
+        drawn = [draw_bands(graph, distances, bands[0]).name]
         if spin == True:
-            bands_dw = draw_bands(graph, distances, bands[1])
-            bands_dw.PlotLine.style.val = 'dashed'
+            drawn.append(draw_bands(graph, distances, bands[1], 'dashed').name)
+        if fields['edges']:
+            for sspin in ['up', 'dw'][:2 if spin else 1]:
+                xy = draw_edges(graph, prefix+'edges_d_'+sspin+suffix, prefix+'edges_e_'+sspin+suffix,
+                                prefix+'edges_l_'+sspin+suffix)
+                drawn.append(xy.name)
+        hide_unused(graph, bands + edges, drawn)
 
         draw_bs_kpath(interface, graph, tickd, tickl)
-        y = graph.y
-        y.label.val = 'Energy/eV'
+        update(graph.y, {'label': 'Energy/eV'})
 
 def hide_dos_x(graph: embed.WidgetNode):
-    x = graph.x
-    x.MajorTicks.hide.val = True
-    x.MinorTicks.hide.val = True
-    x.TickLabels.hide.val = True
+    update(graph.x, {'MajorTicks/hide': True, 'MinorTicks/hide': True, 'TickLabels/hide': True})
 
 def draw_densities(widget: embed.WidgetNode, energies: str, densities: str, down: bool=False):
     xData = densities
     if down:
         xData = '-'+densities
-    xy = widget.Add('xy', name=densities, marker='none', xData=xData, yData=energies)
+    xy = child(widget, 'xy', densities, {'marker': 'none', 'xData': xData, 'yData': energies, 'hide': False})
     return xy
 
+def dos_widgets(graph: embed.WidgetNode, prefix: str, suffix: str) -> list:
+    """Names of the DOS curves of graph drawn with prefix and suffix, leaving
+    those of datasets imported with other suffixes"""
+    pattern = re.compile(re.escape(prefix) + '(tdos|pdos_.+)_(up|dw)' + re.escape(suffix))
+    return [name for name in graph.childnames if pattern.fullmatch(name)]
+
 class PlotDOSPlugin(plugins.ToolsPlugin):
     menu = ('VASP', 'Plot DOS')
     name = 'Plot DOS'
@@ -84,6 +143,10 @@ class PlotDOSPlugin(plugins.ToolsPlugin):
         ]
 
     def apply(self, interface: commandinterface.CommandInterface, fields: dict):
+        with batched(interface):
+            self.draw(interface, fields)
+
+    def draw(self, interface: commandinterface.CommandInterface, fields: dict):
         graph = interface.Root.fromPath(fields['graph'])
         spin = fields['spin']
         orbitals = [orbital.strip().replace(' ', '_') for orbital in fields['orbitals'].split(',')]
@@ -94,19 +157,19 @@ class PlotDOSPlugin(plugins.ToolsPlugin):
         # densities = [prefix+'tdos_up'+suffix, prefix+'tdos_dw'+suffix]
         orbitals = [orbital.replace(' ', '_') for orbital in orbitals]
         densities = []
+        drawn = []
         for orbital in orbitals:
             if orbital == '':
                 densities = [prefix+'tdos_up'+suffix, prefix+'tdos_dw'+suffix]
             else:
-                densities = [prefix+'pdos_'+orbital+'_up', prefix+'pdos_'+orbital+'_dw']
-            draw_densities(graph, energies, densities[0])
+                densities = [prefix+'pdos_'+orbital+'_up'+suffix, prefix+'pdos_'+orbital+'_dw'+suffix]
+            drawn.append(draw_densities(graph, energies, densities[0]).name)
             if spin == True:
-                draw_densities(graph, energies, densities[1], True)
-        
+                drawn.append(draw_densities(graph, energies, densities[1], True).name)
+        hide_unused(graph, dos_widgets(graph, prefix, suffix), drawn)
+
         hide_dos_x(graph)
-        y = graph.y
-        y.autoRange.val = 'exact'
-        y.label.val = 'Energy/eV'
+        update(graph.y, {'autoRange': 'exact', 'label': 'Energy/eV'})
 
 class PlotBSDOSPlugin(plugins.ToolsPlugin):
     menu = ('VASP', 'Plot band structure and DOS')
@@ -124,6 +187,10 @@ class PlotBSDOSPlugin(plugins.ToolsPlugin):
         ]
 
     def apply(self, interface: commandinterface.CommandInterface, fields: dict):
+        with batched(interface):
+            self.draw(interface, fields)
+
+    def draw(self, interface: commandinterface.CommandInterface, fields: dict):
         widget = interface.Root.fromPath(fields['widget'])
         spin = fields['spin']
         colscale = fields['colscale']
@@ -137,29 +204,30 @@ class PlotBSDOSPlugin(plugins.ToolsPlugin):
         energies = prefix[-1] + 'energies' + suffix[-1]
         densities = [prefix[-1]+'tdos_up'+suffix[-1], prefix[-1]+'tdos_dw'+suffix[-1]]
 
-        grid = widget.Add('grid', name='bsdos')
-        grid.scaleCols.val = colscale
-        grid.internalMargin.val = '0.2cm'
-        grid.Add('axis', name='y', label='Energy/eV', direction='vertical')
+        grid = child(widget, 'grid', 'bsdos', {'scaleCols': colscale, 'internalMargin': '0.2cm'})
+        child(grid, 'axis', 'y', {'label': 'Energy/eV', 'direction': 'vertical'})
 
-        bs = grid.Add('graph', name='bs', autoadd=False,
-                      leftMargin='0cm', rightMargin='0cm', topMargin='0cm', bottomMargin='0cm')
-        bs.Add('axis', name='x', direction='horizontal')
-        bands_up = draw_bands(bs, distances, bands[0])
-        bands_dw = None
+        margins = {'leftMargin': '0cm', 'rightMargin': '0cm', 'topMargin': '0cm', 'bottomMargin': '0cm'}
+        if 'bs' not in grid.childnames:
+            grid.Add('graph', name='bs', autoadd=False)
+        bs = child(grid, 'graph', 'bs', margins)
+        child(bs, 'axis', 'x', {'direction': 'horizontal'})
+        drawn = [draw_bands(bs, distances, bands[0]).name]
         if spin == True:
-            bands_dw = draw_bands(bs, distances, bands[1])
-            bands_dw.PlotLine.style.val = 'dashed'
+            drawn.append(draw_bands(bs, distances, bands[1], 'dashed').name)
+        hide_unused(bs, bands, drawn)
 
         draw_bs_kpath(interface, bs, tickd, tickl)
 
-        dos = grid.Add('graph', name='dos', autoadd=False,
-                       leftMargin='0cm', rightMargin='0cm', topMargin='0cm', bottomMargin='0cm')
-        dos.Add('axis', name='x', direction='horizontal')
-        densities_up = draw_densities(dos, energies, densities[0])
+        if 'dos' not in grid.childnames:
+            grid.Add('graph', name='dos', autoadd=False)
+        dos = child(grid, 'graph', 'dos', margins)
+        child(dos, 'axis', 'x', {'direction': 'horizontal'})
+        drawn = [draw_densities(dos, energies, densities[0]).name]
         if spin == True:
-            densities_dw = draw_densities(dos, energies, densities[1], True)
-        
+            drawn.append(draw_densities(dos, energies, densities[1], True).name)
+        hide_unused(dos, dos_widgets(dos, prefix[-1], suffix[-1]), drawn)
+
         hide_dos_x(dos)
 
 plugins.toolspluginregistry += [